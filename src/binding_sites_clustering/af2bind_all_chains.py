@@ -1,67 +1,30 @@
 ### This code is translated to run locally from this website: https://github.com/sokrypton/af2bind
 ### For the commandline used
 import argparse
-import copy
 import os
-import pickle
+import sys
 
-import jax
-import jax.numpy as jnp
-import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
-import plotly.express as px
-import py3Dmol
-from colabdesign import clear_mem, mk_afdesign_model
-from colabdesign.af.alphafold.common import protein, residue_constants
-from scipy.special import expit as sigmoid
 
-#export AF2_MODEL_DIR=$(pwd)/params
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.binding_sites_clustering.af2bind_batch import (AF2BindJob, BatchAF2BindRunner,
+                                                        get_cache, get_ensemble_seeds)
+from src.binding_sites_clustering.af2bind_parallel import run_parallel
+from src.pdb_retrival.resolver import resolve_structure
+from src.structure_io.parser import read_structure
 
-# Define aa_order dictionary
-aa_order = {v: k for k, v in residue_constants.restype_order.items()}
+#export AF2_MODEL_DIR=$(pwd)/params
 
 def get_pdb(pdb_code=""):
     if pdb_code is None or pdb_code == "":
         pdb_file = input("Please provide the path to your PDB file: ")
         return pdb_file
-    elif os.path.isfile(pdb_code):
-        return pdb_code
-    elif len(pdb_code) == 4:
-        os.system(f"wget -qnc https://files.rcsb.org/view/{pdb_code}.pdb")
-        print(f"Dowloaded the {pdb_code} from rcsb-website")
-        return f"{pdb_code}.pdb"
-    else:
-        os.system(f"wget -qnc https://alphafold.ebi.ac.uk/files/AF-{pdb_code}-F1-model_v4.pdb")
-        return f"AF-{pdb_code}-F1-model_v4.pdb"
-
-def af2bind(outputs, mask_sidechains=True, seed=0):
-    pair_A = outputs["representations"]["pair"][:-20, -20:]
-    pair_B = outputs["representations"]["pair"][-20:, :-20].swapaxes(0, 1)
-    pair_A = pair_A.reshape(pair_A.shape[0], -1)
-    pair_B = pair_B.reshape(pair_B.shape[0], -1)
-    x = np.concatenate([pair_A, pair_B], -1)
-
-    # Get params
-    if mask_sidechains:
-        model_type = f"split_nosc_pair_A_split_nosc_pair_B_{seed}"
-    else:
-        model_type = f"split_pair_A_split_pair_B_{seed}"
-    with open(f"af2bind_params/attempt_7_2k_lam0-03/{model_type}.pickle", "rb") as handle:
-        params_ = pickle.load(handle)
-    params_ = dict(**params_["~"], **params_["linear"])
-    p = jax.tree_map(lambda x: np.asarray(x), params_)
-
-    # Get predictions
-    x = (x - p["mean"]) / p["std"]
-    x = (x * p["w"][:, 0]) + (p["b"] / x.shape[-1])
-    p_bind_aa = x.reshape(x.shape[0], 2, 20, -1).sum((1, 3))
-    p_bind = sigmoid(p_bind_aa.sum(-1))
-    return {"p_bind": p_bind, "p_bind_aa": p_bind_aa}
+    return resolve_structure(pdb_code)
 
 def get_all_chains(pdb_filename):
     """
-    Extract all chain IDs from the PDB file.
+    Extract all chain IDs of the first model of the PDB file.
 
     Args:
         pdb_filename (str): Path to the PDB file.
@@ -69,15 +32,13 @@ def get_all_chains(pdb_filename):
     Returns:
         list: List of unique chain IDs in the PDB file.
     """
-    chains = set()
-    with open(pdb_filename, 'r') as file:
-        for line in file:
-            if line.startswith('ATOM') or line.startswith('HETATM'):
-                chains.add(line[21].strip())
-    return sorted(list(chains))
+    atoms, _ = read_structure(pdb_filename)
+    return sorted(set(atoms["chain"].tolist()))
 
 
-def run_af2bind_all_chains(target_pdb, target_chains=None, mask_sidechains=True, mask_sequence=False):
+def run_af2bind_all_chains(target_pdb, target_chains=None, mask_sidechains=True, mask_sequence=False,
+                           runner=None, bucket=None, ensemble=False, cache_dir=None,
+                           workers=1, threads_per_worker=None):
     """
     Run AF2Bind for all chains in a protein by default or selected chains.
 
@@ -86,6 +47,20 @@ def run_af2bind_all_chains(target_pdb, target_chains=None, mask_sidechains=True,
         target_chains (list of str, optional): List of chain IDs to analyze. If None, process all chains.
         mask_sidechains (bool): Mask sidechains in the target (default: True).
         mask_sequence (bool): Mask sequence in the target (default: False).
+        runner (BatchAF2BindRunner, optional): Runner to reuse across calls. If None, a new
+            runner (and AF design model) is built.
+        bucket (str or int, optional): Pad chains to length buckets ("pow2" or a fixed step)
+            so that chains of similar length share one compiled model. Only used when a new
+            runner is built.
+        ensemble (bool): Score each chain with all available AF2Bind head seeds on one trunk
+            prediction and report the mean "p(bind)" and its standard deviation "p(bind)_std"
+            (default: False).
+        cache_dir (str, optional): Directory to cache the AlphaFold pair representations, so a
+            re-run of the same chains skips the AlphaFold trunk. Only used when a new runner is built.
+        workers (int): Number of worker processes scoring chains in parallel, each with its own
+            AF design model (default: 1, i.e. sequential in this process).
+        threads_per_worker (int, optional): XLA/BLAS threads per worker process. Defaults to the
+            number of CPU cores divided by `workers`.
 
     Returns:
         pd.DataFrame: Combined DataFrame of results for all processed chains.
@@ -100,45 +75,34 @@ def run_af2bind_all_chains(target_pdb, target_chains=None, mask_sidechains=True,
     else:
         print(f"Processing specified chains: {target_chains}")
 
-    clear_mem()
-    af_model = mk_afdesign_model(protocol="binder", debug=True)
-
-    all_results = []  # List to store results for all chains
-
-    for chain_id in target_chains:
-        chain_id = chain_id.strip()
-        print(f"Processing chain: {chain_id}")
-
-        # Prepare inputs for the current chain
-        af_model.prep_inputs(pdb_filename=pdb_filename,
-                             chain=chain_id,
-                             binder_len=20,
-                             rm_target_sc=mask_sidechains,
-                             rm_target_seq=mask_sequence)
-
-        # Split
-        r_idx = af_model._inputs["residue_index"][-20] + (1 + np.arange(20)) * 50
-        af_model._inputs["residue_index"][-20:] = r_idx.flatten()
-
-        af_model.set_seq("ACDEFGHIKLMNPQRSTVWY")
-        af_model.predict(verbose=False)
-
-        o = af2bind(af_model.aux["debug"]["outputs"], mask_sidechains=mask_sidechains)
-        pred_bind = o["p_bind"].copy()
-        pred_bind_aa = o["p_bind_aa"].copy()
-
-        # Process results for the current chain
-        labels = ["chain", "resi", "resn", "p(bind)"]
-        data = []
-        for i in range(af_model._target_len):
-            c = af_model._pdb["idx"]["chain"][i]
-            r = af_model._pdb["idx"]["residue"][i]
-            a = aa_order.get(af_model._pdb["batch"]["aatype"][i], "X")
-            p = pred_bind[i]
-            data.append([c, r, a, p])
-
-        df = pd.DataFrame(data, columns=labels)
-        df.to_csv(f'results_{target_pdb}_chain_{chain_id}.csv')
+    runner_kwargs = dict(mask_sidechains=mask_sidechains,
+                         mask_sequence=mask_sequence,
+                         bucket=bucket,
+                         seeds=get_ensemble_seeds(mask_sidechains) if ensemble else None)
+    if workers > 1 and runner is not None:
+        raise ValueError("A runner can not be shared with worker processes; pass either runner or workers > 1.")
+    elif runner is None:
+        # The cache is only opened for runners built here, a passed runner keeps its own
+        runner_kwargs["cache"] = get_cache(cache_dir)
+        if workers <= 1:
+            runner = BatchAF2BindRunner(**runner_kwargs)
+    elif runner is not None and (runner.mask_sidechains, runner.mask_sequence) != (mask_sidechains, mask_sequence):
+        raise ValueError("The runner was built with different mask_sidechains/mask_sequence settings.")
+    elif runner is not None and (runner.seeds is not None) != ensemble:
+        raise ValueError("The runner was built with a different ensemble setting.")
+
+    jobs = [AF2BindJob(pdb_filename, chain_id.strip()) for chain_id in target_chains]
+    if runner is None:
+        print(f"Scoring {len(jobs)} chains with {workers} worker processes")
+        results = run_parallel(jobs, workers, threads_per_worker, **runner_kwargs)
+    else:
+        results = ((i, job, runner.predict(job)) for i, job in enumerate(jobs))
+
+    all_results = []  # List to store results for all chains, in the order of target_chains
+
+    for _, job, df in results:
+        print(f"Processing chain: {job.chain}")
+        df.to_csv(f'results_{target_pdb}_chain_{job.chain}.csv')
         all_results.append(df)
 
         # Print top binding residues for the current chain
@@ -149,6 +113,9 @@ def run_af2bind_all_chains(target_pdb, target_chains=None, mask_sidechains=True,
     combined_df = pd.concat(all_results, ignore_index=True)
     combined_df.to_csv(f'results_{target_pdb}_all_chains.csv')
     print(f"Combined results saved to: results_{target_pdb}_all_chains.csv")
+    if runner is not None:
+        print(f"Compile cache hit rate: {runner.compile_cache_hit_rate:.1%} "
+              f"({len(runner.compiled_lengths)} compiled lengths)")
     return combined_df
 
 
@@ -159,10 +126,22 @@ def main():
                         help="List of target chains. If not provided, process all chains.")
     parser.add_argument("-s", "--mask_sidechains", action="store_true", help="Mask sidechains (default: False)")
     parser.add_argument("-m", "--mask_sequence", action="store_true", help="Mask sequence (default: False)")
+    parser.add_argument("-b", "--bucket", type=str, default=None,
+                        help="Pad chains to length buckets: 'pow2' or a fixed step, e.g. 64 (default: no padding)")
+    parser.add_argument("-e", "--ensemble", action="store_true",
+                        help="Average over all available AF2Bind head seeds (default: False)")
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Directory to cache AlphaFold pair representations (default: no cache)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of worker processes scoring chains in parallel (default: 1)")
+    parser.add_argument("--threads_per_worker", type=int, default=None,
+                        help="XLA/BLAS threads per worker process (default: CPU cores / workers)")
     args = parser.parse_args()
 
     run_af2bind_all_chains(target_pdb=args.target, target_chains=args.chains,
-                           mask_sidechains=args.mask_sidechains, mask_sequence=args.mask_sequence)
+                           mask_sidechains=args.mask_sidechains, mask_sequence=args.mask_sequence,
+                           bucket=args.bucket, ensemble=args.ensemble, cache_dir=args.cache_dir,
+                           workers=args.workers, threads_per_worker=args.threads_per_worker)
 
 
 if __name__ == "__main__":
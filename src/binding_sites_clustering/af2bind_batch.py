@@ -0,0 +1,476 @@
+"""
+Batch runner for AF2Bind.
+
+`run_af2bind` and `run_af2bind_all_chains` build a new AF design model for every
+target, which pays the full model construction and JAX compile cost each time.
+The `BatchAF2BindRunner` builds the model once and streams many (pdb, chain)
+jobs through it. Jobs are grouped by target length, so XLA compiles the model
+once per length instead of once per job.
+
+With `bucket` set, targets are padded to a small set of lengths (powers of two,
+or multiples of a fixed step). The padding residues sit between the target and
+the binder, are masked in the AlphaFold inputs and are dropped from the AF2Bind
+outputs, so a heterogeneous set of chains only compiles once per bucket.
+Masked padding keeps the results numerically close to, but not bit-identical
+with, the unpadded prediction.
+
+With `seeds` set, every listed AF2Bind head is evaluated on the single trunk
+prediction of a target, and the result table reports the ensemble mean as
+"p(bind)" and its standard deviation as "p(bind)_std".
+
+With `cache` set, the pair representation slices of each trunk prediction are
+stored in a `PairRepresentationCache`, and targets that were predicted before
+are scored without running AlphaFold again.
+
+Example:
+    python src/binding_sites_clustering/af2bind_batch.py 7CEI:A 6o0k:A -s
+    python src/binding_sites_clustering/af2bind_batch.py 7CEI:A 6o0k:A -b pow2
+    python src/binding_sites_clustering/af2bind_batch.py 7CEI:A 6o0k:A -e
+    python src/binding_sites_clustering/af2bind_batch.py 7CEI:A 6o0k:A --cache_dir af2bind_cache
+    python src/binding_sites_clustering/af2bind_batch.py --jobs jobs.txt -o results
+"""
+
+import argparse
+import os
+import sys
+from typing import (Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set,
+                    Tuple, Union)
+
+import numpy as np
+import pandas as pd
+from colabdesign import clear_mem, mk_afdesign_model
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.binding_sites_clustering.af2bind_cache import PairRepresentationCache
+from src.binding_sites_clustering.af2bind_head import (aa_order, af2bind_ensemble_slices,
+                                                       get_pair_slices)
+from src.binding_sites_clustering.af2bind_params import get_registry
+from src.structure_io.parser import read_structure
+
+BINDER_LEN = 20
+BINDER_SEQ = "ACDEFGHIKLMNPQRSTVWY"
+MIN_BUCKET_LEN = 32
+
+
+class AF2BindJob(NamedTuple):
+    """
+    A single AF2Bind target: a PDB file and the chain to score.
+    """
+    pdb_filename: str
+    chain: str = "A"
+
+
+def get_target_length(pdb_filename: str, chain: str) -> int:
+    """
+    Count the residues of a chain that AF2Bind will use as target.
+
+    Only residues of the first model with a CA atom are counted, which matches
+    the residues kept by `af_model.prep_inputs`.
+
+    Args:
+        pdb_filename (str): Path to the PDB file.
+        chain (str): Chain identifier.
+
+    Returns:
+        int: Number of target residues.
+    """
+    atoms, _ = read_structure(pdb_filename)
+    mask = (atoms["chain"] == chain) & (atoms["name"] == "CA")
+    mask &= (atoms["record"] == "ATOM") | (atoms["resn"] == "MSE")
+    return len(set(zip(atoms["resi"][mask].tolist(), atoms["icode"][mask].tolist())))
+
+
+def get_bucket_length(length: int, bucket: Union[str, int, None] = None) -> int:
+    """
+    Get the padded target length of a length bucket.
+
+    Args:
+        length (int): Target length.
+        bucket (Union[str, int, None]): "pow2" to pad to the next power of two, an
+        integer step to pad to the next multiple of it, or None for no padding.
+
+    Returns:
+        int: Padded target length.
+
+    Raises:
+        ValueError: If the bucket is not "pow2", a positive integer or None.
+    """
+    if bucket is None:
+        return length
+    if bucket == "pow2":
+        return max(MIN_BUCKET_LEN, 1 << max(length - 1, 0).bit_length())
+    if isinstance(bucket, str) and bucket.isdigit():
+        bucket = int(bucket)
+    if isinstance(bucket, int) and bucket > 0:
+        return max(bucket, -(-length // bucket) * bucket)
+    raise ValueError(f"Invalid bucket: {bucket!r}. Use 'pow2', a positive step or None.")
+
+
+def group_jobs_by_length(jobs: List[AF2BindJob],
+                         bucket: Union[str, int, None] = None) -> Dict[int, List[int]]:
+    """
+    Group jobs by their (padded) target length.
+
+    Args:
+        jobs (List[AF2BindJob]): Jobs to group.
+        bucket (Union[str, int, None]): Length bucketing, see `get_bucket_length`.
+
+    Returns:
+        Dict[int, List[int]]: Job indices for each padded target length, ordered by
+        length.
+    """
+    groups: Dict[int, List[int]] = {}
+    for i, job in enumerate(jobs):
+        length = get_bucket_length(get_target_length(job.pdb_filename, job.chain), bucket)
+        groups.setdefault(length, []).append(i)
+    return dict(sorted(groups.items()))
+
+
+def pad_target(af_model, padded_len: int) -> np.ndarray:
+    """
+    Pad the target of a prepared AF design model to `padded_len` residues.
+
+    The padding residues are inserted between the target and the binder. They are
+    masked in the sequence and MSA features and have no template information, so
+    they do not take part in the AlphaFold attention.
+
+    Args:
+        af_model: AF design model after `prep_inputs`.
+        padded_len (int): Padded target length.
+
+    Returns:
+        np.ndarray: Boolean mask over the padded target, True for real residues.
+    """
+    target_len = af_model._target_len
+    pad = padded_len - target_len
+    if pad <= 0:
+        return np.ones(target_len, dtype=bool)
+
+    L = af_model._inputs["residue_index"].shape[0]
+    fill = {"rm_template": True, "rm_template_seq": True, "rm_template_sc": True}
+
+    def insert_padding(k, x):
+        if not isinstance(x, np.ndarray):
+            return x
+        for axis, n in enumerate(x.shape):
+            if n == L:
+                return np.insert(x, [target_len] * pad, fill.get(k, 0), axis=axis)
+        return x
+
+    inputs = {k: insert_padding(k, x) for k, x in af_model._inputs.items() if k != "batch"}
+    inputs["batch"] = {k: insert_padding(k, x) for k, x in af_model._inputs["batch"].items()}
+    inputs["residue_index"][target_len:padded_len] = (
+        af_model._inputs["residue_index"][target_len - 1] + 1 + np.arange(pad))
+    for k in ["seq_mask", "msa_mask"]:
+        if k in inputs:
+            inputs[k][..., target_len:padded_len] = 0
+
+    af_model._inputs = inputs
+    af_model._target_len = padded_len
+    af_model._lengths = [padded_len, af_model._binder_len]
+    return np.arange(padded_len) < target_len
+
+
+def get_results_df(target: Dict[str, np.ndarray], pred_bind: np.ndarray,
+                   pred_bind_std: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Build the per-residue result table of a target.
+
+    Args:
+        target (Dict[str, np.ndarray]): Per residue "chain", "residue" and "aatype"
+        arrays of the target, as returned by `BatchAF2BindRunner.predict_pair`.
+        pred_bind (np.ndarray): Binding probabilities for each target residue.
+        pred_bind_std (Optional[np.ndarray]): Ensemble standard deviation of the binding
+        probabilities. Added as the "p(bind)_std" column if given.
+
+    Returns:
+        pd.DataFrame: Table with the columns "chain", "resi", "resn" and "p(bind)".
+    """
+    df = pd.DataFrame({
+        "chain": target["chain"],
+        "resi": target["residue"],
+        "resn": [aa_order.get(a, "X") for a in target["aatype"]],
+        "p(bind)": pred_bind,
+    })
+    if pred_bind_std is not None:
+        df["p(bind)_std"] = pred_bind_std
+    return df
+
+
+class BatchAF2BindRunner:
+    """
+    Run AF2Bind for many targets with one AF design model.
+    """
+
+    def __init__(self, mask_sidechains: bool = True, mask_sequence: bool = False,
+                 bucket: Union[str, int, None] = None,
+                 seeds: Optional[Sequence[int]] = None,
+                 cache: Optional[PairRepresentationCache] = None) -> None:
+        """
+        Builds the AF design model used for all jobs.
+
+        Args:
+            mask_sidechains (bool): Mask sidechains in the target (default: True).
+            mask_sequence (bool): Mask sequence in the target (default: False).
+            bucket (Union[str, int, None]): Pad targets to length buckets, "pow2" or a
+            fixed step (default: None, no padding).
+            seeds (Optional[Sequence[int]]): Head seeds to ensemble over (default: None,
+            only the head with seed 0).
+            cache (Optional[PairRepresentationCache]): Cache of trunk predictions
+            (default: None, always run the trunk).
+        """
+        self.mask_sidechains = mask_sidechains
+        self.mask_sequence = mask_sequence
+        self.bucket = bucket
+        get_bucket_length(1, bucket)  # validate
+        if seeds is not None and len(seeds) == 0:
+            raise ValueError("No AF2Bind head seeds given for the ensemble.")
+        self.seeds = None if seeds is None else list(seeds)
+        self.cache = cache
+
+        clear_mem()
+        self.af_model = mk_afdesign_model(protocol="binder", debug=True)
+
+        # Input lengths the model has already been compiled for
+        self.compiled_lengths: Set[int] = set()
+        self.n_predictions = 0
+        self.n_compile_hits = 0
+
+    @property
+    def compile_cache_hit_rate(self) -> float:
+        """
+        Fraction of predictions that reused an already compiled input length.
+        """
+        if self.n_predictions == 0:
+            return 0.0
+        return self.n_compile_hits / self.n_predictions
+
+    def prep_target(self, job: AF2BindJob) -> np.ndarray:
+        """
+        Prepare the model inputs for a target chain.
+
+        Args:
+            job (AF2BindJob): Target to prepare.
+
+        Returns:
+            np.ndarray: Boolean mask over the (padded) target, True for real residues.
+        """
+        self.af_model.prep_inputs(pdb_filename=job.pdb_filename,
+                                  chain=job.chain,
+                                  binder_len=BINDER_LEN,
+                                  rm_target_sc=self.mask_sidechains,
+                                  rm_target_seq=self.mask_sequence)
+
+        # Split
+        r_idx = self.af_model._inputs["residue_index"][-BINDER_LEN] + (1 + np.arange(BINDER_LEN)) * 50
+        self.af_model._inputs["residue_index"][-BINDER_LEN:] = r_idx.flatten()
+
+        padded_len = get_bucket_length(self.af_model._target_len, self.bucket)
+        return pad_target(self.af_model, padded_len)
+
+    def predict_pair(self, job: AF2BindJob) -> Dict[str, np.ndarray]:
+        """
+        Run the AlphaFold trunk for a target chain.
+
+        Args:
+            job (AF2BindJob): Target to predict.
+
+        Returns:
+            Dict[str, np.ndarray]: The pair representation slices "pair_A" (L, 20, C) and
+            "pair_B" (20, L, C) without padding, and the per residue "chain", "residue"
+            and "aatype" of the target.
+        """
+        target_mask = self.prep_target(job)
+        length = self.af_model._inputs["residue_index"].shape[0]
+        if length in self.compiled_lengths:
+            self.n_compile_hits += 1
+        self.compiled_lengths.add(length)
+
+        self.af_model.set_seq(BINDER_SEQ)
+        self.af_model.predict(verbose=False)
+        self.n_predictions += 1
+
+        pair_A, pair_B = get_pair_slices(self.af_model.aux["debug"]["outputs"])
+        target_len = int(target_mask.sum())
+        return {"pair_A": pair_A[target_mask],
+                "pair_B": pair_B[:, target_mask],
+                "chain": np.asarray(self.af_model._pdb["idx"]["chain"][:target_len]),
+                "residue": np.asarray(self.af_model._pdb["idx"]["residue"][:target_len]),
+                "aatype": np.asarray(self.af_model._pdb["batch"]["aatype"][:target_len])}
+
+    def score(self, target: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """
+        Score a trunk prediction with the AF2Bind head(s).
+
+        Args:
+            target (Dict[str, np.ndarray]): Output of `predict_pair`.
+
+        Returns:
+            pd.DataFrame: Table with the columns "chain", "resi", "resn" and "p(bind)",
+            and "p(bind)_std" for ensembles.
+        """
+        o = af2bind_ensemble_slices(target["pair_A"], target["pair_B"],
+                                    mask_sidechains=self.mask_sidechains,
+                                    seeds=[0] if self.seeds is None else self.seeds)
+        return get_results_df(target, o["p_bind"],
+                              None if self.seeds is None else o["p_bind_std"])
+
+    def predict(self, job: AF2BindJob) -> pd.DataFrame:
+        """
+        Calculate the binding probabilities of a target chain.
+
+        Args:
+            job (AF2BindJob): Target to score.
+
+        Returns:
+            pd.DataFrame: Table with the columns "chain", "resi", "resn" and "p(bind)".
+        """
+        if self.cache is None:
+            return self.score(self.predict_pair(job))
+
+        # Padded and unpadded predictions differ slightly, so they are cached apart
+        padded_length = None
+        if self.bucket is not None:
+            padded_length = get_bucket_length(get_target_length(job.pdb_filename, job.chain), self.bucket)
+        key = self.cache.key(job.pdb_filename, job.chain,
+                             mask_sidechains=self.mask_sidechains,
+                             mask_sequence=self.mask_sequence,
+                             padded_length=padded_length)
+        target = self.cache.get(key)
+        if target is None:
+            target = self.predict_pair(job)
+            self.cache.put(key, target)
+        return self.score(target)
+
+    def run(self, jobs: Iterable[AF2BindJob]) -> Iterator[Tuple[int, AF2BindJob, pd.DataFrame]]:
+        """
+        Stream jobs through the model, grouped by target length.
+
+        Args:
+            jobs (Iterable[AF2BindJob]): Targets to score.
+
+        Yields:
+            Tuple[int, AF2BindJob, pd.DataFrame]: Index of the job in `jobs`, the job and
+            its result table, in processing order.
+        """
+        jobs = list(jobs)
+        for indices in group_jobs_by_length(jobs, self.bucket).values():
+            for i in indices:
+                yield i, jobs[i], self.predict(jobs[i])
+
+    def run_all(self, jobs: Iterable[AF2BindJob]) -> List[pd.DataFrame]:
+        """
+        Score all jobs and return the result tables in the order of `jobs`.
+
+        Args:
+            jobs (Iterable[AF2BindJob]): Targets to score.
+
+        Returns:
+            List[pd.DataFrame]: Result table of each job.
+        """
+        jobs = list(jobs)
+        results: List[Optional[pd.DataFrame]] = [None] * len(jobs)
+        for i, _, df in self.run(jobs):
+            results[i] = df
+        return results  # type: ignore
+
+
+def get_ensemble_seeds(mask_sidechains: bool = True) -> List[int]:
+    """
+    Get the seeds of all AF2Bind heads available for an ensemble.
+
+    Raises:
+        ValueError: If no head parameters are found.
+    """
+    seeds = get_registry().available_seeds(mask_sidechains)
+    if not seeds:
+        raise ValueError(f"No AF2Bind head parameters found in {get_registry().params_dir}")
+    return seeds
+
+
+def get_cache(cache_dir: Optional[str],
+              cache_size_gb: float = 10.0) -> Optional[PairRepresentationCache]:
+    """
+    Open a pair representation cache, or return None if no cache directory is given.
+    """
+    if cache_dir is None:
+        return None
+    return PairRepresentationCache(cache_dir, max_bytes=int(cache_size_gb * 1024 ** 3))
+
+
+def read_jobs(jobs_file: str) -> List[AF2BindJob]:
+    """
+    Read jobs from a text file with one "<pdb_file> [chain]" pair per line.
+
+    Args:
+        jobs_file (str): Path to the jobs file. Empty lines and lines starting with
+        "#" are skipped.
+
+    Returns:
+        List[AF2BindJob]: The jobs in the file.
+    """
+    jobs = []
+    with open(jobs_file, "r") as file:
+        for line in file:
+            parts = line.split()
+            if not parts or parts[0].startswith("#"):
+                continue
+            jobs.append(AF2BindJob(*parts[:2]))
+    return jobs
+
+
+def parse_target(target: str) -> AF2BindJob:
+    """
+    Parse a "<pdb_file>[:chain]" command line target.
+    """
+    pdb_filename, _, chain = target.partition(":")
+    return AF2BindJob(pdb_filename, chain or "A")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run AF2Bind for many targets with one model")
+    parser.add_argument("targets", metavar="TARGET", type=str, nargs="*",
+                        help="Protein structure file with optional chain, e.g. 7cei.pdb:A")
+    parser.add_argument("-j", "--jobs", type=str, default=None,
+                        help="Text file with one '<pdb_file> [chain]' job per line")
+    parser.add_argument("-o", "--output_dir", type=str, default=".", help="Directory for the result CSV files")
+    parser.add_argument("-s", "--mask_sidechains", action="store_true", help="Mask sidechains (default: False)")
+    parser.add_argument("-m", "--mask_sequence", action="store_true", help="Mask sequence (default: False)")
+    parser.add_argument("-b", "--bucket", type=str, default=None,
+                        help="Pad targets to length buckets: 'pow2' or a fixed step, e.g. 64 (default: no padding)")
+    parser.add_argument("-e", "--ensemble", action="store_true",
+                        help="Average over all available AF2Bind head seeds (default: False)")
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Directory to cache AlphaFold pair representations (default: no cache)")
+    parser.add_argument("--cache_size_gb", type=float, default=10.0,
+                        help="Maximum size of the pair representation cache in GB (default: 10)")
+    args = parser.parse_args()
+
+    jobs = [parse_target(target) for target in args.targets]
+    if args.jobs is not None:
+        jobs += read_jobs(args.jobs)
+    if not jobs:
+        parser.error("No targets given")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    runner = BatchAF2BindRunner(mask_sidechains=args.mask_sidechains,
+                                mask_sequence=args.mask_sequence,
+                                bucket=args.bucket,
+                                seeds=get_ensemble_seeds(args.mask_sidechains) if args.ensemble else None,
+                                cache=get_cache(args.cache_dir, args.cache_size_gb))
+    for _, job, df in runner.run(jobs):
+        name = os.path.splitext(os.path.basename(job.pdb_filename))[0]
+        output_csv = os.path.join(args.output_dir, f"results_{name}_chain_{job.chain}.csv")
+        df.to_csv(output_csv)
+        print(f"Results of {job.pdb_filename} chain {job.chain} saved to: {output_csv}")
+
+    print(f"Scored {runner.n_predictions} targets with "
+          f"{len(runner.compiled_lengths)} model compilations "
+          f"(compile cache hit rate: {runner.compile_cache_hit_rate:.1%})")
+    if runner.cache is not None:
+        print(f"Pair representation cache: {runner.cache.hits} hits, {runner.cache.misses} misses")
+
+
+if __name__ == "__main__":
+    main()
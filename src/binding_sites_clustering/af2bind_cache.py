@@ -0,0 +1,143 @@
+"""
+Persistent, content-addressed cache of AlphaFold pair representations for AF2Bind.
+
+The expensive step of AF2Bind is the AlphaFold trunk prediction. Its output
+only depends on the structure file contents, the chain, the
+`mask_sidechains`/`mask_sequence` flags and the length the target is padded to
+(see `af2bind_batch.get_bucket_length`), so the target-binder slices of the pair
+representation are stored on disk under a hash of those inputs. Re-scoring a
+chain (e.g. with other heads, or other clustering and cutoff settings
+downstream) then skips the trunk entirely.
+
+Entries are compressed `.npz` files. The cache is bounded in size: when it grows
+beyond `max_bytes`, the least recently used entries are evicted.
+"""
+
+import hashlib
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+CACHE_VERSION = "af2bind-pair-v2"
+ENTRY_KEYS = ("pair_A", "pair_B", "chain", "residue", "aatype")
+
+
+class PairRepresentationCache:
+    """
+    On-disk LRU cache of AF2Bind pair representation slices.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 10 * 1024 ** 3) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            cache_dir (str): Directory for the cache entries.
+            max_bytes (int): Maximum total size of the entries in bytes (default: 10 GB).
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(pdb_filename: str, chain: str, mask_sidechains: bool = True,
+            mask_sequence: bool = False, padded_length: Optional[int] = None) -> str:
+        """
+        Compute the cache key of an AF2Bind trunk prediction.
+
+        Args:
+            pdb_filename (str): Path to the PDB file.
+            chain (str): Target chain.
+            mask_sidechains (bool): Whether the target sidechains are masked.
+            mask_sequence (bool): Whether the target sequence is masked.
+            padded_length (Optional[int]): Length the target is padded to, as padding
+            changes the prediction slightly. None for an unpadded target.
+
+        Returns:
+            str: Hex digest of the file contents and the prediction settings.
+        """
+        digest = hashlib.sha256()
+        padding = "" if padded_length is None else padded_length
+        digest.update(f"{CACHE_VERSION}|{chain}|{mask_sidechains:d}|{mask_sequence:d}|{padding}|".encode())
+        with open(pdb_filename, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Load a cache entry.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            Optional[Dict[str, np.ndarray]]: The cached arrays, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as npz:
+                entry = {k: npz[k] for k in ENTRY_KEYS}
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+
+        # Mark the entry as recently used
+        os.utime(path)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: Dict[str, np.ndarray]) -> None:
+        """
+        Store a cache entry and evict old entries if the cache is too large.
+
+        Args:
+            key (str): Cache key.
+            entry (Dict[str, np.ndarray]): Arrays "pair_A", "pair_B", "chain", "residue"
+            and "aatype".
+        """
+        path = self._path(key)
+        tmp_path = os.path.join(self.cache_dir, f".{key}.{os.getpid()}.npz")
+        np.savez_compressed(tmp_path, **{k: np.asarray(entry[k]) for k in ENTRY_KEYS})
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npz") or name.startswith("."):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self) -> int:
+        """
+        Total size of the cache entries in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits in `max_bytes`.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -25,24 +25,17 @@ pip install numpy pandas jax scipy plotly py3Dmol matplotlib colabdesign
 """
 
 import argparse
-import copy
 import os
-import pickle
+import sys
 
-import __main__
-import jax
-import jax.numpy as jnp
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-import plotly.express as px
-import pymol
-from colabdesign import clear_mem, mk_afdesign_model
-from colabdesign.af.alphafold.common import protein, residue_constants
-from scipy.special import expit as sigmoid
 
-# Define aa_order dictionary
-aa_order = {v: k for k, v in residue_constants.restype_order.items()}
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.binding_sites_clustering.af2bind_batch import AF2BindJob, BatchAF2BindRunner
+from src.binding_sites_clustering.grid_geometry import diameter as get_diameter
+from src.pdb_retrival.resolver import resolve_structure
+from src.structure_io.structure import Structure
 
 def get_pdb(pdb_code=""):
     """ Download/ Load the protein structure pdb file"
@@ -58,57 +51,9 @@ def get_pdb(pdb_code=""):
     if pdb_code is None or pdb_code == "":
         pdb_file = input("Please provide the path to your PDB file: ")
         return pdb_file
-    elif os.path.isfile(pdb_code):
-        return pdb_code
-    elif len(pdb_code) == 4:
-        os.system(f"wget -qnc https://files.rcsb.org/view/{pdb_code}.pdb")
-        print(f"Dowloaded the {pdb_code} pdb structure from rcsb-website...")
-        return f"{pdb_code}.pdb"
-    else:
-        os.system(f"wget -qnc https://alphafold.ebi.ac.uk/files/AF-{pdb_code}-F1-model_v4.pdb")
-        print(f"Dowloaded the {pdb_code} pdb structure from AlphaFold databased -website...")
-        return f"AF-{pdb_code}-F1-model_v4.pdb"
-    
-    
+    return resolve_structure(pdb_code)
 
-def af2bind(outputs, mask_sidechains=True, seed=0):
-    """
-    Calculate the binding probabilities from the outputs of the AlphaFold model.
-
-    **Args:**
-        - `outputs (dict)`: The outputs from the AlphaFold model containing pairwise representations.
-        - `mask_sidechains (bool, optional)`: Whether to mask sidechains in the calculation. Default is `True`.
-        - `seed (int, optional)`: Seed for reproducibility. Default is `0`.
-
-    **Returns:**
-        - `dict`: A dictionary containing:
-        - `p_bind (numpy.ndarray)`: Binding probabilities for each residue.
-        - `p_bind_aa (numpy.ndarray)`: Binding probabilities for each amino acid.
-    """
-    pair_A = outputs["representations"]["pair"][:-20, -20:]
-    pair_B = outputs["representations"]["pair"][-20:, :-20].swapaxes(0, 1)
-    pair_A = pair_A.reshape(pair_A.shape[0], -1)
-    pair_B = pair_B.reshape(pair_B.shape[0], -1)
-    x = np.concatenate([pair_A, pair_B], -1)
-
-    # Get params
-    if mask_sidechains:
-        model_type = f"split_nosc_pair_A_split_nosc_pair_B_{seed}"
-    else:
-        model_type = f"split_pair_A_split_pair_B_{seed}"
-    with open(f"af2bind_params/attempt_7_2k_lam0-03/{model_type}.pickle", "rb") as handle:
-        params_ = pickle.load(handle)
-    params_ = dict(**params_["~"], **params_["linear"])
-    p = jax.tree_map(lambda x: np.asarray(x), params_)
-
-    # Get predictions
-    x = (x - p["mean"]) / p["std"]
-    x = (x * p["w"][:, 0]) + (p["b"] / x.shape[-1])
-    p_bind_aa = x.reshape(x.shape[0], 2, 20, -1).sum((1, 3))
-    p_bind = sigmoid(p_bind_aa.sum(-1))
-    return {"p_bind": p_bind, "p_bind_aa": p_bind_aa}
-
-def run_af2bind(target_pdb, target_chain, mask_sidechains=True, mask_sequence=False):
+def run_af2bind(target_pdb, target_chain, mask_sidechains=True, mask_sequence=False, runner=None):
     """
     Calculate the binding residues of a target protein.
 
@@ -117,6 +62,7 @@ def run_af2bind(target_pdb, target_chain, mask_sidechains=True, mask_sequence=Fa
     - `target_chain (string)`: Chain identifier in the PDB file.
     - `mask_sidechains (bool, optional)`: Whether to mask sidechains in the calculation. Default is `True`.
     - `mask_sequence (bool, optional)`: Whether to mask the sequence in the calculation. Default is `False`.
+    - `runner (BatchAF2BindRunner, optional)`: Runner to reuse across calls. Default builds a new one.
 
     **Returns:**
     - `string`: PyMOL selection command for the top 15 binding residues.
@@ -130,37 +76,14 @@ def run_af2bind(target_pdb, target_chain, mask_sidechains=True, mask_sequence=Fa
 
     pdb_filename = get_pdb(target_pdb)
 
-    clear_mem()
-    af_model = mk_afdesign_model(protocol="binder", debug=True)
-    af_model.prep_inputs(pdb_filename=pdb_filename,
-                         chain=target_chain,
-                         binder_len=20,
-                         rm_target_sc=mask_sidechains,
-                         rm_target_seq=mask_sequence)
-
-    # Split
-    r_idx = af_model._inputs["residue_index"][-20] + (1 + np.arange(20)) * 50
-    af_model._inputs["residue_index"][-20:] = r_idx.flatten()
-
-    af_model.set_seq("ACDEFGHIKLMNPQRSTVWY")
-    af_model.predict(verbose=False)
-
-    o = af2bind(af_model.aux["debug"]["outputs"],
-                mask_sidechains=mask_sidechains)
-    pred_bind = o["p_bind"].copy()
-    pred_bind_aa = o["p_bind_aa"].copy()
-
-    # Process results
-    labels = ["chain", "resi", "resn", "p(bind)"]
-    data = []
-    for i in range(af_model._target_len): #loop through all res
-        c = af_model._pdb["idx"]["chain"][i] # get chain identifier
-        r = af_model._pdb["idx"]["residue"][i] #get res index
-        a = aa_order.get(af_model._pdb["batch"]["aatype"][i], "X") # get aa type
-        p = pred_bind[i] #get the binding proba
-        data.append([c, r, a, p])
-
-    df = pd.DataFrame(data, columns=labels)
+    if runner is None:
+        runner = BatchAF2BindRunner(mask_sidechains=mask_sidechains,
+                                    mask_sequence=mask_sequence)
+    elif (runner.mask_sidechains, runner.mask_sequence) != (mask_sidechains, mask_sequence):
+        raise ValueError("The runner was built with different mask_sidechains/mask_sequence settings.")
+
+    df = runner.predict(AF2BindJob(pdb_filename, target_chain))
+    pred_bind = df["p(bind)"].to_numpy()
     df.to_csv(f'results_{target_pdb}.csv') #save in pdf file
 
     #sort list by binding proba, print the top15
@@ -173,8 +96,8 @@ def run_af2bind(target_pdb, target_chain, mask_sidechains=True, mask_sequence=Fa
     pymol_cmd = ""
     for n, i in enumerate(top_n_idx):
         p = pred_bind[i]
-        c = af_model._pdb["idx"]["chain"][i]
-        r = af_model._pdb["idx"]["residue"][i]
+        c = df["chain"][i]
+        r = df["resi"][i]
         pymol_cmd += f" resi {r}"
         if n < top_n - 1:
             pymol_cmd += " +"
@@ -184,7 +107,41 @@ def run_af2bind(target_pdb, target_chain, mask_sidechains=True, mask_sequence=Fa
     return pymol_cmd
 
     
-def grid_coordinate(target_pdb, pymol_cmd):
+def get_selection_info_pymol(protein_structure, pymol_cmd):
+    """
+    Centers of mass and coordinates of the protein and the selected residues, computed with PyMOL.
+    """
+    import __main__
+    import pymol
+
+    __main__.pymol_argv = ['pymol', '-qc']  # Quiet and no GUI
+    pymol.finish_launching()
+
+    # Load protein structure
+    pymol.cmd.load(protein_structure, 'target_protein')
+    binding_res_coords = pymol.cmd.centerofmass(pymol_cmd)
+    protein_coords = pymol.cmd.centerofmass('target_protein')
+    atom_coords = pymol.cmd.get_coords("target_protein")
+    pymol.cmd.select('binding_res', pymol_cmd)
+    atom_coords_bres = pymol.cmd.get_coords("binding_res")
+
+    # Quit PyMOL
+    pymol.cmd.quit()
+    return binding_res_coords, protein_coords, atom_coords, atom_coords_bres
+
+
+def get_selection_info(protein_structure, pymol_cmd):
+    """
+    Centers of mass and coordinates of the protein and the selected residues, computed
+    without PyMOL on a NumPy structure model.
+    """
+    structure = Structure.from_pdb(protein_structure)
+    binding_res = structure.select(pymol_cmd)
+    return (binding_res.centerofmass(), structure.centerofmass(),
+            structure.coords, binding_res.coords)
+
+
+def grid_coordinate(target_pdb, pymol_cmd, tolerance=None, use_pymol=False):
     """
     Calculate the grid coordinate (center of mass) from the list of selected residues
 
@@ -193,6 +150,9 @@ def grid_coordinate(target_pdb, pymol_cmd):
                                          according to the Alphafold database), 
                                or as an empty string first, and provides path for to the pdb-file
         `pymol_cmd (string)`: selected list of binding residues e.g. "resi 112 + resi 137 + resi 149 + resi 115"
+        `tolerance (float)`: maximum error of the diameters in Angstrom, None computes them exactly
+        `use_pymol (bool)`: compute the centers of mass and coordinates with PyMOL instead of
+                            the headless NumPy structure model
 
     **Returns:**
         `summary (string)`: summary of the calculate the grid coordinate according to the selected list of binding residues
@@ -203,21 +163,15 @@ def grid_coordinate(target_pdb, pymol_cmd):
     """
 
     protein_structure = get_pdb(target_pdb)
-    
-    __main__.pymol_argv = ['pymol', '-qc']  # Quiet and no GUI
-    pymol.finish_launching()
 
-    # Load protein structure
-    pymol.cmd.load(protein_structure, 'target_protein')
-
-    # Initialize list to store binding residues
-    binding_res = set()
-    binding_res_coords = pymol.cmd.centerofmass(pymol_cmd)
+    if use_pymol:
+        selection_info = get_selection_info_pymol(protein_structure, pymol_cmd)
+    else:
+        selection_info = get_selection_info(protein_structure, pymol_cmd)
+    binding_res_coords, protein_coords, atom_coords, atom_coords_bres = selection_info
 
     # Define grid coordinates based on center of mass and size
     center_x, center_y, center_z = binding_res_coords
-
-    protein_coords = pymol.cmd.centerofmass('target_protein')
     
     # Print the overall center of mass
     print("Overall center of mass of binding residues:", binding_res_coords)
@@ -230,19 +184,11 @@ def grid_coordinate(target_pdb, pymol_cmd):
     print(f"Distance between the binding residues and protein = {euc_distance} nm")
 
     #get diameter of protein
-    atom_coords = pymol.cmd.get_coords("target_protein")
-    distances = np.linalg.norm(atom_coords[:, None] - atom_coords, axis=-1)
-    np.fill_diagonal(distances, 0)    # Set the diagonal elements to 0 to avoid self-distances
-    diameter = np.max(distances)
+    diameter = get_diameter(atom_coords, tolerance=tolerance)
     print("The diameter of the protein is:", diameter)
 
     #get diameter of binding residues
-    pymol.cmd.select('binding_res', pymol_cmd)
-    atom_coords_bres = pymol.cmd.get_coords("binding_res")
-    # Calculate the pairwise distances between all atoms
-    distances_bres = np.linalg.norm(atom_coords_bres[:, None] - atom_coords_bres, axis=-1)
-    np.fill_diagonal(distances_bres, 0)# Set the diagonal elements to 0 to avoid self-distances
-    diameter_bres = np.max(distances_bres)
+    diameter_bres = get_diameter(atom_coords_bres, tolerance=tolerance)
     # Print the diameter
     print("The diameter of the binding residues is:", diameter_bres)
 
@@ -273,9 +219,6 @@ def grid_coordinate(target_pdb, pymol_cmd):
 
     print(f"Output saved to {output_config_path}")
 
-    # Quit PyMOL
-    pymol.cmd.quit()
-
 def main():
     parser = argparse.ArgumentParser(description="Run AlphaFold2 and Binding Analysis")
     parser.add_argument("target", metavar="TARGET", type=str, help="Protein structure file or PDB code")
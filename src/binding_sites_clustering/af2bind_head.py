@@ -0,0 +1,232 @@
+"""
+The AF2Bind linear head, shared by the AF2Bind scripts and the batch runner.
+
+The head is translated from https://github.com/sokrypton/af2bind
+
+`af2bind` scores one target in NumPy. `af2bind_batch` scores a stack of pair
+representations with several head seeds at once. It folds the normalization
+into the weights and runs the head as one jitted einsum over the target-binder
+slices of the pair representation, so the concatenated feature matrix is never
+materialized.
+
+`af2bind_ensemble` evaluates every head seed on the same pair representation
+and reduces the per residue probabilities with a running (Welford) mean and
+standard deviation, so memory does not grow with the number of seeds.
+"""
+
+from functools import partial
+from typing import Dict, Optional, Sequence, Tuple
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from colabdesign.af.alphafold.common import residue_constants
+from scipy.special import expit as sigmoid
+
+from src.binding_sites_clustering.af2bind_params import load_af2bind_params
+
+BINDER_LEN = 20
+
+# Define aa_order dictionary
+aa_order = {v: k for k, v in residue_constants.restype_order.items()}
+
+
+def af2bind(outputs, mask_sidechains=True, seed=0):
+    """
+    Calculate the binding probabilities from the outputs of the AlphaFold model.
+
+    **Args:**
+        - `outputs (dict)`: The outputs from the AlphaFold model containing pairwise representations.
+        - `mask_sidechains (bool, optional)`: Whether to mask sidechains in the calculation. Default is `True`.
+        - `seed (int, optional)`: Seed for reproducibility. Default is `0`.
+
+    **Returns:**
+        - `dict`: A dictionary containing:
+        - `p_bind (numpy.ndarray)`: Binding probabilities for each residue.
+        - `p_bind_aa (numpy.ndarray)`: Binding probabilities for each amino acid.
+    """
+    pair_A = outputs["representations"]["pair"][:-20, -20:]
+    pair_B = outputs["representations"]["pair"][-20:, :-20].swapaxes(0, 1)
+    pair_A = pair_A.reshape(pair_A.shape[0], -1)
+    pair_B = pair_B.reshape(pair_B.shape[0], -1)
+    x = np.concatenate([pair_A, pair_B], -1)
+
+    # Get params (cached across calls)
+    p = load_af2bind_params(mask_sidechains=mask_sidechains, seed=seed)
+
+    # Get predictions
+    x = (x - p["mean"]) / p["std"]
+    x = (x * p["w"][:, 0]) + (p["b"] / x.shape[-1])
+    p_bind_aa = x.reshape(x.shape[0], 2, 20, -1).sum((1, 3))
+    p_bind = sigmoid(p_bind_aa.sum(-1))
+    return {"p_bind": p_bind, "p_bind_aa": p_bind_aa}
+
+
+def get_head_weights(mask_sidechains: bool = True,
+                     seeds: Sequence[int] = (0,)) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fold the AF2Bind normalization into the linear weights of one or more heads.
+
+    `((x - mean) / std) * w` summed over features equals `x @ (w / std)` minus
+    `mean @ (w / std)`, so each head reduces to a weight tensor and a per amino acid
+    bias.
+
+    Args:
+        mask_sidechains (bool): Whether to use the sidechain-masked heads.
+        seeds (Sequence[int]): Seeds of the heads to stack.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Weights of shape (seeds, 2, 20, channels) for
+        the pair_A/pair_B slices and biases of shape (seeds, 20).
+    """
+    weights, biases = [], []
+    for seed in seeds:
+        p = load_af2bind_params(mask_sidechains=mask_sidechains, seed=seed)
+        w = (p["w"][:, 0] / p["std"]).reshape(2, BINDER_LEN, -1)
+        mean = p["mean"].reshape(2, BINDER_LEN, -1)
+        weights.append(w)
+        biases.append(p["b"].reshape(-1)[0] / BINDER_LEN - (mean * w).sum((0, 2)))
+    return np.stack(weights).astype(np.float32), np.stack(biases).astype(np.float32)
+
+
+def _head(pair_A, pair_B, weights, biases):
+    # pair_A: (N, L, 20, C), pair_B: (N, 20, L, C), weights: (S, 2, 20, C)
+    p_bind_aa = (jnp.einsum("nlac,sac->nsla", pair_A, weights[:, 0])
+                 + jnp.einsum("nalc,sac->nsla", pair_B, weights[:, 1])
+                 + biases[None, :, None, :])
+    return jax.nn.sigmoid(p_bind_aa.sum(-1)), p_bind_aa
+
+
+@partial(jax.jit, static_argnames=("binder_len",))
+def _head_from_pair(pair, weights, biases, binder_len=BINDER_LEN):
+    return _head(pair[:, :-binder_len, -binder_len:], pair[:, -binder_len:, :-binder_len],
+                 weights, biases)
+
+
+def af2bind_batch(pairs, mask_sidechains: bool = True,
+                  seeds: Sequence[int] = (0,)) -> Dict[str, np.ndarray]:
+    """
+    Calculate the binding probabilities for a stack of pair representations.
+
+    **Args:**
+        - `pairs (array)`: Pair representations of shape (N, L + 20, L + 20, C), a list
+          of such arrays with the same shape, or a single (L + 20, L + 20, C) array.
+          Targets of different lengths must be padded to a common length first.
+        - `mask_sidechains (bool, optional)`: Whether to use the sidechain-masked heads. Default is `True`.
+        - `seeds (Sequence[int], optional)`: Seeds of the heads to evaluate. Default is `(0,)`.
+
+    **Returns:**
+        - `dict`: A dictionary containing:
+        - `p_bind (numpy.ndarray)`: Binding probabilities of shape (N, seeds, L).
+        - `p_bind_aa (numpy.ndarray)`: Binding logits per amino acid of shape (N, seeds, L, 20).
+    """
+    if isinstance(pairs, (list, tuple)):
+        pairs = jnp.stack([jnp.asarray(pair, dtype=jnp.float32) for pair in pairs])
+    else:
+        pairs = jnp.asarray(pairs, dtype=jnp.float32)
+        if pairs.ndim == 3:
+            pairs = pairs[None]
+    if pairs.ndim != 4:
+        raise ValueError(f"Expected pair representations of shape (N, L, L, C), got {pairs.shape}.")
+
+    weights, biases = get_head_weights(mask_sidechains=mask_sidechains, seeds=seeds)
+    p_bind, p_bind_aa = _head_from_pair(pairs, weights, biases)
+    return {"p_bind": np.asarray(p_bind), "p_bind_aa": np.asarray(p_bind_aa)}
+
+
+class RunningStats:
+    """
+    Running mean and standard deviation of equally shaped arrays (Welford's algorithm).
+    """
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean: Optional[np.ndarray] = None
+        self._m2: Optional[np.ndarray] = None
+
+    def update(self, x: np.ndarray) -> None:
+        """
+        Add one array to the running statistics.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        self.n += 1
+        if self.mean is None:
+            self.mean = x.copy()
+            self._m2 = np.zeros_like(x)
+            return
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def std(self) -> Optional[np.ndarray]:
+        """
+        Population standard deviation (ddof=0) of the arrays seen so far.
+        """
+        if self._m2 is None:
+            return None
+        return np.sqrt(self._m2 / self.n)
+
+
+def get_pair_slices(outputs) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the target-binder slices of the pair representation used by the AF2Bind head.
+
+    Args:
+        outputs (dict): The outputs from the AlphaFold model.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: `pair_A` of shape (L, 20, C) and `pair_B` of
+        shape (20, L, C).
+    """
+    pair = outputs["representations"]["pair"]
+    return (np.asarray(pair[:-BINDER_LEN, -BINDER_LEN:], dtype=np.float32),
+            np.asarray(pair[-BINDER_LEN:, :-BINDER_LEN], dtype=np.float32))
+
+
+_head_from_slices = jax.jit(_head)
+
+
+def af2bind_ensemble_slices(pair_A, pair_B, mask_sidechains: bool = True,
+                            seeds: Sequence[int] = (0,)) -> Dict[str, np.ndarray]:
+    """
+    Ensemble AF2Bind heads over pair representation slices, see `af2bind_ensemble`.
+
+    **Args:**
+        - `pair_A (array)`: Target-to-binder slice of shape (L, 20, C).
+        - `pair_B (array)`: Binder-to-target slice of shape (20, L, C).
+        - `mask_sidechains (bool, optional)`: Whether to use the sidechain-masked heads. Default is `True`.
+        - `seeds (Sequence[int], optional)`: Seeds of the heads in the ensemble. Default is `(0,)`.
+    """
+    if len(seeds) == 0:
+        raise ValueError("The ensemble needs at least one head seed.")
+    pair_A = jnp.asarray(pair_A, dtype=jnp.float32)[None]
+    pair_B = jnp.asarray(pair_B, dtype=jnp.float32)[None]
+
+    p_bind, p_bind_aa = RunningStats(), RunningStats()
+    for seed in seeds:
+        weights, biases = get_head_weights(mask_sidechains=mask_sidechains, seeds=(seed,))
+        o = _head_from_slices(pair_A, pair_B, weights, biases)
+        p_bind.update(o[0][0, 0])
+        p_bind_aa.update(o[1][0, 0])
+    return {"p_bind": p_bind.mean, "p_bind_std": p_bind.std, "p_bind_aa": p_bind_aa.mean}
+
+
+def af2bind_ensemble(outputs, mask_sidechains: bool = True,
+                     seeds: Sequence[int] = (0,)) -> Dict[str, np.ndarray]:
+    """
+    Calculate the mean and standard deviation of the binding probabilities over heads.
+
+    **Args:**
+        - `outputs (dict)`: The outputs from the AlphaFold model containing pairwise representations.
+        - `mask_sidechains (bool, optional)`: Whether to use the sidechain-masked heads. Default is `True`.
+        - `seeds (Sequence[int], optional)`: Seeds of the heads in the ensemble. Default is `(0,)`.
+
+    **Returns:**
+        - `dict`: A dictionary containing:
+        - `p_bind (numpy.ndarray)`: Mean binding probability for each residue.
+        - `p_bind_std (numpy.ndarray)`: Standard deviation of the binding probability over heads.
+        - `p_bind_aa (numpy.ndarray)`: Mean binding logits for each amino acid.
+    """
+    return af2bind_ensemble_slices(*get_pair_slices(outputs),
+                                   mask_sidechains=mask_sidechains, seeds=seeds)
@@ -0,0 +1,189 @@
+"""
+Process-pool execution of AF2Bind jobs.
+
+Each worker process builds one `BatchAF2BindRunner` (and AF design model) when it
+starts and then pulls jobs from the pool's task queue. Results are returned in
+the order of the submitted jobs, so the combined output is deterministic. A worker
+that dies (e.g. killed for running out of memory) or fails to build its model
+raises `BrokenProcessPool` instead of leaving the pool waiting for its result.
+
+XLA and the BLAS libraries size their thread pools to all cores by default,
+which oversubscribes the machine as soon as several workers run. The BLAS and
+OpenMP pools are capped to `threads_per_worker` through their environment
+variables. XLA has no flag for its thread count: it sizes its pools to the CPUs
+the process may run on when its backend is first created, so every worker is
+pinned to its own set of `threads_per_worker` CPUs before it builds its model.
+With one thread per worker, Eigen multithreading is switched off as well.
+"""
+
+import multiprocessing as mp
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from src.binding_sites_clustering.af2bind_batch import AF2BindJob, BatchAF2BindRunner
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                   "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+_worker_runner: Optional[BatchAF2BindRunner] = None
+
+
+def get_thread_env(n_threads: int) -> Dict[str, str]:
+    """
+    Get the environment variables that cap BLAS and OpenMP to `n_threads` threads.
+    XLA is only capped by them for a single thread (no Eigen multithreading); larger
+    caps need the CPU affinity of `pin_to_cpus`.
+
+    Args:
+        n_threads (int): Number of threads per process.
+
+    Returns:
+        Dict[str, str]: Environment variables to set.
+    """
+    env = {k: str(n_threads) for k in THREAD_ENV_VARS}
+    xla_flags = os.environ.get("XLA_FLAGS", "")
+    if n_threads <= 1 and "--xla_cpu_multi_thread_eigen" not in xla_flags:
+        xla_flags += " --xla_cpu_multi_thread_eigen=false"
+    env["XLA_FLAGS"] = xla_flags.strip()
+    return env
+
+
+def available_cpus() -> List[int]:
+    """
+    Get the CPUs this process may run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cpus(workers: int, threads_per_worker: int) -> List[List[int]]:
+    """
+    Split the available CPUs into one set of `threads_per_worker` CPUs per worker. If
+    there are fewer CPUs than workers need, the sets wrap around and are shared.
+
+    Args:
+        workers (int): Number of worker processes.
+        threads_per_worker (int): Number of CPUs per worker.
+
+    Returns:
+        List[List[int]]: The CPUs of every worker.
+    """
+    cpus = available_cpus()
+    size = max(1, min(threads_per_worker, len(cpus)))
+    return [[cpus[(i * size + k) % len(cpus)] for k in range(size)] for i in range(workers)]
+
+
+def pin_to_cpus(cpus: Sequence[int]) -> bool:
+    """
+    Restrict the current process to `cpus`. XLA and OpenMP then size their thread
+    pools to these CPUs, as long as they are created afterwards.
+
+    Returns:
+        bool: Whether the platform supports CPU affinity (Linux); elsewhere only the
+        environment variables cap the threads.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, set(cpus))
+    return True
+
+
+@contextmanager
+def thread_limited_env(n_threads: int) -> Iterator[None]:
+    """
+    Temporarily cap the thread count in `os.environ`, e.g. while starting workers.
+
+    Spawned worker processes copy the environment of the parent when they start, so
+    they see the capped values before XLA or BLAS are loaded.
+    """
+    saved = {k: os.environ.get(k) for k in (*THREAD_ENV_VARS, "XLA_FLAGS")}
+    os.environ.update(get_thread_env(n_threads))
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def _pin_worker(cpu_sets: "queue.Queue") -> None:
+    # Every worker takes its own CPU set; the XLA backend is created later, with the model.
+    # A worker started when all sets are taken runs unpinned rather than blocking.
+    try:
+        cpus = cpu_sets.get_nowait()
+    except queue.Empty:
+        return
+    pin_to_cpus(cpus)
+
+
+def _init_worker(runner_kwargs: Dict[str, Any], cpu_sets: "queue.Queue") -> None:
+    global _worker_runner
+    _pin_worker(cpu_sets)
+    _worker_runner = BatchAF2BindRunner(**runner_kwargs)
+
+
+def _predict_job(job: AF2BindJob) -> pd.DataFrame:
+    return _worker_runner.predict(job)  # type: ignore
+
+
+def run_parallel(jobs: Sequence[AF2BindJob], workers: int,
+                 threads_per_worker: Optional[int] = None,
+                 **runner_kwargs: Any) -> Iterator[Tuple[int, AF2BindJob, pd.DataFrame]]:
+    """
+    Score AF2Bind jobs in a pool of worker processes.
+
+    Args:
+        jobs (Sequence[AF2BindJob]): Targets to score.
+        workers (int): Number of worker processes, each with its own AF design model.
+        threads_per_worker (Optional[int]): XLA/BLAS threads per worker, i.e. the number
+        of CPUs every worker is pinned to. Defaults to the number of available CPUs
+        divided by `workers`.
+        **runner_kwargs: Arguments for the `BatchAF2BindRunner` of each worker.
+
+    Yields:
+        Tuple[int, AF2BindJob, pd.DataFrame]: Index of the job in `jobs`, the job and
+        its result table, in the order of `jobs`.
+
+    Raises:
+        BrokenProcessPool: If a worker process dies or fails to build its model.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return
+    workers = max(1, min(workers, len(jobs)))
+    if threads_per_worker is None:
+        threads_per_worker = max(1, len(available_cpus()) // workers)
+
+    ctx = mp.get_context("spawn")
+    cpu_sets = ctx.Queue()
+    for cpus in partition_cpus(workers, threads_per_worker):
+        cpu_sets.put(cpus)
+    with thread_limited_env(threads_per_worker):
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                       initializer=_init_worker, initargs=(runner_kwargs, cpu_sets))
+        # The workers copy the environment when they start, so start them all here
+        futures = [executor.submit(_predict_job, job) for job in jobs]
+    try:
+        for i, future in enumerate(futures):
+            yield i, jobs[i], future.result()
+    finally:
+        # Drop the pending jobs if the caller stops early or a job failed
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_parallel_all(jobs: Sequence[AF2BindJob], workers: int,
+                     threads_per_worker: Optional[int] = None,
+                     **runner_kwargs: Any) -> List[pd.DataFrame]:
+    """
+    Score AF2Bind jobs in a pool of worker processes and return the result tables in
+    the order of `jobs`. See `run_parallel` for the arguments.
+    """
+    return [df for _, _, df in run_parallel(jobs, workers, threads_per_worker, **runner_kwargs)]
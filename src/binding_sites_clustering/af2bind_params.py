@@ -0,0 +1,198 @@
+"""
+Process-wide registry for the AF2Bind linear head parameters.
+
+The AF2Bind head is stored as one pickle per (mask_sidechains, seed) variant in
+`af2bind_params/attempt_7_2k_lam0-03`. Loading a pickle and rebuilding the
+parameter dict on every `af2bind()` call is wasted work when many chains are
+scored, so the registry loads each variant once and keeps it as contiguous
+float32 arrays.
+
+Optionally the arrays are exported to `.npy` files and opened memory-mapped,
+so worker processes that point at the same `mmap_dir` share one physical copy
+through the page cache.
+"""
+
+import glob
+import os
+import pickle
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+AF2BIND_PARAMS_DIR = "af2bind_params/attempt_7_2k_lam0-03"
+PARAM_KEYS = ("mean", "std", "w", "b")
+
+
+def get_model_type(mask_sidechains: bool = True, seed: int = 0) -> str:
+    """
+    Get the name of the AF2Bind parameter file for a head variant.
+
+    Args:
+        mask_sidechains (bool): Whether the head was trained on sidechain-masked targets.
+        seed (int): Seed of the trained head.
+
+    Returns:
+        str: Model type, e.g. "split_nosc_pair_A_split_nosc_pair_B_0".
+    """
+    if mask_sidechains:
+        return f"split_nosc_pair_A_split_nosc_pair_B_{seed}"
+    return f"split_pair_A_split_pair_B_{seed}"
+
+
+class AF2BindParamRegistry:
+    """
+    Cache of AF2Bind head parameters keyed by (mask_sidechains, seed).
+    """
+
+    def __init__(self, params_dir: str = AF2BIND_PARAMS_DIR,
+                 mmap_dir: Optional[str] = None) -> None:
+        """
+        Initializes the registry.
+
+        Args:
+            params_dir (str): Directory containing the AF2Bind `.pickle` files.
+            mmap_dir (Optional[str]): Directory for memory-mapped `.npy` copies of the
+            parameters. If None, the parameters are kept in process memory.
+        """
+        self.params_dir = params_dir
+        self.mmap_dir = mmap_dir
+        self._params: Dict[Tuple[bool, int], Dict[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, mask_sidechains: bool = True, seed: int = 0) -> Dict[str, np.ndarray]:
+        """
+        Get the parameters of a head variant, loading them on first use.
+
+        Args:
+            mask_sidechains (bool): Whether to use the sidechain-masked head.
+            seed (int): Seed of the head.
+
+        Returns:
+            Dict[str, np.ndarray]: Read-only float32 arrays "mean", "std", "w" and "b".
+        """
+        key = (bool(mask_sidechains), int(seed))
+        params = self._params.get(key)
+        if params is None:
+            with self._lock:
+                params = self._params.get(key)
+                if params is None:
+                    params = self._load(*key)
+                    self._params[key] = params
+        return params
+
+    def available_seeds(self, mask_sidechains: bool = True) -> List[int]:
+        """
+        List the seeds of the heads available for a variant.
+
+        Args:
+            mask_sidechains (bool): Whether to list the sidechain-masked heads.
+
+        Returns:
+            List[int]: Sorted seeds with a parameter file in `params_dir`.
+        """
+        prefix = get_model_type(mask_sidechains, seed=0)[:-1]
+        seeds = []
+        for path in glob.glob(os.path.join(glob.escape(self.params_dir), f"{prefix}*.pickle")):
+            seed = os.path.basename(path)[len(prefix):-len(".pickle")]
+            if seed.isdigit():
+                seeds.append(int(seed))
+        return sorted(seeds)
+
+    def clear(self) -> None:
+        """
+        Drop all cached parameters.
+        """
+        with self._lock:
+            self._params.clear()
+
+    def _load(self, mask_sidechains: bool, seed: int) -> Dict[str, np.ndarray]:
+        model_type = get_model_type(mask_sidechains, seed)
+        if self.mmap_dir is None:
+            return self._load_pickle(model_type)
+
+        npy_dir = os.path.join(self.mmap_dir, model_type)
+        if not all(os.path.isfile(os.path.join(npy_dir, f"{k}.npy")) for k in PARAM_KEYS):
+            self._export_npy(self._load_pickle(model_type), npy_dir)
+        return {k: np.load(os.path.join(npy_dir, f"{k}.npy"), mmap_mode="r")
+                for k in PARAM_KEYS}
+
+    def _load_pickle(self, model_type: str) -> Dict[str, np.ndarray]:
+        pickle_path = os.path.join(self.params_dir, f"{model_type}.pickle")
+        with open(pickle_path, "rb") as handle:
+            params_ = pickle.load(handle)
+        params_ = dict(**params_["~"], **params_["linear"])
+
+        params = {}
+        for k in PARAM_KEYS:
+            x = np.ascontiguousarray(np.asarray(params_[k], dtype=np.float32))
+            x.setflags(write=False)
+            params[k] = x
+        return params
+
+    @staticmethod
+    def _export_npy(params: Dict[str, np.ndarray], npy_dir: str) -> None:
+        os.makedirs(npy_dir, exist_ok=True)
+        for k, x in params.items():
+            # Write to a temporary file first, so concurrent workers never
+            # memory-map a half written array
+            tmp_path = os.path.join(npy_dir, f".{k}.{os.getpid()}.npy")
+            np.save(tmp_path, x)
+            os.replace(tmp_path, os.path.join(npy_dir, f"{k}.npy"))
+
+
+_registry: Optional[AF2BindParamRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> AF2BindParamRegistry:
+    """
+    Get the process-wide parameter registry.
+
+    The parameter directory and the memory-map directory default to the
+    `AF2BIND_PARAMS_DIR` and `AF2BIND_MMAP_DIR` environment variables, so worker
+    processes pick up the same configuration as their parent.
+
+    Returns:
+        AF2BindParamRegistry: The shared registry.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = AF2BindParamRegistry(
+                    params_dir=os.environ.get("AF2BIND_PARAMS_DIR", AF2BIND_PARAMS_DIR),
+                    mmap_dir=os.environ.get("AF2BIND_MMAP_DIR"))
+    return _registry
+
+
+def configure_registry(params_dir: str = AF2BIND_PARAMS_DIR,
+                       mmap_dir: Optional[str] = None) -> AF2BindParamRegistry:
+    """
+    Replace the process-wide parameter registry.
+
+    Args:
+        params_dir (str): Directory containing the AF2Bind `.pickle` files.
+        mmap_dir (Optional[str]): Directory for memory-mapped `.npy` copies.
+
+    Returns:
+        AF2BindParamRegistry: The new shared registry.
+    """
+    global _registry
+    with _registry_lock:
+        _registry = AF2BindParamRegistry(params_dir=params_dir, mmap_dir=mmap_dir)
+    return _registry
+
+
+def load_af2bind_params(mask_sidechains: bool = True, seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Get the parameters of an AF2Bind head variant from the process-wide registry.
+
+    Args:
+        mask_sidechains (bool): Whether to use the sidechain-masked head.
+        seed (int): Seed of the head.
+
+    Returns:
+        Dict[str, np.ndarray]: Read-only float32 arrays "mean", "std", "w" and "b".
+    """
+    return get_registry().get(mask_sidechains=mask_sidechains, seed=seed)
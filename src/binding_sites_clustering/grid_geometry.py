@@ -0,0 +1,122 @@
+"""
+Geometry helpers for the docking grid box.
+
+The diameter (largest pairwise atom distance) of a structure is needed to size the
+grid box. Computing it from the full N×N distance matrix needs O(N²) memory, which
+does not fit for large cryo-EM assemblies. Here the farthest pair is searched only
+among the convex hull vertices (the farthest pair of a point set always lies on
+its hull) and the distances are reduced block by block, so the memory use is
+bounded by `max_block_elements`.
+
+With a `tolerance`, the points are first snapped to a voxel grid and only one
+point per voxel is kept. Every point moves by at most half a voxel diagonal, so
+the returned diameter is within `tolerance` of the exact value.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+try:
+    from scipy.spatial import ConvexHull, QhullError
+except ImportError:  # scipy is optional, the blockwise reduction is exact on its own
+    ConvexHull = None
+
+MAX_BLOCK_ELEMENTS = 1 << 22  # 4M distances, i.e. 32 MB of float64 per block
+
+
+def _as_coords(coords: np.ndarray) -> np.ndarray:
+    coords = np.asarray(coords, dtype=np.float64)
+    if coords.ndim != 2 or coords.shape[1] != 3:
+        raise ValueError(f"Expected coordinates of shape (N, 3), got {coords.shape}")
+    return coords
+
+
+def hull_vertices(coords: np.ndarray) -> np.ndarray:
+    """
+    Get the vertices of the convex hull of a point set.
+
+    Args:
+        coords (np.ndarray): Coordinates of shape (N, 3).
+
+    Returns:
+        np.ndarray: The hull vertices, or all points if scipy is not available or the
+        points are degenerate (e.g. fewer than 4 or coplanar points).
+    """
+    coords = _as_coords(coords)
+    if ConvexHull is None or len(coords) < 5:
+        return coords
+    try:
+        return coords[ConvexHull(coords).vertices]
+    except (QhullError, ValueError):
+        return coords
+
+
+def max_pairwise_distance(coords: np.ndarray, max_block_elements: int = MAX_BLOCK_ELEMENTS) -> float:
+    """
+    Exact largest pairwise distance of a point set with bounded memory.
+
+    Args:
+        coords (np.ndarray): Coordinates of shape (N, 3).
+        max_block_elements (int): Maximum number of distances held in memory at once.
+
+    Returns:
+        float: The largest pairwise distance (0 for fewer than 2 points).
+    """
+    coords = _as_coords(coords)
+    n = len(coords)
+    if n < 2:
+        return 0.0
+
+    sq_norms = np.einsum("ij,ij->i", coords, coords)
+    rows = max(1, max_block_elements // n)
+    max_sq = 0.0
+    for start in range(0, n, rows):
+        stop = min(start + rows, n)
+        # Only compare against the points from `start` on, the rest is already covered
+        block = coords[start:stop]
+        other = coords[start:]
+        sq = sq_norms[start:stop, None] + sq_norms[None, start:] - 2.0 * block @ other.T
+        max_sq = max(max_sq, float(sq.max()))
+    return float(np.sqrt(max(max_sq, 0.0)))
+
+
+def snap_to_grid(coords: np.ndarray, spacing: float) -> np.ndarray:
+    """
+    Keep one point per cubic voxel of edge length `spacing`.
+
+    Args:
+        coords (np.ndarray): Coordinates of shape (N, 3).
+        spacing (float): Voxel edge length.
+
+    Returns:
+        np.ndarray: The voxel centers of the occupied voxels.
+    """
+    coords = _as_coords(coords)
+    if spacing <= 0:
+        raise ValueError("The grid spacing must be positive")
+    voxels = np.unique(np.floor(coords / spacing).astype(np.int64), axis=0)
+    return (voxels + 0.5) * spacing
+
+
+def diameter(coords: np.ndarray, tolerance: Optional[float] = None,
+             max_block_elements: int = MAX_BLOCK_ELEMENTS) -> float:
+    """
+    Largest pairwise distance of a point set, e.g. all atoms of a protein.
+
+    Args:
+        coords (np.ndarray): Coordinates of shape (N, 3).
+        tolerance (Optional[float]): Maximum absolute error of the result. If None
+        (default), the exact diameter is computed.
+        max_block_elements (int): Maximum number of distances held in memory at once.
+
+    Returns:
+        float: The diameter, exact or within `tolerance` of the exact value.
+    """
+    coords = _as_coords(coords)
+    if tolerance is not None:
+        if tolerance <= 0:
+            raise ValueError("The tolerance must be positive")
+        # Points move by at most spacing * sqrt(3) / 2, so distances by at most spacing * sqrt(3)
+        coords = snap_to_grid(coords, tolerance / np.sqrt(3))
+    return max_pairwise_distance(hull_vertices(coords), max_block_elements)
@@ -1,4 +1,154 @@
-import os
+"""
+This module downloads PDB files in bulk.
 
-from src.pdbqt_preparation.extract_protein import process_pdb_files
-from src.pdbqt_preparation.protonation import protonate_and_convert
+The PDB IDs are given on the command line and/or in a text file, and are fetched
+concurrently over one pooled HTTP session, e.g.:
+
+python -m src.pdb_retrival 6o0k 1yer -f ids.txt -o ./data/raw -w 16
+
+With `--mirror`, the files are kept gzip-compressed in a local mirror directory and
+only downloaded or revalidated when they are missing or stale. The mirror always
+stores compressed files, so `--compressed` is rejected with it.
+
+With triage options, entries are filtered by their metadata before any download,
+e.g. X-ray structures of at most 2.5 Å with a ligand:
+
+python -m src.pdb_retrival -f ids.txt --max_resolution 2.5 --method "X-RAY DIFFRACTION" --require_ligand
+
+The metadata is read from a JSONL file of `pdb_retrival.harvester` (`--metadata`),
+and entries missing there are queried from the RCSB Data API.
+
+`--metrics_log` appends a JSONL event per download (duration, bytes, retries) and
+`--summary` prints a table of the per-stage metrics at the end.
+"""
+
+import argparse
+import sys
+from typing import Any, Dict, List, Optional
+
+from src.pdb_retrival.bulk_downloader import create_session, download_pdbs, read_pdb_ids
+from src.pdb_retrival.graphql_retriever import GraphQLDataRetriever
+from src.pdb_retrival.harvester import JSONLResultStore
+from src.pdb_retrival.metrics import configure_metrics, get_recorder
+from src.pdb_retrival.mirror import DEFAULT_MAX_AGE, StructureMirror
+from src.pdb_retrival.triage import (Predicate, chain_count, has_ligand, max_resolution, method_in,
+                                     triage)
+
+
+def get_predicates(args: argparse.Namespace) -> List[Predicate]:
+    """
+    Builds the triage predicates from the command line arguments.
+    """
+    predicates = []
+    if args.max_resolution is not None:
+        predicates.append(max_resolution(args.max_resolution))
+    if args.method:
+        predicates.append(method_in(*args.method))
+    if args.ligand:
+        predicates.append(has_ligand(*args.ligand))
+    elif args.require_ligand:
+        predicates.append(has_ligand())
+    if args.min_chains is not None or args.max_chains is not None:
+        predicates.append(chain_count(args.min_chains or 1, args.max_chains))
+    return predicates
+
+
+def get_metadata(pdb_ids: List[str],
+                 metadata_file: Optional[str] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Gets the parsed metadata of the PDB IDs from a harvester JSONL file and, for the
+    entries missing there, from the RCSB Data API.
+    """
+    metadata: Dict[str, Optional[Dict[str, Any]]] = {}
+    if metadata_file is not None:
+        metadata = {pdb_id: record.get("data")
+                    for pdb_id, record in JSONLResultStore(metadata_file).load().items()}
+    missing = [pdb_id for pdb_id in pdb_ids if metadata.get(pdb_id.lower()) is None]
+    if missing:
+        for pdb_id, data in GraphQLDataRetriever().retrieve(missing).items():
+            metadata[pdb_id.lower()] = data
+    return metadata
+
+
+def main():
+    """
+    Main function to download the given PDB IDs concurrently.
+    """
+    parser = argparse.ArgumentParser(description="Download PDB files in bulk")
+    parser.add_argument("pdb_ids", metavar="PDB_ID", type=str, nargs="*", help="4-letter PDB codes")
+    parser.add_argument("-f", "--file", type=str, default=None,
+                        help="Text file with PDB IDs separated by whitespace or commas")
+    parser.add_argument("-o", "--output_dir", type=str, default=".", help="Directory for the PDB files")
+    parser.add_argument("-w", "--workers", type=int, default=8,
+                        help="Maximum number of concurrent downloads (default: 8)")
+    parser.add_argument("-r", "--retries", type=int, default=3,
+                        help="Maximum number of retries per file (default: 3)")
+    parser.add_argument("--overwrite", action="store_true", help="Download files that already exist")
+    parser.add_argument("-z", "--compressed", action="store_true",
+                        help="Download gzip-compressed files, falling back to mmCIF if there is no PDB file "
+                             "(not with --mirror, which always stores gzip-compressed files)")
+    parser.add_argument("-m", "--mirror", type=str, default=None,
+                        help="Local mirror directory; the files are stored there gzip-compressed")
+    parser.add_argument("--max_age_days", type=float, default=DEFAULT_MAX_AGE / 86400,
+                        help="Days after which mirrored files are revalidated (default: 7)")
+    parser.add_argument("--metrics_log", type=str, default=None,
+                        help="JSONL file the timing and transfer events are appended to")
+    parser.add_argument("--summary", action="store_true",
+                        help="Print a table of the timing and transfer metrics at the end")
+    triage_group = parser.add_argument_group("triage", "Download only entries whose metadata pass")
+    triage_group.add_argument("--max_resolution", type=float, default=None,
+                              help="Maximum resolution in Å")
+    triage_group.add_argument("--method", type=str, action="append", default=[],
+                              help="Allowed experimental method, e.g. 'X-RAY DIFFRACTION' (repeatable)")
+    triage_group.add_argument("--ligand", type=str, action="append", default=[],
+                              help="Required ligand ID, any of the given ones (repeatable)")
+    triage_group.add_argument("--require_ligand", action="store_true",
+                              help="Require a small molecule other than common additives")
+    triage_group.add_argument("--min_chains", type=int, default=None,
+                              help="Minimum number of unique protein chains")
+    triage_group.add_argument("--max_chains", type=int, default=None,
+                              help="Maximum number of unique protein chains")
+    triage_group.add_argument("--metadata", type=str, default=None,
+                              help="JSONL file of the metadata harvester to read the metadata from")
+    args = parser.parse_args()
+    if args.mirror is not None and args.compressed:
+        parser.error("--compressed cannot be combined with --mirror, which always stores gzip-compressed files")
+    recorder = configure_metrics(args.metrics_log) if args.metrics_log is not None else get_recorder()
+
+    pdb_ids = list(args.pdb_ids)
+    if args.file is not None:
+        pdb_ids += read_pdb_ids(args.file)
+    if not pdb_ids:
+        parser.error("No PDB IDs given")
+
+    predicates = get_predicates(args)
+    if predicates:
+        pdb_ids, rejected = triage(pdb_ids, get_metadata(pdb_ids, args.metadata), predicates)
+        for pdb_id, reason in rejected.items():
+            print(f"Skipping {pdb_id}: fails {reason}")
+        print(f"{len(pdb_ids)} of {len(pdb_ids) + len(rejected)} entries pass the triage")
+        if not pdb_ids:
+            return
+
+    if args.mirror is not None:
+        session = create_session(pool_size=args.workers, retries=args.retries)
+        with StructureMirror(args.mirror, max_age=args.max_age_days * 86400, session=session) as mirror:
+            results = mirror.fetch_pdbs(pdb_ids, max_workers=args.workers, force=args.overwrite)
+        output_dir = args.mirror
+    else:
+        results = download_pdbs(pdb_ids, output_dir=args.output_dir, max_workers=args.workers,
+                                retries=args.retries, skip_existing=not args.overwrite,
+                                compressed=args.compressed)
+        output_dir = args.output_dir
+    failed = [pdb_id for pdb_id, path in results.items() if path is None]
+    print(f"Downloaded {len(results) - len(failed)} of {len(results)} PDB files to {output_dir}")
+    if args.summary:
+        print(recorder.format_summary())
+    recorder.close()
+    if failed:
+        print(f"Failed: {' '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import requests  # type: ignore
+from requests.adapters import HTTPAdapter  # type: ignore
+from urllib3.util.retry import Retry  # type: ignore
+
+from src.pdb_retrival.downloader import (CHUNK_SIZE, PDB_DOWNLOAD_URL, STRUCTURE_FORMATS,
+                                         download_structure, download_to_file, validate_pdb_id)
+from src.pdb_retrival.metrics import get_recorder
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def create_session(pool_size: int = 8, retries: int = 3,
+                   backoff_factor: float = 0.5) -> requests.Session:
+    """
+    Creates an HTTP session with a connection pool and retries with exponential
+    backoff on connection errors and transient server errors.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections per host.
+        retries (int): Maximum number of retries per request.
+        backoff_factor (float): Backoff factor between retries in seconds; the n-th
+        retry waits `backoff_factor * 2 ** (n - 1)` seconds.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(total=retries,
+                  backoff_factor=backoff_factor,
+                  status_forcelist=RETRY_STATUS_CODES,
+                  allowed_methods=frozenset(["GET", "HEAD"]),
+                  respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download_pdbs(pdb_ids: Iterable[str],
+                  output_dir: str = ".",
+                  max_workers: int = 8,
+                  retries: int = 3,
+                  backoff_factor: float = 0.5,
+                  url_template: str = PDB_DOWNLOAD_URL,
+                  skip_existing: bool = True,
+                  session: Optional[requests.Session] = None,
+                  compressed: bool = False) -> Dict[str, Optional[str]]:
+    """
+    Downloads many PDB files concurrently over one pooled HTTP session.
+
+    Args:
+        pdb_ids (Iterable[str]): 4-letter PDB codes. Duplicates are downloaded once.
+        output_dir (str): Directory for the downloaded `{pdb_id}.pdb` files.
+        max_workers (int): Maximum number of concurrent downloads.
+        retries (int): Maximum number of retries per file.
+        backoff_factor (float): Backoff factor between retries in seconds.
+        url_template (str): Download URL with a `{pdb_id}` placeholder.
+        skip_existing (bool): Do not download files that already exist in `output_dir`.
+        session (Optional[requests.Session]): Session to use instead of a new one.
+        compressed (bool): Download the gzip-compressed files and decompress them while
+        they stream in, falling back to mmCIF (`{pdb_id}.cif`) for entries without a PDB
+        format file. `url_template` is not used.
+
+    Returns:
+        Dict[str, Optional[str]]: Path of the downloaded file per PDB ID, or None if the
+        download failed, in the order of `pdb_ids`.
+
+    Raises:
+        ValueError: If a PDB ID is not valid.
+    """
+    pdb_ids = list(dict.fromkeys(pdb_ids))
+    for pdb_id in pdb_ids:
+        if not validate_pdb_id(pdb_id):
+            raise ValueError(f"Invalid PDB ID format: '{pdb_id}' must be a 4-letter PDB code.")
+    os.makedirs(output_dir, exist_ok=True)
+    if session is None:
+        session = create_session(pool_size=max_workers, retries=retries,
+                                 backoff_factor=backoff_factor)
+
+    def download(pdb_id: str) -> Optional[str]:
+        output_path = os.path.join(output_dir, f"{pdb_id}.pdb")
+        if skip_existing:
+            for fmt in (STRUCTURE_FORMATS if compressed else ("pdb",)):
+                existing_path = os.path.join(output_dir, f"{pdb_id}.{fmt}")
+                if os.path.exists(existing_path):
+                    return existing_path
+        try:
+            if compressed:
+                return download_structure(pdb_id, output_dir, session=session)
+            with get_recorder().timer("download", pdb_id) as event:
+                return download_to_file(session, url_template.format(pdb_id=pdb_id), output_path,
+                                        event=event)
+        except (requests.exceptions.RequestException, EOFError, zlib.error) as e:
+            print(f"Failed to download PDB file {pdb_id}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(download, pdb_ids))
+    return dict(zip(pdb_ids, results))
+
+
+def read_pdb_ids(filename: str) -> List[str]:
+    """
+    Reads PDB IDs from a text file, separated by whitespace or commas. Lines starting
+    with "#" are ignored.
+
+    Args:
+        filename (str): Path to the text file.
+
+    Returns:
+        List[str]: The PDB IDs in file order.
+    """
+    pdb_ids = []
+    with open(filename, "r") as f:
+        for line in f:
+            if line.lstrip().startswith("#"):
+                continue
+            pdb_ids.extend(token for token in re.split(r"[\s,]+", line) if token)
+    return pdb_ids
@@ -1,12 +1,62 @@
 import re
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple, Union
 
 import requests
-from bs4 import BeautifulSoup, ResultSet, Tag
-
-from pdb_retrival.downloader import validate_pdb_id
+from bs4 import BeautifulSoup, ResultSet, SoupStrainer, Tag
+
+# Import through `src` like the rest of the package, so that the process-wide metrics
+# recorder is shared; fall back to `pdb_retrival` if only `src` is on the path
+try:
+    from src.pdb_retrival.downloader import validate_pdb_id
+    from src.pdb_retrival.metadata_cache import MetadataCache
+    from src.pdb_retrival.metrics import CACHE_HIT, count_retries, get_recorder
+except ImportError:
+    from pdb_retrival.downloader import validate_pdb_id  # type: ignore
+    from pdb_retrival.metadata_cache import MetadataCache  # type: ignore
+    from pdb_retrival.metrics import CACHE_HIT, count_retries, get_recorder  # type: ignore
+
+try:
+    import lxml  # type: ignore  # noqa: F401
+    FAST_HTML_PARSER = "lxml"
+except ImportError:
+    FAST_HTML_PARSER = "html.parser"
+
+# Ids of the elements of the RCSB structure page that parse_data reads
+METADATA_ELEMENT_IDS = frozenset([
+    "exp_header_0_method",
+    "exp_header_0_diffraction_resolution",
+    "header_deposited-released-dates",
+    "macromolecule-entityId-1-rowDescription",
+    "contentStructureWeight",
+    "contentProteinChainCount",
+    "header_classification",
+    "header_organism",
+    "header_expression-system",
+    "header_mutation",
+    "smallMoleculespanel",
+    "binding-affinity-table",
+])
+
+
+class ElementIndex:
+    """
+    Stand-in for a BeautifulSoup tree that answers top-level `find` calls by element
+    id from a dictionary built in one traversal, instead of walking the tree per call.
+    """
 
-#from src.pdb_retrival.downloader import validate_pdb_id
+    def __init__(self, soup: BeautifulSoup) -> None:
+        self.by_id: Dict[str, Tag] = {}
+        for tag in soup.find_all(id=True):
+            self.by_id.setdefault(tag["id"], tag)
+
+    def find(self, name: Optional[str] = None, attrs: Optional[Dict[str, Any]] = None,
+             id: Optional[str] = None, **kwargs: Any) -> Optional[Tag]:
+        if id is None and attrs is not None:
+            id = attrs.get("id")
+        tag = self.by_id.get(id) if id is not None else None
+        if tag is None or (name is not None and tag.name != name):
+            return None
+        return tag
 
 
 class PDBDataRetriever:
@@ -14,12 +64,14 @@ class PDBDataRetriever:
     Class to retrieve and parse PDB data from the RCSB website.
     """
 
-    def __init__(self, pdb_id: str) -> None:
+    def __init__(self, pdb_id: str, cache: Optional[MetadataCache] = None) -> None:
         """
         Initializes the PDBDataRetriever with a PDB ID.
 
         Args:
             pdb_id (str): The PDB ID to retrieve data for.
+            cache (Optional[MetadataCache]): Cache of pages and parsed data, shared
+            between retrievers.
 
         Raises:
             ValueError: If the PDB ID is not valid.
@@ -28,6 +80,7 @@ class PDBDataRetriever:
             raise ValueError("Invalid PDB ID format: It must be a 4-letter PDB code.")
         self.pdb_id = pdb_id
         self.url = f"https://www.rcsb.org/structure/{pdb_id}"
+        self.cache = cache
 
     def fetch_data(self) -> Optional[str]:
         """
@@ -37,25 +90,70 @@ class PDBDataRetriever:
             Optional[str]: The HTML content if the request is successful, otherwise
             None.
         """
+        recorder = get_recorder()
+        if self.cache is not None:
+            html_content = self.cache.get(self.pdb_id, "html")
+            if html_content is not None:
+                recorder.record("fetch_metadata", self.pdb_id, status=CACHE_HIT)
+                return html_content
         try:
-            response = requests.get(self.url, timeout=10)
-            response.raise_for_status()
-            return response.text
+            with recorder.timer("fetch_metadata", self.pdb_id) as event:
+                response = requests.get(self.url, timeout=10)
+                response.raise_for_status()
+                event["bytes"] = len(response.content) if isinstance(response.content, bytes) else 0
+                event["retries"] = count_retries(response)
         except requests.exceptions.RequestException as e:
             print(f"Failed to retrieve data: {e}")
             return None
+        if self.cache is not None:
+            self.cache.put(self.pdb_id, response.text, "html")
+        return response.text
 
-    def parse_data(self, html_content: str) -> Dict[str, Any]:
+    def retrieve_data(self) -> Optional[Dict[str, Any]]:
+        """
+        Fetches and parses the data for the given PDB ID, using the parsed data in the
+        cache if there is any.
+
+        Returns:
+            Optional[Dict[str, Any]]: The parsed data if the request is successful,
+            otherwise None.
+        """
+        if self.cache is not None:
+            data = self.cache.get(self.pdb_id, "data")
+            if data is not None:
+                get_recorder().record("parse_metadata", self.pdb_id, status=CACHE_HIT)
+                return data
+        html_content = self.fetch_data()
+        if html_content is None:
+            return None
+        data = self.parse_data(html_content)
+        if self.cache is not None:
+            self.cache.put(self.pdb_id, data, "data")
+        return data
+
+    def parse_data(self, html_content: str, fast: bool = True) -> Dict[str, Any]:
         """
         Parses the HTML content to extract various data fields.
 
         Args:
             html_content (str): The HTML content to parse.
+            fast (bool): Only build the tree of the relevant elements (with lxml if it
+            is installed) and look them up by id from one traversal. If False, the full
+            page is parsed with the pure-Python html.parser.
 
         Returns:
             Dict[str, Any]: A dictionary containing parsed data fields.
         """
-        soup = BeautifulSoup(html_content, "html.parser")
+        with get_recorder().timer("parse_metadata", self.pdb_id):
+            return self._parse_data(html_content, fast)
+
+    def _parse_data(self, html_content: str, fast: bool) -> Dict[str, Any]:
+        soup: Union[BeautifulSoup, ElementIndex]
+        if fast:
+            soup = self.build_element_index(html_content)
+        else:
+            soup = BeautifulSoup(html_content, "html.parser")
+        binding_affinity_name, binding_affinity_value = self.get_binding_affinity(soup)  # type: ignore
 
         data = {  # type: ignore
             "experiment_data": {
@@ -74,8 +172,8 @@ class PDBDataRetriever:
             },
             "small_molecules": self.get_small_molecules(soup),
             "binding_affinity": {
-                "name": self.get_binding_affinity_name(soup),
-                "value": self.get_binding_affinity_value(soup)
+                "name": binding_affinity_name,
+                "value": binding_affinity_value
             }
         }
 
@@ -87,6 +185,21 @@ class PDBDataRetriever:
 
         return data  # type: ignore
 
+    def build_element_index(self, html_content: str) -> ElementIndex:
+        """
+        Parses only the elements listed in `METADATA_ELEMENT_IDS` (and their children)
+        and indexes them by id.
+
+        Args:
+            html_content (str): The HTML content to parse.
+
+        Returns:
+            ElementIndex: The elements by id, usable in place of the soup by the get_*
+            methods.
+        """
+        strainer = SoupStrainer(id=lambda x: x in METADATA_ELEMENT_IDS)
+        return ElementIndex(BeautifulSoup(html_content, FAST_HTML_PARSER, parse_only=strainer))
+
     def get_experiment_method(self, soup: BeautifulSoup) -> Optional[str]:
         """
         Extracts the experiment method from the HTML content.
@@ -389,6 +502,37 @@ class PDBDataRetriever:
         return None
 
   
+    def get_binding_affinity(self, soup: BeautifulSoup) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Extracts the binding affinity name and value from the HTML content, with a single
+        lookup of the binding affinity table.
+
+        Args:
+            soup (BeautifulSoup): The parsed HTML content.
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: The binding affinity name and value, each
+            None if not found.
+        """
+        table = soup.find("table", {"class": "table table-bordered table-condensed",
+                                    "id": "binding-affinity-table"})
+        if not table:
+            return None, None
+
+        name = None
+        tbody = table.find("tbody")  # type: ignore
+        row = tbody.find("tr") if tbody else None  # type: ignore
+        name_cell = row.find("td") if row else None  # type: ignore
+        if name_cell:
+            name = name_cell.get_text(strip=True)  # type: ignore
+
+        value = None
+        row = table.find("tr", id="row_0")  # type: ignore
+        cells = row.find_all("td") if row else []  # type: ignore
+        if len(cells) > 2:
+            value = cells[2].get_text(strip=True).replace("\xa0", " ")  # type: ignore
+        return name, value
+
     def print_data_retriever(self, data: Dict[str, Any]) -> None:
         """
         Prints the retrieved data in a readable format.
@@ -434,9 +578,12 @@ class PDBDataRetriever:
 
 
 if __name__ == "__main__":
-    # Example PDB ID for testing: "1sqt" w/ binding affinity
-    retriever = PDBDataRetriever("6o0k")
-    html_content = retriever.fetch_data()
-    if html_content:
-        parsed_data = retriever.parse_data(html_content)
-        retriever.print_data_retriever(parsed_data) 
+    # Example PDB ID for testing: "1sqt" w/ binding affinity.
+    # For many IDs, use the concurrent harvester in pdb_retrival.harvester.
+    import sys
+    for pdb_id in sys.argv[1:] or ["6o0k"]:
+        retriever = PDBDataRetriever(pdb_id)
+        html_content = retriever.fetch_data()
+        if html_content:
+            parsed_data = retriever.parse_data(html_content)
+            retriever.print_data_retriever(parsed_data) 
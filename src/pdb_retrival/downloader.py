@@ -1,9 +1,22 @@
+import os
 import re
-from typing import Optional
+import threading
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple
 
 import requests  # type: ignore
+from urllib3.exceptions import HTTPError as URLLib3HTTPError  # type: ignore
+
+from src.pdb_retrival.metrics import count_retries, get_recorder
 
 PDB_DOWNLOAD_URL = "https://files.wwpdb.org/download/{pdb_id}.pdb"
+# Compressed downloads per format, tried in the order of `formats`
+COMPRESSED_DOWNLOAD_URLS = {
+    "pdb": "https://files.wwpdb.org/download/{pdb_id}.pdb.gz",
+    "cif": "https://files.wwpdb.org/download/{pdb_id}.cif.gz",
+}
+STRUCTURE_FORMATS = ("pdb", "cif")
+CHUNK_SIZE = 1 << 16
 
 
 def validate_pdb_id(pdb_id: str) -> bool:
@@ -19,33 +32,271 @@ def validate_pdb_id(pdb_id: str) -> bool:
     return bool(re.fullmatch(r"^[A-Z0-9]{4}$", pdb_id, re.IGNORECASE))
 
 
-def get_pdb(pdb_id: str) -> Optional[str]:
+def iter_gunzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Decompresses a gzip stream chunk by chunk, so neither the compressed nor the
+    decompressed data has to be held in memory at once.
+
+    Args:
+        chunks (Iterable[bytes]): The compressed data, e.g. from
+        `Response.iter_content`.
+
+    Yields:
+        bytes: Decompressed data.
+
+    Raises:
+        EOFError: If the stream ends before the end of the compressed data.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            # A gzip file may consist of several members
+            chunk = decompressor.unused_data if decompressor.eof else b""
+            if chunk:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.flush()
+    if data:
+        yield data
+    if not decompressor.eof:
+        raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+
+def open_compressed_structure(pdb_id: str,
+                              formats: Sequence[str] = STRUCTURE_FORMATS,
+                              session: Optional[requests.Session] = None,
+                              timeout: float = 10,
+                              event: Optional[Dict[str, Any]] = None) -> Tuple[Iterator[bytes], str]:
+    """
+    Requests the gzip-compressed structure file of a PDB ID, falling back to the next
+    format if a format does not exist (e.g. large assemblies only exist as mmCIF).
+
+    Args:
+        pdb_id (str): 4-letter PDB code.
+        formats (Sequence[str]): Formats to try in order, "pdb" and/or "cif".
+        session (Optional[requests.Session]): HTTP session to use.
+        timeout (float): Connect and read timeout in seconds.
+        event (Optional[Dict[str, Any]]): Metrics event to count the compressed bytes,
+        retries and decompressed bytes in.
+
+    Returns:
+        Tuple[Iterator[bytes], str]: The decompressed contents as a stream of chunks,
+        and the format of the file.
+
+    Raises:
+        ValueError: If the PDB ID is not valid.
+        requests.exceptions.RequestException: If no format can be downloaded.
+    """
+    if not validate_pdb_id(pdb_id):
+        raise ValueError("Invalid PDB ID format: It must be a 4-letter PDB code.")
+    http = session if session is not None else requests
+    event = event if event is not None else {}
+    for i, fmt in enumerate(formats):
+        response = http.get(COMPRESSED_DOWNLOAD_URLS[fmt].format(pdb_id=pdb_id),
+                            timeout=timeout, stream=True)
+        event["retries"] = event.get("retries", 0) + count_retries(response)
+        if response.status_code == 404 and i < len(formats) - 1:
+            response.close()
+            continue
+        try:
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            response.close()
+            raise
+        event["format"] = fmt
+        return _stream_response(response, event), fmt
+    raise ValueError("No structure formats given.")
+
+
+def _stream_response(response: requests.Response, event: Dict[str, Any]) -> Iterator[bytes]:
+    # Read the raw body: the .gz file itself, even if the server declares it as
+    # Content-Encoding: gzip and requests would otherwise decompress it
+    def count(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            event["bytes"] = event.get("bytes", 0) + len(chunk)
+            yield chunk
+
+    event.setdefault("decompressed_bytes", 0)
+    with response:
+        try:
+            for data in iter_gunzip(count(response.raw.stream(CHUNK_SIZE, decode_content=False))):
+                event["decompressed_bytes"] += len(data)
+                yield data
+        except URLLib3HTTPError as e:
+            raise requests.exceptions.ConnectionError(e) from e
+
+
+def download_to_file(session: requests.Session, url: str, output_path: str,
+                     timeout: float = 10, chunk_size: int = CHUNK_SIZE,
+                     event: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Streams a URL to a file in chunks. The data is written to a temporary file that is
+    renamed once the download is complete, so no partial files are left behind.
+
+    Args:
+        session (requests.Session): HTTP session to use.
+        url (str): URL to download.
+        output_path (str): Path of the output file.
+        timeout (float): Connect and read timeout in seconds.
+        chunk_size (int): Size of the chunks written to disk in bytes.
+        event (Optional[Dict[str, Any]]): Metrics event to count the bytes and retries
+        in.
+
+    Returns:
+        str: The output path.
+
+    Raises:
+        requests.exceptions.RequestException: If the download fails.
+    """
+    event = event if event is not None else {}
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with session.get(url, timeout=timeout, stream=True) as response:
+            event["retries"] = count_retries(response)
+            response.raise_for_status()
+            event["bytes"] = 0
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    event["bytes"] += len(chunk)
+                    f.write(chunk)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+
+def download_structure(pdb_id: str,
+                       output_dir: str = ".",
+                       formats: Sequence[str] = STRUCTURE_FORMATS,
+                       session: Optional[requests.Session] = None,
+                       timeout: float = 10) -> str:
+    """
+    Downloads the gzip-compressed structure file of a PDB ID and decompresses it to
+    disk while it streams in. The PDB format is preferred; if it does not exist, the
+    mmCIF file is downloaded instead.
+
+    Args:
+        pdb_id (str): 4-letter PDB code.
+        output_dir (str): Directory for the `{pdb_id}.pdb` or `{pdb_id}.cif` file.
+        formats (Sequence[str]): Formats to try in order, "pdb" and/or "cif".
+        session (Optional[requests.Session]): HTTP session to use.
+        timeout (float): Connect and read timeout in seconds.
+
+    Returns:
+        str: Path of the downloaded file.
+
+    Raises:
+        ValueError: If the PDB ID is not valid.
+        requests.exceptions.RequestException: If no format can be downloaded.
+    """
+    with get_recorder().timer("download", pdb_id) as event:
+        chunks, fmt = open_compressed_structure(pdb_id, formats, session, timeout, event)
+        output_path = os.path.join(output_dir, f"{pdb_id}.{fmt}")
+        tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                for data in chunks:
+                    f.write(data)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return output_path
+
+
+def fetch_structure(pdb_id: str,
+                    formats: Sequence[str] = STRUCTURE_FORMATS,
+                    session: Optional[requests.Session] = None,
+                    timeout: float = 10) -> Tuple[bytes, str]:
+    """
+    Downloads the gzip-compressed structure file of a PDB ID into memory, e.g. for
+    `Structure.from_bytes`, without writing it to disk.
+
+    Args:
+        pdb_id (str): 4-letter PDB code.
+        formats (Sequence[str]): Formats to try in order, "pdb" and/or "cif".
+        session (Optional[requests.Session]): HTTP session to use.
+        timeout (float): Connect and read timeout in seconds.
+
+    Returns:
+        Tuple[bytes, str]: The decompressed contents and their format.
+    """
+    with get_recorder().timer("download", pdb_id) as event:
+        chunks, fmt = open_compressed_structure(pdb_id, formats, session, timeout, event)
+        buffer = bytearray()
+        for data in chunks:
+            buffer += data
+    return bytes(buffer), fmt
+
+
+def get_pdb(pdb_id: str, compressed: bool = False) -> Optional[str]:
     """
     Downloads the protein structure from the RCSB website by PDB ID.
 
+    By default, the uncompressed PDB file is fetched by the process-wide
+    `StructureResolver`, which streams it to disk over its pooled session (or takes
+    it from the mirror in `PDB_MIRROR_DIR`) and reuses a file downloaded before; if
+    the entry has no PDB format file, the mmCIF file is downloaded instead. With
+    `compressed`, the gzip-compressed file is downloaded and decompressed while it
+    streams in.
+
     Args:
         pdb_id (str): 4-letter PDB code from the RCSB website.
+        compressed (bool): Download the gzip-compressed file.
 
     Returns:
-        str: Filename of the downloaded PDB file.
+        Optional[str]: The filename of the downloaded file in the current path (for
+        plain files, the output directory of the resolver, by default the current
+        path), or None if it cannot be downloaded.
 
     Raises:
-        ValueError: If the PDB file cannot be downloaded.
+        ValueError: If the PDB ID is not valid.
     """
     if not validate_pdb_id(pdb_id):
         raise ValueError("Invalid PDB ID format: It must be a 4-letter PDB code.")
 
-    pdb_url = PDB_DOWNLOAD_URL.format(pdb_id=pdb_id)
+    if compressed:
+        try:
+            filename = download_structure(pdb_id)
+        except (requests.exceptions.RequestException, EOFError, zlib.error) as e:
+            print(f"Failed to download PDB file: {e}")
+            return None
+        print(f"Downloaded file in your current path: {os.path.basename(filename)}")
+        return filename
+
+    # Imported here, the resolver builds on this module
+    from src.pdb_retrival.resolver import get_resolver
     try:
-        response = requests.get(pdb_url,
-                                timeout=10)
-        response.raise_for_status()
-        pdb_filename = f"{pdb_id}.pdb"
-        with open(pdb_filename, "wb") as f:
-            f.write(response.content)
-        print(f"Downloaded file in your current path: {pdb_filename}")
+        pdb_filename = get_resolver().resolve(pdb_id)
     except requests.exceptions.RequestException as e:
+        response = getattr(e, "response", None)
+        if response is not None and response.status_code == 404:
+            print(f"No PDB format file of {pdb_id}, downloading mmCIF instead")
+            return _get_pdb_cif(pdb_id)
+        print(f"Failed to download PDB file: {e}")
+        return None
+    print(f"Downloaded file in your current path: {os.path.basename(pdb_filename)}")
+    return pdb_filename
+
+
+def _get_pdb_cif(pdb_id: str) -> Optional[str]:
+    """
+    Downloads the mmCIF file of a PDB ID to the current path.
+
+    Returns:
+        Optional[str]: The filename of the downloaded file, or None if it cannot be
+        downloaded.
+    """
+    try:
+        filename = download_structure(pdb_id, formats=("cif",))
+    except (requests.exceptions.RequestException, EOFError, zlib.error) as e:
         print(f"Failed to download PDB file: {e}")
+        return None
+    print(f"Downloaded file in your current path: {os.path.basename(filename)}")
+    return filename
 
 
 if __name__ == "__main__":
@@ -0,0 +1,193 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests  # type: ignore
+
+from src.pdb_retrival.bulk_downloader import create_session
+from src.pdb_retrival.downloader import validate_pdb_id
+from src.pdb_retrival.metrics import ERROR, count_retries, get_recorder
+
+RCSB_GRAPHQL_URL = "https://data.rcsb.org/graphql"
+
+ENTRIES_QUERY = """
+query entries($ids: [String!]!) {
+  entries(entry_ids: $ids) {
+    rcsb_id
+    exptl { method }
+    rcsb_accession_info { initial_release_date }
+    rcsb_entry_info {
+      resolution_combined
+      molecular_weight
+      polymer_entity_count_protein
+    }
+    struct_keywords { pdbx_keywords }
+    polymer_entities {
+      rcsb_id
+      rcsb_polymer_entity { pdbx_description }
+      rcsb_entity_source_organism { scientific_name }
+      rcsb_entity_host_organism { scientific_name }
+      entity_poly { rcsb_mutation_count }
+    }
+    nonpolymer_entities {
+      nonpolymer_comp { chem_comp { id name } }
+    }
+    rcsb_binding_affinity { comp_id type value unit }
+  }
+}
+"""
+
+
+class GraphQLDataRetriever:
+    """
+    Class to retrieve PDB metadata for many entries at once from the RCSB Data API
+    (GraphQL), instead of downloading and parsing one HTML page per entry.
+
+    The parsed data has the same shape as `PDBDataRetriever.parse_data`.
+    """
+
+    def __init__(self, url: str = RCSB_GRAPHQL_URL, batch_size: int = 100,
+                 session: Optional[requests.Session] = None, timeout: float = 30) -> None:
+        """
+        Initializes the GraphQLDataRetriever.
+
+        Args:
+            url (str): URL of the GraphQL endpoint.
+            batch_size (int): Maximum number of entries per query.
+            session (Optional[requests.Session]): HTTP session to use. Defaults to a
+            pooled session with retries.
+            timeout (float): Connect and read timeout in seconds.
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.session = session if session is not None else create_session()
+        self.timeout = timeout
+
+    def fetch_entries(self, pdb_ids: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Fetches the raw GraphQL entries of one batch of PDB IDs.
+
+        Args:
+            pdb_ids (List[str]): The PDB IDs of the batch.
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: The entries if the request is successful,
+            otherwise None.
+        """
+        try:
+            with get_recorder().timer("graphql") as event:
+                event["entries"] = len(pdb_ids)
+                response = self.session.post(self.url,
+                                             json={"query": ENTRIES_QUERY, "variables": {"ids": pdb_ids}},
+                                             timeout=self.timeout)
+                event["retries"] = count_retries(response)
+                response.raise_for_status()
+                event["bytes"] = len(response.content)
+                result = response.json()
+                if result.get("errors"):
+                    event["status"] = ERROR
+                    event["error"] = result["errors"][0].get("message")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Failed to retrieve data: {e}")
+            return None
+        if result.get("errors"):
+            print(f"Failed to retrieve data: {result['errors'][0].get('message')}")
+        return (result.get("data") or {}).get("entries") or []
+
+    def retrieve(self, pdb_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Retrieves and parses the metadata of many PDB entries in batched queries.
+
+        Args:
+            pdb_ids (Iterable[str]): The PDB IDs to retrieve data for.
+
+        Returns:
+            Dict[str, Optional[Dict[str, Any]]]: Parsed data per PDB ID (in the order of
+            `pdb_ids`), or None for entries that could not be retrieved.
+
+        Raises:
+            ValueError: If a PDB ID is not valid.
+        """
+        pdb_ids = list(dict.fromkeys(pdb_ids))
+        for pdb_id in pdb_ids:
+            if not validate_pdb_id(pdb_id):
+                raise ValueError(f"Invalid PDB ID format: '{pdb_id}' must be a 4-letter PDB code.")
+
+        results: Dict[str, Optional[Dict[str, Any]]] = {pdb_id: None for pdb_id in pdb_ids}
+        by_upper = {pdb_id.upper(): pdb_id for pdb_id in pdb_ids}
+        for start in range(0, len(pdb_ids), self.batch_size):
+            batch = [pdb_id.upper() for pdb_id in pdb_ids[start:start + self.batch_size]]
+            for entry in self.fetch_entries(batch) or []:
+                if entry and entry.get("rcsb_id", "").upper() in by_upper:
+                    results[by_upper[entry["rcsb_id"].upper()]] = self.parse_entry(entry)
+        return results
+
+    def parse_entry(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Converts a GraphQL entry to the data shape of `PDBDataRetriever.parse_data`.
+
+        Args:
+            entry (Dict[str, Any]): One entry of the GraphQL response.
+
+        Returns:
+            Dict[str, Any]: A dictionary containing parsed data fields.
+        """
+        info = entry.get("rcsb_entry_info") or {}
+        polymers = sorted(entry.get("polymer_entities") or [],
+                          key=lambda e: int(str(e.get("rcsb_id", "_0")).rsplit("_", 1)[-1] or 0))
+        first_polymer = polymers[0] if polymers else {}
+
+        resolution = info.get("resolution_combined")
+        weight = info.get("molecular_weight")
+        release_date = (entry.get("rcsb_accession_info") or {}).get("initial_release_date")
+        mutation_counts = [(p.get("entity_poly") or {}).get("rcsb_mutation_count") for p in polymers]
+        mutation_counts = [c for c in mutation_counts if c is not None]
+
+        data = {
+            "experiment_data": {
+                "method": _first(entry.get("exptl"), "method"),
+                "resolution": f"{resolution[0]:.2f} Å" if resolution else None,
+                "release_date": release_date[:10] if release_date else None,
+            },
+            "macromolecules": {
+                "name": (first_polymer.get("rcsb_polymer_entity") or {}).get("pdbx_description"),
+                "total_weight": f"{weight:.2f} kDa" if weight is not None else None,
+                "unique_protein_chains": info.get("polymer_entity_count_protein"),
+                "classification": (entry.get("struct_keywords") or {}).get("pdbx_keywords"),
+                "organism": _first(first_polymer.get("rcsb_entity_source_organism"), "scientific_name"),
+                "expression_system": _first(first_polymer.get("rcsb_entity_host_organism"),
+                                            "scientific_name"),
+                "mutation": any(c > 0 for c in mutation_counts) if mutation_counts else None,
+            },
+            "small_molecules": self.get_small_molecules(entry),
+            "binding_affinity": "N/A",
+        }
+
+        affinity = (entry.get("rcsb_binding_affinity") or [None])[0]
+        if affinity and affinity.get("comp_id") and affinity.get("value") is not None:
+            data["binding_affinity"] = (f"{affinity['comp_id']}: {affinity.get('type')}: "
+                                        f"{affinity['value']:g} {affinity.get('unit') or ''}".rstrip())
+        return data
+
+    def get_small_molecules(self, entry: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """
+        Extracts the small molecules of a GraphQL entry.
+
+        Args:
+            entry (Dict[str, Any]): One entry of the GraphQL response.
+
+        Returns:
+            Optional[Dict[str, str]]: A dictionary with ligand IDs as keys and names as
+            values.
+        """
+        small_molecules: Dict[str, str] = {}
+        for entity in entry.get("nonpolymer_entities") or []:
+            chem_comp = ((entity or {}).get("nonpolymer_comp") or {}).get("chem_comp") or {}
+            if chem_comp.get("id"):
+                small_molecules[chem_comp["id"]] = chem_comp.get("name") or "Name not found"
+        return small_molecules if small_molecules else None
+
+
+def _first(items: Optional[List[Dict[str, Any]]], key: str) -> Optional[Any]:
+    for item in items or []:
+        if item and item.get(key) is not None:
+            return item[key]
+    return None
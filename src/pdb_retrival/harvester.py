@@ -0,0 +1,304 @@
+"""
+This module harvests the metadata of many PDB entries from the RCSB website.
+
+The pages are fetched concurrently under a requests-per-second limit, parsed in a
+process pool and appended to a JSONL file as they complete, so an interrupted
+harvest resumes where it stopped, e.g.:
+
+python -m src.pdb_retrival.harvester 6o0k 1yer -f ids.txt -o metadata.jsonl --rate 5
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+import requests  # type: ignore
+
+from src.pdb_retrival.bulk_downloader import create_session, read_pdb_ids
+from src.pdb_retrival.data_retriever import PDBDataRetriever
+from src.pdb_retrival.downloader import validate_pdb_id
+from src.pdb_retrival.metrics import ERROR, configure_metrics, count_retries, get_recorder
+
+RCSB_STRUCTURE_URL = "https://www.rcsb.org/structure/{pdb_id}"
+
+
+class RateLimiter:
+    """
+    Token bucket limiting how often `acquire` returns, shared by all tasks of an
+    event loop.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """
+        Initializes the rate limiter.
+
+        Args:
+            rate (float): Maximum number of acquisitions per second. Zero or negative
+            disables the limit.
+            burst (int): Number of acquisitions allowed at once after an idle period.
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Waits until a token is available and takes it.
+        """
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class JSONLResultStore:
+    """
+    Append-only store of harvest results, one JSON record per line of the form
+    `{"pdb_id": ..., "data": ..., "error": ...}`. Every record is flushed when it is
+    written, so at most the last line is lost when a harvest is interrupted.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initializes the store.
+
+        Args:
+            path (str): Path of the JSONL file. It is created if it does not exist.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = None
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Reads the stored records, the latest record per PDB ID winning. Incomplete lines
+        of an interrupted write are skipped.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Records by lower-case PDB ID.
+        """
+        records: Dict[str, Dict[str, Any]] = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and "pdb_id" in record:
+                    records[record["pdb_id"].lower()] = record
+        return records
+
+    def completed_ids(self) -> Set[str]:
+        """
+        Gets the lower-case PDB IDs that were harvested successfully. Failed entries are
+        not included, so they are retried by the next harvest.
+        """
+        return {pdb_id for pdb_id, record in self.load().items() if record.get("data") is not None}
+
+    def append(self, pdb_id: str, data: Optional[Dict[str, Any]],
+               error: Optional[str] = None) -> None:
+        """
+        Appends one record and flushes it to disk.
+        """
+        if self._file is None:
+            self._terminate_last_line()
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps({"pdb_id": pdb_id, "data": data, "error": error},
+                                    ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def _terminate_last_line(self) -> None:
+        # Start on a new line if the previous harvest stopped in the middle of a record
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+    def close(self) -> None:
+        """
+        Closes the JSONL file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "JSONLResultStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def parse_page(pdb_id: str, html_content: str) -> Tuple[Dict[str, Any], float]:
+    """
+    Parses the RCSB structure page of a PDB entry. Module-level, so it can run in a
+    worker process; the parse time is returned to be recorded by the parent process.
+    """
+    start = time.perf_counter()
+    data = PDBDataRetriever(pdb_id)._parse_data(html_content, fast=True)
+    return data, time.perf_counter() - start
+
+
+async def harvest(pdb_ids: Iterable[str],
+                  store_path: str,
+                  rate: float = 5.0,
+                  concurrency: int = 16,
+                  parse_workers: Optional[int] = None,
+                  session: Optional[requests.Session] = None,
+                  url_template: str = RCSB_STRUCTURE_URL,
+                  timeout: float = 10) -> Dict[str, int]:
+    """
+    Fetches and parses the RCSB pages of many PDB entries concurrently and appends
+    the results to a JSONL store. Entries already harvested into the store are
+    skipped.
+
+    The requests are made over one pooled session in a thread pool, so the event loop
+    only schedules them; parsing runs in a process pool. The parser processes are
+    spawned rather than forked, as forking while the fetch threads run can deadlock.
+
+    Args:
+        pdb_ids (Iterable[str]): 4-letter PDB codes. Duplicates are harvested once.
+        store_path (str): Path of the JSONL store.
+        rate (float): Maximum number of requests per second (0 for no limit).
+        concurrency (int): Maximum number of requests in flight.
+        parse_workers (Optional[int]): Number of parser processes. Defaults to the
+        number of CPUs.
+        session (Optional[requests.Session]): HTTP session to use. Defaults to a
+        pooled session with retries.
+        url_template (str): Page URL with a `{pdb_id}` placeholder.
+        timeout (float): Connect and read timeout in seconds.
+
+    Returns:
+        Dict[str, int]: Number of "harvested", "failed" and "skipped" entries.
+
+    Raises:
+        ValueError: If a PDB ID is not valid.
+    """
+    pdb_ids = list(dict.fromkeys(pdb_id.lower() for pdb_id in pdb_ids))
+    for pdb_id in pdb_ids:
+        if not validate_pdb_id(pdb_id):
+            raise ValueError(f"Invalid PDB ID format: '{pdb_id}' must be a 4-letter PDB code.")
+
+    store = JSONLResultStore(store_path)
+    completed = store.completed_ids()
+    pending = [pdb_id for pdb_id in pdb_ids if pdb_id not in completed]
+    counts = {"harvested": 0, "failed": 0, "skipped": len(pdb_ids) - len(pending)}
+    if not pending:
+        return counts
+
+    if session is None:
+        session = create_session(pool_size=concurrency)
+    loop = asyncio.get_running_loop()
+    limiter = RateLimiter(rate, burst=min(concurrency, max(1, int(rate))))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    recorder = get_recorder()
+
+    def fetch(pdb_id: str) -> str:
+        with recorder.timer("fetch_metadata", pdb_id) as event:
+            response = session.get(url_template.format(pdb_id=pdb_id), timeout=timeout)
+            event["retries"] = count_retries(response)
+            response.raise_for_status()
+            event["bytes"] = len(response.content)
+            return response.text
+
+    async def harvest_one(pdb_id: str) -> None:
+        try:
+            async with semaphore:
+                await limiter.acquire()
+                html_content = await loop.run_in_executor(fetch_pool, fetch, pdb_id)
+            try:
+                data, duration = await loop.run_in_executor(parse_pool, parse_page, pdb_id, html_content)
+            except Exception as e:
+                recorder.record("parse_metadata", pdb_id, status=ERROR, error=str(e))
+                raise
+            recorder.record("parse_metadata", pdb_id, duration=duration)
+        except Exception as e:  # the entry is recorded as failed and retried next time
+            print(f"Failed to harvest {pdb_id}: {e}")
+            store.append(pdb_id, None, str(e))
+            counts["failed"] += 1
+            return
+        store.append(pdb_id, data)
+        counts["harvested"] += 1
+
+    with store, ThreadPoolExecutor(max_workers=concurrency) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=parse_workers,
+                                mp_context=multiprocessing.get_context("spawn")) as parse_pool:
+        await asyncio.gather(*(harvest_one(pdb_id) for pdb_id in pending))
+    return counts
+
+
+def harvest_metadata(pdb_ids: Iterable[str], store_path: str, **kwargs) -> Dict[str, int]:
+    """
+    Runs `harvest` in a new event loop.
+
+    Args:
+        pdb_ids (Iterable[str]): 4-letter PDB codes.
+        store_path (str): Path of the JSONL store.
+        **kwargs: Further arguments of `harvest`.
+
+    Returns:
+        Dict[str, int]: Number of "harvested", "failed" and "skipped" entries.
+    """
+    return asyncio.run(harvest(pdb_ids, store_path, **kwargs))
+
+
+def main():
+    """
+    Main function to harvest the metadata of the given PDB IDs.
+    """
+    parser = argparse.ArgumentParser(description="Harvest PDB metadata from the RCSB website")
+    parser.add_argument("pdb_ids", metavar="PDB_ID", type=str, nargs="*", help="4-letter PDB codes")
+    parser.add_argument("-f", "--file", type=str, default=None,
+                        help="Text file with PDB IDs separated by whitespace or commas")
+    parser.add_argument("-o", "--output", type=str, default="metadata.jsonl",
+                        help="JSONL file the results are appended to (default: metadata.jsonl)")
+    parser.add_argument("--rate", type=float, default=5.0,
+                        help="Maximum number of requests per second (default: 5)")
+    parser.add_argument("-c", "--concurrency", type=int, default=16,
+                        help="Maximum number of requests in flight (default: 16)")
+    parser.add_argument("-w", "--parse_workers", type=int, default=None,
+                        help="Number of parser processes (default: number of CPUs)")
+    parser.add_argument("--metrics_log", type=str, default=None,
+                        help="JSONL file the timing and transfer events are appended to")
+    parser.add_argument("--summary", action="store_true",
+                        help="Print a table of the timing and transfer metrics at the end")
+    args = parser.parse_args()
+    recorder = configure_metrics(args.metrics_log) if args.metrics_log is not None else get_recorder()
+
+    pdb_ids = list(args.pdb_ids)
+    if args.file is not None:
+        pdb_ids += read_pdb_ids(args.file)
+    if not pdb_ids:
+        parser.error("No PDB IDs given")
+
+    counts = harvest_metadata(pdb_ids, args.output, rate=args.rate, concurrency=args.concurrency,
+                              parse_workers=args.parse_workers)
+    print(f"Harvested {counts['harvested']}, failed {counts['failed']}, "
+          f"skipped {counts['skipped']} already harvested entries into {args.output}")
+    if args.summary:
+        print(recorder.format_summary())
+    recorder.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Two-tier cache of PDB metadata, keyed by PDB ID.
+
+Entries are either the raw HTML of an RCSB structure page (kind "html") or the
+dictionary parsed from it (kind "data"). Recently used entries are kept in memory
+(LRU, bounded by the number of entries); with a cache directory, every entry is also
+written to disk as gzip-compressed JSON (LRU, bounded by the total size in bytes),
+so repeated pipeline runs and interactive sessions share one cache. Entries older
+than `ttl` seconds are treated as missing.
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_TTL = 7 * 24 * 3600  # seconds
+CACHE_KINDS = ("html", "data")
+
+
+class MetadataCache:
+    """
+    In-memory LRU cache of PDB metadata with an optional on-disk tier.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, ttl: Optional[float] = DEFAULT_TTL,
+                 max_entries: int = 512, max_bytes: int = 512 * 1024 ** 2) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            cache_dir (Optional[str]): Directory of the on-disk tier. Without it, entries
+            are only kept in memory.
+            ttl (Optional[float]): Seconds after which an entry expires (None: never).
+            max_entries (int): Maximum number of entries in memory.
+            max_bytes (int): Maximum total size of the on-disk entries in bytes
+            (default: 512 MB).
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def hits(self) -> int:
+        """
+        Number of lookups answered from either tier.
+        """
+        return self.memory_hits + self.disk_hits
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Gets the hit and miss counters and the hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "memory_hits": self.memory_hits, "disk_hits": self.disk_hits,
+                "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    @staticmethod
+    def _key(pdb_id: str, kind: str) -> Tuple[str, str]:
+        if kind not in CACHE_KINDS:
+            raise ValueError(f"Unknown cache entry kind '{kind}', expected one of {CACHE_KINDS}.")
+        return pdb_id.lower(), kind
+
+    def _path(self, key: Tuple[str, str]) -> str:
+        return os.path.join(self.cache_dir, f"{key[0]}.{key[1]}.json.gz")  # type: ignore
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def get(self, pdb_id: str, kind: str = "data") -> Optional[Any]:
+        """
+        Looks up an entry, first in memory and then on disk.
+
+        Args:
+            pdb_id (str): 4-letter PDB code.
+            kind (str): "html" for the raw page or "data" for the parsed dictionary.
+
+        Returns:
+            Optional[Any]: The cached value, or None on a miss or if it expired.
+        """
+        key = self._key(pdb_id, kind)
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                if not self._expired(cached[0]):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return cached[1]
+                del self._memory[key]
+
+        cached = self._load(key)
+        with self._lock:
+            if cached is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, cached)
+        return cached[1]
+
+    def _load(self, key: Tuple[str, str]) -> Optional[Tuple[float, Any]]:
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+            stored_at, value = float(entry["stored_at"]), entry["value"]
+        except (OSError, EOFError, ValueError, KeyError, TypeError):
+            return None
+        if self._expired(stored_at):
+            return None
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return stored_at, value
+
+    def put(self, pdb_id: str, value: Any, kind: str = "data") -> None:
+        """
+        Stores an entry in memory and, with a cache directory, on disk. The value must be
+        serializable to JSON.
+
+        Args:
+            pdb_id (str): 4-letter PDB code.
+            value (Any): The raw HTML or the parsed dictionary.
+            kind (str): "html" for the raw page or "data" for the parsed dictionary.
+        """
+        key = self._key(pdb_id, kind)
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, (stored_at, value))
+        if self.cache_dir is None:
+            return
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"stored_at": stored_at, "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _remember(self, key: Tuple[str, str], cached: Tuple[float, Any]) -> None:
+        self._memory[key] = cached
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def invalidate(self, pdb_id: str) -> None:
+        """
+        Removes all entries of a PDB ID from both tiers.
+        """
+        for kind in CACHE_KINDS:
+            key = self._key(pdb_id, kind)
+            with self._lock:
+                self._memory.pop(key, None)
+            if self.cache_dir is not None:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+
+    def clear(self) -> None:
+        """
+        Removes all entries from both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries: List[Tuple[float, int, str]] = []
+        if self.cache_dir is None:
+            return entries
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json.gz"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self) -> int:
+        """
+        Total size of the on-disk entries in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used on-disk entries until the disk tier fits in
+        `max_bytes`.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,220 @@
+"""
+Timing and transfer metrics of the retrieval layer.
+
+Every download, metadata fetch and parse is recorded as one event with its stage,
+PDB ID, status, duration, bytes transferred and number of HTTP retries. Events are
+aggregated per stage in memory (latency histogram, percentiles, error, retry and
+cache hit counts) and, with an event log, appended to a JSONL file, e.g.:
+
+{"time": 1718000000.0, "stage": "download", "pdb_id": "6o0k", "status": "ok",
+ "duration": 0.412, "bytes": 301239, "retries": 0}
+
+The process-wide recorder is configured with `configure_metrics` or the
+`PDB_METRICS_LOG` environment variable; `format_summary` renders the aggregates as
+a table at the end of a batch.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+CACHE_HIT = "cache_hit"
+ERROR = "error"
+
+
+def count_retries(response: Any) -> int:
+    """
+    Number of retries urllib3 made for a response of a session with a `Retry` policy.
+    """
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    history = getattr(retries, "history", None)
+    return len(history) if isinstance(history, tuple) else 0
+
+
+class _StageStats:
+    def __init__(self) -> None:
+        self.events = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.bytes = 0
+        self.retries = 0
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+        self.durations: List[float] = []
+
+    def add(self, event: Dict[str, Any]) -> None:
+        self.events += 1
+        self.errors += event["status"] == ERROR
+        self.cache_hits += event["status"] == CACHE_HIT
+        self.bytes += event["bytes"]
+        self.retries += event["retries"]
+        self.histogram[bisect_left(LATENCY_BUCKETS, event["duration"])] += 1
+        self.durations.append(event["duration"])
+
+    def summary(self) -> Dict[str, Any]:
+        durations = np.asarray(self.durations)
+        p50, p90, p99 = np.percentile(durations, [50, 90, 99]) if len(durations) else (0.0,) * 3
+        return {"events": self.events, "errors": self.errors, "cache_hits": self.cache_hits,
+                "cache_hit_rate": self.cache_hits / self.events if self.events else 0.0,
+                "bytes": self.bytes, "retries": self.retries,
+                "total_s": float(durations.sum()), "p50_s": float(p50), "p90_s": float(p90),
+                "p99_s": float(p99), "max_s": float(durations.max()) if len(durations) else 0.0,
+                "histogram": dict(zip([f"<={b:g}s" for b in LATENCY_BUCKETS], self.histogram))}
+
+
+class MetricsRecorder:
+    """
+    Thread-safe recorder of retrieval events.
+    """
+
+    def __init__(self, event_log: Optional[str] = None) -> None:
+        """
+        Initializes the recorder.
+
+        Args:
+            event_log (Optional[str]): JSONL file the events are appended to. Without it,
+            events are only aggregated in memory.
+        """
+        self.event_log = event_log
+        self._stages: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if event_log is not None:
+            directory = os.path.dirname(event_log)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(event_log, "a", encoding="utf-8")
+
+    def record(self, stage: str, pdb_id: Optional[str] = None, status: str = "ok",
+               duration: float = 0.0, bytes: int = 0, retries: int = 0,
+               error: Optional[str] = None, **extra: Any) -> Dict[str, Any]:
+        """
+        Records one event.
+
+        Args:
+            stage (str): Name of the stage, e.g. "download" or "parse_metadata".
+            pdb_id (Optional[str]): The PDB ID the event belongs to.
+            status (str): "ok", "error", "cache_hit" or another stage-specific status.
+            duration (float): Wall time in seconds.
+            bytes (int): Number of bytes transferred.
+            retries (int): Number of HTTP retries.
+            error (Optional[str]): Error message of a failed event.
+            **extra: Further fields written to the event log.
+
+        Returns:
+            Dict[str, Any]: The event.
+        """
+        event = {"time": time.time(), "stage": stage, "pdb_id": pdb_id, "status": status,
+                 "duration": duration, "bytes": bytes, "retries": retries}
+        if error is not None:
+            event["error"] = error
+        event.update(extra)
+        with self._lock:
+            self._stages.setdefault(stage, _StageStats()).add(event)
+            if self._file is not None:
+                self._file.write(json.dumps(event) + "\n")
+                self._file.flush()
+        return event
+
+    @contextmanager
+    def timer(self, stage: str, pdb_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Times a block and records it as one event. The block can set "bytes", "retries",
+        "status" and further fields in the yielded dictionary. An exception marks the
+        event as failed and is re-raised.
+
+        Args:
+            stage (str): Name of the stage.
+            pdb_id (Optional[str]): The PDB ID the event belongs to.
+
+        Yields:
+            Dict[str, Any]: Fields of the event.
+        """
+        fields: Dict[str, Any] = {}
+        start = time.perf_counter()
+        try:
+            yield fields
+        except BaseException as e:
+            fields["status"] = ERROR
+            fields["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            self.record(stage, pdb_id, duration=time.perf_counter() - start, **fields)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Gets the aggregated metrics per stage.
+        """
+        with self._lock:
+            return {stage: stats.summary() for stage, stats in self._stages.items()}
+
+    def format_summary(self) -> str:
+        """
+        Renders the aggregated metrics per stage as a text table.
+        """
+        header = (f"{'stage':<16}{'events':>8}{'errors':>8}{'cache':>8}{'retries':>8}"
+                  f"{'MB':>10}{'total s':>10}{'p50 s':>9}{'p90 s':>9}{'max s':>9}")
+        lines = [header, "-" * len(header)]
+        for stage, s in self.summary().items():
+            lines.append(f"{stage:<16}{s['events']:>8}{s['errors']:>8}{s['cache_hits']:>8}"
+                         f"{s['retries']:>8}{s['bytes'] / 1e6:>10.2f}{s['total_s']:>10.2f}"
+                         f"{s['p50_s']:>9.3f}{s['p90_s']:>9.3f}{s['max_s']:>9.3f}")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        """
+        Drops the aggregated metrics.
+        """
+        with self._lock:
+            self._stages.clear()
+
+    def close(self) -> None:
+        """
+        Closes the event log.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_recorder: Optional[MetricsRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> MetricsRecorder:
+    """
+    Gets the process-wide metrics recorder. The event log is read from the
+    `PDB_METRICS_LOG` environment variable; without it, events are only aggregated in
+    memory.
+    """
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = MetricsRecorder(os.environ.get("PDB_METRICS_LOG"))
+        return _recorder
+
+
+def configure_metrics(event_log: Optional[str] = None) -> MetricsRecorder:
+    """
+    Replaces the process-wide metrics recorder.
+
+    Args:
+        event_log (Optional[str]): JSONL file the events are appended to.
+
+    Returns:
+        MetricsRecorder: The new recorder.
+    """
+    global _recorder
+    with _recorder_lock:
+        if _recorder is not None:
+            _recorder.close()
+        _recorder = MetricsRecorder(event_log)
+        return _recorder
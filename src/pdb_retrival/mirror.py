@@ -0,0 +1,280 @@
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import requests  # type: ignore
+
+from src.pdb_retrival.bulk_downloader import CHUNK_SIZE, create_session
+from src.pdb_retrival.downloader import PDB_DOWNLOAD_URL, validate_pdb_id
+from src.pdb_retrival.metrics import CACHE_HIT, count_retries, get_recorder
+
+DEFAULT_MAX_AGE = 7 * 24 * 3600  # seconds before an entry is revalidated
+INDEX_FILENAME = "index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    path TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    checked_at REAL NOT NULL
+)
+"""
+
+
+class MirrorEntry(NamedTuple):
+    key: str
+    url: str
+    path: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    size: int
+    sha256: str
+    checked_at: float
+
+
+class StructureMirror:
+    """
+    Local mirror of structure files.
+
+    Files are stored gzip-compressed in a sharded layout, e.g.
+    `<root>/pdb/o0/6o0k.pdb.gz` (sharded by the middle two characters of the ID like
+    the wwPDB archive). A SQLite index records the URL, ETag, Last-Modified header,
+    uncompressed size and SHA-256 checksum of every entry and when it was last
+    checked. Entries younger than `max_age` are served without any network I/O;
+    older entries are revalidated with a conditional request and only downloaded
+    again if the server has a newer version.
+    """
+
+    def __init__(self, root: str, max_age: float = DEFAULT_MAX_AGE,
+                 session: Optional[requests.Session] = None, timeout: float = 10,
+                 url_template: str = PDB_DOWNLOAD_URL) -> None:
+        """
+        Initializes the mirror.
+
+        Args:
+            root (str): Root directory of the mirror.
+            max_age (float): Seconds after which an entry is revalidated with the server.
+            session (Optional[requests.Session]): HTTP session to use. Defaults to a
+            pooled session with retries.
+            timeout (float): Connect and read timeout in seconds.
+            url_template (str): PDB download URL with a `{pdb_id}` placeholder.
+        """
+        self.root = root
+        self.url_template = url_template
+        self.max_age = max_age
+        self.session = session if session is not None else create_session()
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, INDEX_FILENAME), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(_SCHEMA)
+
+    def close(self) -> None:
+        """
+        Closes the index database.
+        """
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> "StructureMirror":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def get_entry(self, key: str) -> Optional[MirrorEntry]:
+        """
+        Gets the index entry of a key, or None if it is not mirrored.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+        return MirrorEntry(*row) if row is not None else None
+
+    def _put_entry(self, entry: MirrorEntry) -> None:
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", entry)
+
+    def _touch_entry(self, key: str, checked_at: float) -> None:
+        with self._lock, self._db:
+            self._db.execute("UPDATE entries SET checked_at = ? WHERE key = ?", (checked_at, key))
+
+    def path_for(self, key: str, filename: str) -> str:
+        """
+        Sharded path of a file in the mirror, e.g. `pdb/o0/6o0k.pdb.gz`.
+
+        Args:
+            key (str): Entry key of the form "<source>:<id>".
+            filename (str): Uncompressed file name.
+
+        Returns:
+            str: Absolute path of the gzip-compressed file.
+        """
+        source, identifier = key.split(":", 1)
+        identifier = identifier.lower()
+        shard = identifier[1:3] if len(identifier) >= 3 else identifier
+        return os.path.join(self.root, source, shard, f"{filename}.gz")
+
+    def fetch(self, key: str, url: str, filename: str, force: bool = False) -> str:
+        """
+        Gets the mirrored file of a key, downloading or revalidating it if needed.
+
+        Args:
+            key (str): Entry key of the form "<source>:<id>", e.g. "pdb:6o0k".
+            url (str): Download URL of the file.
+            filename (str): Uncompressed file name, e.g. "6o0k.pdb".
+            force (bool): Revalidate the entry even if it is younger than `max_age`.
+
+        Returns:
+            str: Path of the gzip-compressed file in the mirror.
+
+        Raises:
+            requests.exceptions.RequestException: If the file has to be downloaded and
+            the download fails.
+        """
+        entry = self.get_entry(key)
+        now = time.time()
+        if entry is not None and not os.path.exists(entry.path):
+            entry = None
+        if entry is not None and not force and now - entry.checked_at < self.max_age:
+            get_recorder().record("mirror", key, status=CACHE_HIT)
+            return entry.path
+
+        headers = {}
+        if entry is not None and entry.url == url:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+            elif not entry.etag:
+                headers["If-Modified-Since"] = formatdate(entry.checked_at, usegmt=True)
+
+        with get_recorder().timer("mirror", key) as event, \
+                self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            event["retries"] = count_retries(response)
+            if response.status_code == 304 and entry is not None:
+                # Revalidated without a download
+                event["status"] = CACHE_HIT
+                self._touch_entry(key, now)
+                return entry.path
+            response.raise_for_status()
+            path = entry.path if entry is not None else self.path_for(key, filename)
+            size, sha256 = self._store(response, path)
+            event["bytes"] = size
+            self._put_entry(MirrorEntry(key, url, path, response.headers.get("ETag"),
+                                        response.headers.get("Last-Modified"), size, sha256, now))
+        return path
+
+    def _store(self, response: requests.Response, path: str) -> tuple:
+        """
+        Streams a response body gzip-compressed to `path`, returning its uncompressed size
+        and SHA-256 checksum.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with gzip.open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return size, digest.hexdigest()
+
+    def fetch_pdb(self, pdb_id: str, force: bool = False) -> str:
+        """
+        Gets the mirrored PDB file of a 4-letter PDB code.
+
+        Args:
+            pdb_id (str): 4-letter PDB code.
+            force (bool): Revalidate the entry even if it is younger than `max_age`.
+
+        Returns:
+            str: Path of the gzip-compressed PDB file in the mirror.
+
+        Raises:
+            ValueError: If the PDB ID is not valid.
+        """
+        if not validate_pdb_id(pdb_id):
+            raise ValueError("Invalid PDB ID format: It must be a 4-letter PDB code.")
+        pdb_id = pdb_id.lower()
+        return self.fetch(f"pdb:{pdb_id}", self.url_template.format(pdb_id=pdb_id), f"{pdb_id}.pdb", force)
+
+    def fetch_pdbs(self, pdb_ids: Iterable[str], max_workers: int = 8,
+                   force: bool = False) -> Dict[str, Optional[str]]:
+        """
+        Gets many mirrored PDB files concurrently.
+
+        Args:
+            pdb_ids (Iterable[str]): 4-letter PDB codes.
+            max_workers (int): Maximum number of concurrent downloads.
+            force (bool): Revalidate the entries even if they are younger than `max_age`.
+
+        Returns:
+            Dict[str, Optional[str]]: Path in the mirror per PDB ID, or None if the
+            download failed.
+        """
+        pdb_ids = list(dict.fromkeys(pdb_ids))
+
+        def fetch(pdb_id: str) -> Optional[str]:
+            try:
+                return self.fetch_pdb(pdb_id, force)
+            except requests.exceptions.RequestException as e:
+                print(f"Failed to download PDB file {pdb_id}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(fetch, pdb_ids))
+        return dict(zip(pdb_ids, results))
+
+    def verify(self, key: str) -> bool:
+        """
+        Checks that a mirrored file matches the checksum in the index.
+        """
+        entry = self.get_entry(key)
+        if entry is None or not os.path.exists(entry.path):
+            return False
+        digest = hashlib.sha256()
+        with gzip.open(entry.path, "rb") as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest() == entry.sha256
+
+    def export(self, mirror_path: str, output_path: str) -> str:
+        """
+        Writes the uncompressed contents of a mirrored file, e.g. for tools that can not
+        read gzip files. An existing output file of the same size is kept.
+
+        Args:
+            mirror_path (str): Path of the gzip-compressed file in the mirror.
+            output_path (str): Path of the uncompressed output file.
+
+        Returns:
+            str: The output path.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT size FROM entries WHERE path = ?", (mirror_path,)).fetchone()
+        if row is not None and os.path.exists(output_path) and os.path.getsize(output_path) == row[0] \
+                and os.path.getmtime(output_path) >= os.path.getmtime(mirror_path):
+            return output_path
+        tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.part"
+        with gzip.open(mirror_path, "rb") as src, open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.replace(tmp_path, output_path)
+        return output_path
@@ -0,0 +1,206 @@
+import gzip
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import requests  # type: ignore
+
+from src.pdb_retrival.bulk_downloader import create_session
+from src.pdb_retrival.downloader import PDB_DOWNLOAD_URL, download_to_file, validate_pdb_id
+from src.pdb_retrival.metrics import count_retries, get_recorder
+from src.pdb_retrival.mirror import DEFAULT_MAX_AGE, StructureMirror
+
+ALPHAFOLD_URL = "https://alphafold.ebi.ac.uk/files/AF-{uniprot_id}-F1-model_v4.pdb"
+
+# UniProt accession, optionally as AlphaFold DB model name, e.g. "Q16611" or "AF-Q16611-F1-model_v4"
+_ALPHAFOLD_ID_RE = re.compile(r"^(?:AF-)?([A-Z0-9]{6}|[A-Z0-9]{10})(?:-F1(?:-model_v\d+)?)?(?:\.pdb)?$",
+                              re.IGNORECASE)
+
+
+class StructureSource(NamedTuple):
+    """
+    Where a structure comes from: a local file, the PDB archive or the AlphaFold DB.
+    """
+    kind: str  # "local", "pdb" or "alphafold"
+    key: str  # mirror key, e.g. "pdb:6o0k"
+    url: Optional[str]
+    filename: str
+
+
+def identify_structure(target: str) -> StructureSource:
+    """
+    Identifies a structure given as local path, 4-letter PDB ID or UniProt ID of an
+    AlphaFold DB model.
+
+    Args:
+        target (str): Path to a structure file, PDB ID (e.g. "6o0k") or UniProt ID
+        (e.g. "Q16611" or "AF-Q16611-F1-model_v4").
+
+    Returns:
+        StructureSource: Kind, mirror key, download URL and file name of the structure.
+
+    Raises:
+        ValueError: If the target is neither an existing file nor a valid ID.
+    """
+    target = target.strip()
+    if os.path.isfile(target):
+        return StructureSource("local", f"local:{os.path.abspath(target)}", None, target)
+    if validate_pdb_id(target):
+        return StructureSource("pdb", f"pdb:{target.lower()}", PDB_DOWNLOAD_URL.format(pdb_id=target),
+                               f"{target}.pdb")
+    match = _ALPHAFOLD_ID_RE.match(target)
+    if match:
+        uniprot_id = match.group(1).upper()
+        return StructureSource("alphafold", f"alphafold:{uniprot_id}",
+                               ALPHAFOLD_URL.format(uniprot_id=uniprot_id),
+                               f"AF-{uniprot_id}-F1-model_v4.pdb")
+    raise ValueError(f"'{target}' is neither a file, a 4-letter PDB ID nor a UniProt ID.")
+
+
+class StructureResolver:
+    """
+    Resolves local paths, PDB IDs and AlphaFold DB UniProt IDs to structure files,
+    downloading in-process over one shared, pooled HTTP session.
+
+    Without a mirror, downloads are written to `output_dir` and reused if the file
+    already exists there. With a mirror directory, downloads are kept in a
+    `StructureMirror` and exported to `output_dir` as plain PDB files.
+    """
+
+    def __init__(self, output_dir: str = ".", mirror_dir: Optional[str] = None,
+                 session: Optional[requests.Session] = None,
+                 max_age: float = DEFAULT_MAX_AGE, buffer_cache_size: int = 32) -> None:
+        """
+        Initializes the resolver.
+
+        Args:
+            output_dir (str): Directory for the downloaded PDB files.
+            mirror_dir (Optional[str]): Directory of a local structure mirror.
+            session (Optional[requests.Session]): HTTP session to use. Defaults to a
+            pooled session with retries.
+            max_age (float): Seconds after which mirrored files are revalidated.
+            buffer_cache_size (int): Number of structures kept in memory by `open`.
+        """
+        self.output_dir = output_dir
+        self.session = session if session is not None else create_session()
+        self.mirror = None
+        if mirror_dir is not None:
+            self.mirror = StructureMirror(mirror_dir, max_age=max_age, session=self.session)
+        self.buffer_cache_size = buffer_cache_size
+        self._buffers: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, target: str) -> str:
+        """
+        Gets the path of a structure file, downloading it if needed.
+
+        Args:
+            target (str): Path, PDB ID or UniProt ID, see `identify_structure`.
+
+        Returns:
+            str: Path to the (uncompressed) structure file.
+
+        Raises:
+            ValueError: If the target is not recognized.
+            requests.exceptions.RequestException: If the download fails.
+        """
+        source = identify_structure(target)
+        if source.kind == "local":
+            return source.filename
+
+        output_path = os.path.join(self.output_dir, source.filename)
+        if self.mirror is not None:
+            mirror_path = self.mirror.fetch(source.key, source.url, source.filename)
+            os.makedirs(self.output_dir, exist_ok=True)
+            return self.mirror.export(mirror_path, output_path)
+        if not os.path.exists(output_path):
+            os.makedirs(self.output_dir, exist_ok=True)
+            with get_recorder().timer("download", source.key) as event:
+                download_to_file(self.session, source.url, output_path, event=event)
+            print(f"Downloaded {source.filename} from {source.url}")
+        return output_path
+
+    def open(self, target: str) -> io.BytesIO:
+        """
+        Gets the contents of a structure file as an in-memory buffer, without writing
+        it to `output_dir`. Recently downloaded structures are cached in memory.
+
+        Args:
+            target (str): Path, PDB ID or UniProt ID, see `identify_structure`.
+
+        Returns:
+            io.BytesIO: The file contents.
+        """
+        source = identify_structure(target)
+        if source.kind == "local":
+            with open(source.filename, "rb") as f:
+                return io.BytesIO(f.read())
+
+        with self._lock:
+            if source.key in self._buffers:
+                self._buffers.move_to_end(source.key)
+                return io.BytesIO(self._buffers[source.key])
+
+        if self.mirror is not None:
+            with gzip.open(self.mirror.fetch(source.key, source.url, source.filename), "rb") as f:
+                data = f.read()
+        else:
+            with get_recorder().timer("download", source.key) as event:
+                response = self.session.get(source.url, timeout=10)
+                event["retries"] = count_retries(response)
+                response.raise_for_status()
+                data = response.content
+                event["bytes"] = len(data)
+
+        with self._lock:
+            self._buffers[source.key] = data
+            while len(self._buffers) > self.buffer_cache_size:
+                self._buffers.popitem(last=False)
+        return io.BytesIO(data)
+
+
+_resolver: Optional[StructureResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> StructureResolver:
+    """
+    Gets the process-wide structure resolver. The mirror directory is read from the
+    `PDB_MIRROR_DIR` environment variable; without it, files are downloaded to the
+    current directory.
+    """
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = StructureResolver(mirror_dir=os.environ.get("PDB_MIRROR_DIR"))
+        return _resolver
+
+
+def configure_resolver(output_dir: str = ".", mirror_dir: Optional[str] = None,
+                       **kwargs) -> StructureResolver:
+    """
+    Replaces the process-wide structure resolver.
+
+    Args:
+        output_dir (str): Directory for the downloaded PDB files.
+        mirror_dir (Optional[str]): Directory of a local structure mirror.
+        **kwargs: Further arguments of `StructureResolver`.
+
+    Returns:
+        StructureResolver: The new resolver.
+    """
+    global _resolver
+    with _resolver_lock:
+        _resolver = StructureResolver(output_dir=output_dir, mirror_dir=mirror_dir, **kwargs)
+        return _resolver
+
+
+def resolve_structure(target: str) -> str:
+    """
+    Gets the path of a structure file given as path, PDB ID or UniProt ID, using the
+    process-wide resolver.
+    """
+    return get_resolver().resolve(target)
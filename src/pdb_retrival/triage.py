@@ -0,0 +1,153 @@
+"""
+Triage of PDB entries by their metadata, before any coordinates are downloaded.
+
+The predicates work on the dictionaries of `PDBDataRetriever.parse_data` (and
+`GraphQLDataRetriever.parse_entry`, which have the same shape), e.g.:
+
+predicates = [max_resolution(2.5), method_in("X-RAY DIFFRACTION"), has_ligand(),
+              chain_count(max_chains=2)]
+kept, rejected = triage(pdb_ids, metadata, predicates)
+"""
+
+import re
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+# Small molecules that are usually crystallization or buffer additives, not ligands
+CRYSTALLIZATION_ADDITIVES = frozenset([
+    "HOH", "DOD", "SO4", "PO4", "NO3", "SCN", "CL", "BR", "IOD", "NA", "K", "CA", "MG",
+    "NH4", "GOL", "EDO", "PEG", "PGE", "PG4", "1PE", "P6G", "MPD", "DMS", "ACT", "ACY",
+    "FMT", "CIT", "TLA", "MLI", "TRS", "EPE", "MES", "BME", "IMD",
+])
+
+
+class Predicate(NamedTuple):
+    """
+    A named test of the parsed metadata of one PDB entry.
+    """
+    name: str
+    test: Callable[[Dict[str, Any]], bool]
+
+    def __call__(self, data: Dict[str, Any]) -> bool:
+        return self.test(data)
+
+
+def parse_resolution(resolution: Optional[str]) -> Optional[float]:
+    """
+    Converts a resolution such as "1.62 Å" to a number.
+
+    Args:
+        resolution (Optional[str]): The resolution field of the experiment data.
+
+    Returns:
+        Optional[float]: The resolution in Å, or None if there is none.
+    """
+    if resolution is None:
+        return None
+    if isinstance(resolution, (int, float)):
+        return float(resolution)
+    match = re.search(r"\d+(?:\.\d+)?", resolution)
+    return float(match.group()) if match else None
+
+
+def max_resolution(cutoff: float, keep_unknown: bool = False) -> Predicate:
+    """
+    Keeps entries with a resolution of at most `cutoff` Å. Entries without a resolution
+    (e.g. NMR structures) are kept only with `keep_unknown`.
+    """
+    def test(data: Dict[str, Any]) -> bool:
+        resolution = parse_resolution((data.get("experiment_data") or {}).get("resolution"))
+        if resolution is None:
+            return keep_unknown
+        return resolution <= cutoff
+    return Predicate(f"resolution <= {cutoff:g} Å", test)
+
+
+def method_in(*methods: str) -> Predicate:
+    """
+    Keeps entries determined with one of the given experimental methods, e.g.
+    "X-RAY DIFFRACTION" or "ELECTRON MICROSCOPY" (case-insensitive).
+    """
+    allowed = {method.strip().upper() for method in methods}
+
+    def test(data: Dict[str, Any]) -> bool:
+        method = (data.get("experiment_data") or {}).get("method")
+        return method is not None and method.strip().upper() in allowed
+    return Predicate(f"method in {sorted(allowed)}", test)
+
+
+def has_ligand(*ligand_ids: str, ignore: Iterable[str] = CRYSTALLIZATION_ADDITIVES) -> Predicate:
+    """
+    Keeps entries containing any of the given ligands, or without ligand IDs any small
+    molecule that is not in `ignore`.
+    """
+    wanted = {ligand_id.upper() for ligand_id in ligand_ids}
+    ignored = {ligand_id.upper() for ligand_id in ignore}
+
+    def test(data: Dict[str, Any]) -> bool:
+        present = {ligand_id.upper() for ligand_id in data.get("small_molecules") or {}}
+        if wanted:
+            return bool(present & wanted)
+        return bool(present - ignored)
+    return Predicate(f"has ligand {sorted(wanted)}" if wanted else "has ligand", test)
+
+
+def chain_count(min_chains: int = 1, max_chains: Optional[int] = None) -> Predicate:
+    """
+    Keeps entries whose number of unique protein chains is in the given range.
+    """
+    def test(data: Dict[str, Any]) -> bool:
+        chains = (data.get("macromolecules") or {}).get("unique_protein_chains")
+        if chains is None:
+            return False
+        return chains >= min_chains and (max_chains is None or chains <= max_chains)
+    upper = f"..{max_chains}" if max_chains is not None else "+"
+    return Predicate(f"protein chains {min_chains}{upper}", test)
+
+
+def check(data: Optional[Dict[str, Any]], predicates: Iterable[Predicate]) -> Optional[str]:
+    """
+    Tests the metadata of one entry.
+
+    Args:
+        data (Optional[Dict[str, Any]]): Parsed metadata, or None if it is unknown.
+        predicates (Iterable[Predicate]): The predicates the entry must pass.
+
+    Returns:
+        Optional[str]: None if the entry passes, otherwise the name of the first failed
+        predicate.
+    """
+    if data is None:
+        return "no metadata"
+    for predicate in predicates:
+        if not predicate(data):
+            return predicate.name
+    return None
+
+
+def triage(pdb_ids: Iterable[str],
+           metadata: Mapping[str, Optional[Dict[str, Any]]],
+           predicates: Iterable[Predicate]) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Filters PDB IDs by their metadata.
+
+    Args:
+        pdb_ids (Iterable[str]): 4-letter PDB codes.
+        metadata (Mapping[str, Optional[Dict[str, Any]]]): Parsed metadata by PDB ID,
+        looked up case-insensitively. Entries without metadata are rejected.
+        predicates (Iterable[Predicate]): The predicates an entry must pass.
+
+    Returns:
+        Tuple[List[str], Dict[str, str]]: The PDB IDs that pass (in input order) and the
+        rejected PDB IDs with the name of the first predicate they failed.
+    """
+    predicates = list(predicates)
+    by_lower = {pdb_id.lower(): data for pdb_id, data in metadata.items()}
+    kept: List[str] = []
+    rejected: Dict[str, str] = {}
+    for pdb_id in dict.fromkeys(pdb_ids):
+        reason = check(by_lower.get(pdb_id.lower()), predicates)
+        if reason is None:
+            kept.append(pdb_id)
+        else:
+            rejected[pdb_id] = reason
+    return kept, rejected
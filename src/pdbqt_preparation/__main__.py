@@ -3,13 +3,15 @@ This module processes PDB files and performs protonation and conversion to PDBQT
 
 The main function processes PDB files in the specified input directory, extracts
 relevant information, and then performs protonation and conversion to PDBQT
-format for each file.
+format for each file. The stages run as a pipeline, so a file is protonated and
+converted as soon as it is stripped. Stages that are up to date from an earlier run
+are skipped (see `manifest`).
 """
 
+import argparse
 import os
 
-from src.pdbqt_preparation.extract_protein import process_pdb_files
-from src.pdbqt_preparation.protonation import protonate_and_convert
+from src.pdbqt_preparation.pipeline import CONVERTER_BACKENDS, FIXER_BACKENDS, run_pipeline
 
 
 def main():
@@ -21,34 +23,45 @@ def main():
     relevant information, and then performs protonation and conversion to PDBQT
     format for each file.
     """
-    input_path = "./data/raw/test_pdbqt_prep"
-    output_directory = "./data/raw/test_pdbqt_prep"
+    parser = argparse.ArgumentParser(description="Prepare PDB files for docking")
+    parser.add_argument("-i", "--input_path", type=str, default="./data/raw/test_pdbqt_prep",
+                        help="Directory containing the PDB files")
+    parser.add_argument("-o", "--output_directory", type=str, default="./data/raw/test_pdbqt_prep",
+                        help="Directory for the output files")
+    parser.add_argument("--ph", type=float, default=7.4, help="pH value for protonation (default: 7.4)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of files processed in parallel per stage (default: 1)")
+    parser.add_argument("--queue_size", type=int, default=None,
+                        help="Maximum number of files waiting between two stages (default: workers)")
+    parser.add_argument("--use_pymol", action="store_true",
+                        help="Strip the files with PyMOL (one instance per worker)")
+    parser.add_argument("--fixer", choices=FIXER_BACKENDS, default="cli",
+                        help="Fix with the pdbfixer command per file (cli), or in long-lived "
+                             "worker processes with the PDBFixer/OpenMM Python API (openmm)")
+    parser.add_argument("--converter", choices=CONVERTER_BACKENDS, default="obabel",
+                        help="Convert to PDBQT with obabel per file (obabel), or with the built-in "
+                             "rigid-receptor writer (native), which unlike obabel writes Gasteiger charges")
+    parser.add_argument("--force", action="store_true",
+                        help="Run every stage, even if its outputs are up to date")
+    args = parser.parse_args()
 
     # Convert to absolute paths
-    input_path = os.path.abspath(input_path)
-    output_directory = os.path.abspath(output_directory)
+    input_path = os.path.abspath(args.input_path)
+    output_directory = os.path.abspath(args.output_directory)
 
     print('Processing PDB files...')
-    processed_files: list[str] = process_pdb_files(input_path, output_directory)
     print(f"Your output directory:{output_directory}")
-    print('PDB files processing is done!')
-
-    print('Protonation and conversion is starting!')
-
-    for input_file in processed_files:
-        # Only protonate the ".pdb" file
-        if input_file.endswith('.pdb'):
-            print("\n\n")
-            print(len(processed_files))
-            print(f"Your input file for the protonation in pdbqt format: {input_file}")
-            # Convert to absolute path
-            input_path_protonate = f"{output_directory}/{input_file}"
-            print("Your input_file_path for the protonation in pdbqt format: "
-                  f"{input_path_protonate}")
-            output_pdbqt_file = protonate_and_convert(
-                input_path_protonate, output_directory
-            )
-            print(f'Protonation and conversion is done: {output_pdbqt_file}')
+    failed = 0
+    for result in run_pipeline(input_path, output_directory, args.ph, workers=args.workers,
+                               queue_size=args.queue_size, use_pymol=args.use_pymol,
+                               force=args.force, fixer=args.fixer, converter=args.converter):
+        if result.error is None:
+            skipped = f" (up to date: {', '.join(result.skipped)})" if result.skipped else ""
+            print(f'Protonation and conversion is done: {result.pdbqt_file}{skipped}')
+        else:
+            failed += 1
+            print(f"Error in the {result.stage} stage of {result.filename}: {result.error}")
+    print(f'PDB files processing is done! {failed} files failed.')
 
 
 if __name__ == "__main__":
@@ -1,8 +1,15 @@
+import multiprocessing as mp
 import os
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
-import pymol  # type: ignore
-from pymol import cmd  # type: ignore
+from src.structure_io.structure import Structure
+
+try:
+    import pymol  # type: ignore
+    from pymol import cmd  # type: ignore
+except ImportError:  # PyMOL is only needed with use_pymol=True
+    pymol = None
+    cmd = None
 
 
 def initialize_pymol():
@@ -15,7 +22,8 @@ def initialize_pymol():
 
 def strip_protein_extract_coordinate_info(input_path: str,
                                           filename: str,
-                                          output_directory: str):
+                                          output_directory: str,
+                                          use_pymol: bool = False) -> str:
     """
     Process a single PDB file: identify ligand center, remove non-protein atoms,
     and save the modified file.
@@ -24,14 +32,23 @@ def strip_protein_extract_coordinate_info(input_path: str,
     - input_path (str): Path to the input PDB file.
     - filename (str): Name of the PDB file.
     - output_directory (str): Directory to save the modified file.
+    - use_pymol (bool): Use PyMOL instead of the headless NumPy structure model.
+    PyMOL has to be initialized with `initialize_pymol` first.
+
+    Returns:
+    - str: Path of the stripped PDB file.
     """
     pdb_file_path = os.path.join(input_path, filename)
     pdb_file_name = os.path.splitext(filename)[0]
 
-    cmd.load(pdb_file_path, pdb_file_name)  # type: ignore
+    structure: Optional[Structure] = None
+    if use_pymol:
+        cmd.load(pdb_file_path, pdb_file_name)  # type: ignore
+    else:
+        structure = Structure.from_pdb(pdb_file_path)
 
     # Extract organic molecules in dict format
-    organic_molecules = get_organic_molecules(pdb_file_path)
+    organic_molecules = get_organic_molecules(pdb_file_path, structure)
     print("Extract organic molecules:")
     print(organic_molecules)
 
@@ -43,15 +60,19 @@ def strip_protein_extract_coordinate_info(input_path: str,
         for chain_id, residue_number in instances:
             center_of_mass = calculate_center_of_mass(residue_name,
                                                       chain_id,
-                                                      residue_number)
+                                                      residue_number,
+                                                      structure)
             print(f"Center of mass for {residue_name} in chain {chain_id} at "
                   f"residue {residue_number}: {center_of_mass}")
             center_of_mass_dict[residue_name].append(center_of_mass)
 
     # Remove non-protein atoms
-    cmd.remove("not polymer.protein")  # type: ignore
+    if structure is None:
+        cmd.remove("not polymer.protein")  # type: ignore
+    else:
+        structure = structure.remove("not polymer.protein")
 
-    protein_center_of_mass = calculate_protein_center_of_mass()
+    protein_center_of_mass = calculate_protein_center_of_mass(structure)
     print(f"Center of mass for protein: {protein_center_of_mass}")
     center_of_mass_dict["protein"] = [protein_center_of_mass]
 
@@ -62,44 +83,32 @@ def strip_protein_extract_coordinate_info(input_path: str,
     save_grid_coordinates(output_directory, pdb_file_name, center_of_mass_dict)
 
     # Save the modified PDB file
-    save_modified_structure(output_directory, filename, pdb_file_name)
+    output_file_path = save_modified_structure(output_directory, filename, pdb_file_name, structure)
     print(f"Processed {filename}. Output saved to {output_directory}")
+    return output_file_path
 
 
-def get_organic_molecules(pdb_file_path: str) -> Dict[str, List[tuple[str, str]]]:
+def get_organic_molecules(pdb_file_path: str,
+                          structure: Optional[Structure] = None
+                          ) -> Dict[str, List[tuple[str, str]]]:
     """
-    Extract the organic molecules from a PDB file by searching for the HET record type.
+    Extract the organic molecules from a PDB file: all HETATM residues except water.
 
     Args:
         pdb_file_path (str): Full path to the PDB file.
+        structure (Optional[Structure]): Already parsed structure of the file, to
+        avoid reading it again.
     Returns:
         Dict[str, List[tuple[str, str]]]: Dictionary with residue names as keys and
         lists of (chain, residue number) tuples as values.
     """
-    organic_molecules: Dict[str, List[tuple[str, str]]] = {}
+    if structure is None:
+        structure = Structure.from_file(pdb_file_path)
 
-    with open(pdb_file_path, "r") as pdb_file:
-        pdb_lines = pdb_file.readlines()
-
-    for line in pdb_lines:
-        if line.startswith("HET "):
-            parts = line.split()
-
-            # Check if the line has enough parts to access
-            if len(parts) > 4:
-                residue_name = parts[1]
-                chain_id = parts[2]
-                residue_number = parts[3]
-                if len(parts) == 4:
-                    residue_name = parts[1]
-                    chain_id = parts[2][0]
-                    residue_number = parts[2][1:]
-                # Append each instance of the organic molecule to the dictionary
-                if residue_name not in organic_molecules:
-                    organic_molecules[residue_name] = []
-                organic_molecules[residue_name].append((chain_id, residue_number))
-            else:
-                print(f"Warning: Skipping malformed HET line: {line.strip()}")
+    organic_molecules: Dict[str, List[tuple[str, str]]] = {}
+    for residue_name, chain_id, residue_number in structure.get_residues("hetatm and not solvent"):
+        # Append each instance of the organic molecule to the dictionary
+        organic_molecules.setdefault(residue_name, []).append((chain_id, residue_number))
 
     if not organic_molecules:
         raise ValueError("No organic molecules found in the PDB file.")
@@ -109,7 +118,8 @@ def get_organic_molecules(pdb_file_path: str) -> Dict[str, List[tuple[str, str]]
 
 def calculate_center_of_mass(residue_name: str,
                              chain_id: str,
-                             residue_number: str) -> List[float]:
+                             residue_number: str,
+                             structure: Optional[Structure] = None) -> List[float]:
     """
     Selects the ligand and calculates its center of mass.
 
@@ -117,6 +127,8 @@ def calculate_center_of_mass(residue_name: str,
     - residue_name (str): Residue name of the organic molecule.
     - chain_id (str): Chain ID where the residue is located.
     - residue_number (str): Residue number of the organic molecule.
+    - structure (Optional[Structure]): Structure to select from. If None, the
+    structure loaded in PyMOL is used.
 
     Returns:
     - List[float]: Center of mass coordinates (x, y, z).
@@ -125,20 +137,25 @@ def calculate_center_of_mass(residue_name: str,
     selection_expression = (
         f"(resn {residue_name} and chain {chain_id} and resi {residue_number})"
     )
+    if structure is not None:
+        return structure.centerofmass(selection_expression)
     cmd.select(selection_name, selection_expression)  # type: ignore
     return cmd.centerofmass(selection_name)  # type: ignore
 
 
-def calculate_protein_center_of_mass() -> List[float]:
+def calculate_protein_center_of_mass(structure: Optional[Structure] = None) -> List[float]:
     """
     Calculate the center of mass of the protein itself.
 
     Args:
-    - object_name (str): Name of the loaded object in PyMOL.
+    - structure (Optional[Structure]): Protein structure. If None, the structure
+    loaded in PyMOL is used.
 
     Returns:
     - List[float]: Center of mass coordinates (x, y, z) for the protein.
     """
+    if structure is not None:
+        return structure.centerofmass("all")
     cmd.select("protein_structure", "all")  # type: ignore
     return cmd.centerofmass("protein_structure")  # type: ignore
 
@@ -171,7 +188,8 @@ def save_grid_coordinates(output_directory: str,
                 config_file.write("\n")
 
 
-def save_modified_structure(output_directory: str, filename: str, object_name: str):
+def save_modified_structure(output_directory: str, filename: str, object_name: str,
+                            structure: Optional[Structure] = None) -> str:
     """
     Save the modified PDB structure file after removing non-protein atoms.
 
@@ -179,13 +197,86 @@ def save_modified_structure(output_directory: str, filename: str, object_name: s
     - output_directory (str): Directory to save the modified PDB file.
     - filename (str): Original file name for creating the modified file name.
     - object_name (str): Name of the object in PyMOL.
+    - structure (Optional[Structure]): Structure to save. If None, the PyMOL
+    object is saved.
+
+    Returns:
+    - str: Path of the saved file.
+    """
+    output_file_path = os.path.join(output_directory, stripped_filename(filename))
+    if structure is not None:
+        structure.save(output_file_path)
+    else:
+        cmd.save(output_file_path, object_name, format="pdb")  # type: ignore
+    return output_file_path
+
+
+def stripped_filename(filename: str) -> str:
+    """
+    Name of the stripped output file of a PDB file, e.g. "6o0k_stripped.pdb".
+    """
+    return os.path.splitext(os.path.basename(filename))[0] + "_stripped.pdb"
+
+
+def _init_strip_worker(use_pymol: bool) -> None:
+    # Every worker process has its own PyMOL instance
+    if use_pymol:
+        initialize_pymol()
+
+
+def _strip_job(job: Tuple[str, str, str, bool]) -> Tuple[Optional[str], Optional[str]]:
+    input_path, filename, output_directory, use_pymol = job
+    try:
+        return strip_protein_extract_coordinate_info(input_path, filename, output_directory,
+                                                     use_pymol), None
+    except Exception as e:
+        return None, str(e)
+    finally:
+        if use_pymol:
+            cmd.delete("all")  # type: ignore
+
+
+def strip_parallel(input_path: str, filenames: Sequence[str], output_directory: str,
+                   workers: int,
+                   use_pymol: bool = False) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Strip PDB files in a pool of worker processes.
+
+    Args:
+    - input_path (str): Path to the directory containing the PDB files.
+    - filenames (Sequence[str]): Names of the PDB files.
+    - output_directory (str): Directory to save the modified files.
+    - workers (int): Number of worker processes.
+    - use_pymol (bool): Use one PyMOL instance per worker instead of the headless
+    NumPy structure model.
+
+    Yields:
+    - Tuple[str, Optional[str], Optional[str]]: File name, path of the stripped file
+    (None on failure) and error message (None on success), in the order of `filenames`.
+    """
+    filenames = list(filenames)
+    if not filenames:
+        return
+    workers = max(1, min(workers, len(filenames)))
+    jobs = [(input_path, filename, output_directory, use_pymol) for filename in filenames]
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_strip_worker, initargs=(use_pymol,)) as pool:
+        for filename, (output_path, error) in zip(filenames, pool.imap(_strip_job, jobs, chunksize=1)):
+            yield filename, output_path, error
+
+
+def list_pdb_files(input_path: str) -> List[str]:
     """
-    output_filename = os.path.splitext(filename)[0] + "_stripped.pdb"
-    output_file_path = os.path.join(output_directory, output_filename)
-    cmd.save(output_file_path, object_name, format="pdb")  # type: ignore
+    List the PDB files to process in a directory, in sorted order. Outputs of earlier
+    runs (`*_stripped.pdb`) are left out, as the input and output directories may be
+    the same.
+    """
+    return sorted(filename for filename in os.listdir(input_path)
+                  if filename.endswith(".pdb") and not filename.endswith("_stripped.pdb"))
 
 
-def process_pdb_files(input_path: str, output_directory: str) -> List[str]:
+def process_pdb_files(input_path: str, output_directory: str,
+                      use_pymol: bool = False, workers: int = 1) -> List[str]:
     """
     Process all experimental PDB files in the input directory:
     - Identify the ligand and its center of mass for grid coordinates.
@@ -195,23 +286,44 @@ def process_pdb_files(input_path: str, output_directory: str) -> List[str]:
     Args:
     - input_path (str): Path to the directory containing PDB files.
     - output_directory (str): Path to the directory for saving modified PDB files.
-    """
-    initialize_pymol()
+    - use_pymol (bool): Use PyMOL instead of the headless NumPy structure model.
+    - workers (int): Number of worker processes. With more than one, the files are
+    processed in parallel, each worker with its own PyMOL instance if `use_pymol`.
 
+    Returns:
+    - List[str]: Names of the stripped files (`*_stripped.pdb`) in the output
+    directory, for the PDB files that were processed successfully.
+    """
+    pdb_filenames = list_pdb_files(input_path)
     processed_files = []
-    for filename in os.listdir(input_path):
-        processed_files.append(filename)  # type: ignore
-        if filename.endswith(".pdb"):
-            try:
-                strip_protein_extract_coordinate_info(input_path,
-                                                      filename,
-                                                      output_directory)
+    if workers > 1:
+        for filename, output_path, error in strip_parallel(input_path, pdb_filenames,
+                                                           output_directory, workers, use_pymol):
+            if error is None:
+                processed_files.append(os.path.basename(output_path))  # type: ignore
                 print(f"You {filename} file is stripped and grid coordinates "
                       "are extracted!")
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
-    pymol.cmd.quit()
-    return processed_files  # type: ignore
+            else:
+                print(f"Error processing {filename}: {error}")
+        return processed_files
+
+    if use_pymol:
+        initialize_pymol()
+
+    for filename in pdb_filenames:
+        try:
+            output_path = strip_protein_extract_coordinate_info(input_path,
+                                                                filename,
+                                                                output_directory,
+                                                                use_pymol)
+            processed_files.append(os.path.basename(output_path))
+            print(f"You {filename} file is stripped and grid coordinates "
+                  "are extracted!")
+        except Exception as e:
+            print(f"Error processing {filename}: {e}")
+    if use_pymol:
+        pymol.cmd.quit()  # type: ignore
+    return processed_files
 
 
 if __name__ == "__main__":
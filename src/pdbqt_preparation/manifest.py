@@ -0,0 +1,230 @@
+"""
+Build manifest of the PDBQT preparation pipeline.
+
+Every completed stage of a file (strip, fix, convert) is recorded with a key over
+its inputs - the content hash of the input file, the tool version, the pH and the
+command line flags - and the content hashes of its outputs. A stage is up to date
+when its key is unchanged and its outputs are still on disk unmodified; the
+pipeline then skips it and passes the recorded output on. A re-run thus resumes a
+crashed batch at the first incomplete stage of every file, and changing only the
+pH re-runs only fixing and conversion.
+
+The manifest is an append-only JSONL file, one record per completed stage, the
+latest record per file and stage winning, e.g.:
+
+{"file": "6o0k.pdb", "stage": "fix", "key": "3f1c...",
+ "outputs": {"6o0k_fixed.pdb": "9a0b..."}}
+"""
+
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import threading
+from functools import lru_cache
+from importlib import metadata
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+MANIFEST_VERSION = "pdbqt-prep-v1"
+MANIFEST_NAME = ".prep_manifest.jsonl"
+# Stages implemented in this repository, versioned by the source of the modules they run
+IN_PROCESS_TOOLS: Dict[str, Tuple[str, ...]] = {
+    "structure_io": ("src.structure_io", "src.pdbqt_preparation.extract_protein"),
+    "native": ("src.structure_io", "src.pdbqt_preparation.pdbqt_writer"),
+    "openmm_fixer": ("src.pdbqt_preparation.openmm_fixer",),
+}
+
+
+def file_hash(path: str) -> str:
+    """
+    Compute the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_version(modules: Sequence[str]) -> str:
+    """
+    Compute a version of in-repository code from the SHA-256 of its source files, so
+    that outputs are rebuilt whenever the code changes.
+
+    Args:
+        modules (Sequence[str]): Module or package names; packages include all their
+        `.py` files.
+
+    Returns:
+        str: "source-" and the first 16 hex digits of the digest.
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        spec = importlib.util.find_spec(module)
+        if spec is None or spec.origin is None:
+            raise ImportError(f"No source found for module '{module}'")
+        if spec.submodule_search_locations:
+            paths = sorted(path for location in spec.submodule_search_locations
+                           for path in glob.glob(os.path.join(location, "*.py")))
+        else:
+            paths = [spec.origin]
+        for path in paths:
+            digest.update(os.path.basename(path).encode())
+            digest.update(file_hash(path).encode())
+    return f"source-{digest.hexdigest()[:16]}"
+
+
+@lru_cache(maxsize=None)
+def tool_version(tool: str) -> str:
+    """
+    Get the version of a preparation tool, so that outputs are rebuilt after an
+    upgrade. The in-process stages of this repository (see `IN_PROCESS_TOOLS`) are
+    versioned by their source; Python packages (pdbfixer, openmm, pymol) are looked up
+    in the installed distributions; command line tools are asked with `-V`.
+
+    Args:
+        tool (str): Name of the distribution or command.
+
+    Returns:
+        str: The version, or "unknown" if it cannot be determined.
+    """
+    if tool in IN_PROCESS_TOOLS:
+        return source_version(IN_PROCESS_TOOLS[tool])
+    try:
+        return metadata.version(tool)
+    except metadata.PackageNotFoundError:
+        pass
+    if shutil.which(tool) is None:
+        return "unknown"
+    try:
+        completed = subprocess.run([tool, "-V"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+    lines = completed.stdout.strip().splitlines()
+    return lines[0] if completed.returncode == 0 and lines else "unknown"
+
+
+def stage_key(input_file: str, tool: str, **params: Any) -> str:
+    """
+    Compute the key of a stage run over its input file contents, tool version and
+    parameters.
+
+    Args:
+        input_file (str): Path to the input file of the stage.
+        tool (str): Name of the tool the stage runs.
+        **params: pH, flags and other settings the output depends on.
+
+    Returns:
+        str: Hex digest identifying the stage run.
+    """
+    description = json.dumps({"version": MANIFEST_VERSION, "input": file_hash(input_file),
+                              "tool": tool, "tool_version": tool_version(tool), "params": params},
+                             sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+class BuildManifest:
+    """
+    Thread-safe, append-only record of the completed stages of a preparation batch.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initializes the manifest and reads the stages recorded by earlier runs.
+
+        Args:
+            path (str): Path of the JSONL file. Output paths are stored relative to its
+            directory. It is created on the first record.
+        """
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self._records: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self.load()
+
+    def load(self) -> None:
+        """
+        Reads the recorded stages. Incomplete lines of an interrupted write are skipped.
+        """
+        self._records.clear()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._records[(record["file"], record["stage"])] = record
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+    def lookup(self, filename: str, stage: str, key: str) -> Optional[str]:
+        """
+        Checks whether a stage of a file is up to date.
+
+        Args:
+            filename (str): Name of the input PDB file of the batch.
+            stage (str): Name of the stage.
+            key (str): Key of the stage run, see `stage_key`.
+
+        Returns:
+            Optional[str]: Path of the main output if the stage ran with the same key
+            and all its outputs are unchanged on disk, otherwise None.
+        """
+        with self._lock:
+            record = self._records.get((filename, stage))
+        if record is None or record.get("key") != key or not record.get("outputs"):
+            return None
+        for output, digest in record["outputs"].items():
+            path = os.path.join(self.directory, output)
+            if not os.path.exists(path) or file_hash(path) != digest:
+                return None
+        return os.path.join(self.directory, next(iter(record["outputs"])))
+
+    def record(self, filename: str, stage: str, key: str, outputs: Sequence[str]) -> None:
+        """
+        Records a completed stage and flushes it to disk.
+
+        Args:
+            filename (str): Name of the input PDB file of the batch.
+            stage (str): Name of the stage.
+            key (str): Key of the stage run, see `stage_key`.
+            outputs (Sequence[str]): Paths of the output files, the main output first.
+        """
+        record = {"file": filename, "stage": stage, "key": key,
+                  "outputs": {os.path.relpath(os.path.abspath(output), self.directory): file_hash(output)
+                              for output in outputs}}
+        with self._lock:
+            self._records[(filename, stage)] = record
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._terminate_last_line()
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def _terminate_last_line(self) -> None:
+        # Start on a new line if the previous run stopped in the middle of a record
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+    def close(self) -> None:
+        """
+        Closes the JSONL file.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self) -> "BuildManifest":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,118 @@
+"""
+In-process fixing and protonation with the PDBFixer/OpenMM Python API.
+
+The `pdbfixer` command line tool starts a Python interpreter, imports OpenMM and
+parses the force field XML files again for every structure, which takes longer
+than fixing a small protein. `StructureFixer` loads the force field once and then
+fixes structures in memory, from PDB text to PDB text, with the same steps as
+`protonation.pdbfixer`: add missing residues and heavy atoms, then add hydrogens at
+the given pH.
+
+For batches, the fixer runs in long-lived worker processes (`_init_fixer_worker`),
+one `StructureFixer` per process. pdbfixer and openmm are optional dependencies and
+are only needed for this backend.
+"""
+
+import io
+import os
+from typing import Optional, Sequence, Tuple
+
+from src.pdbqt_preparation.protonation import SUBPROCESS_THREAD_ENV_VARS
+
+try:
+    from openmm.app import ForceField, PDBFile  # type: ignore
+    from pdbfixer import PDBFixer  # type: ignore
+except ImportError:  # pdbfixer and OpenMM are only needed for the in-process backend
+    ForceField = None
+    PDBFile = None
+    PDBFixer = None
+
+DEFAULT_FORCEFIELD_FILES = ("amber14-all.xml",)
+
+_worker_fixer: Optional["StructureFixer"] = None
+
+
+def openmm_available() -> bool:
+    """
+    Check whether the pdbfixer and openmm packages are installed.
+    """
+    return PDBFixer is not None
+
+
+class StructureFixer:
+    """
+    PDBFixer with a preloaded OpenMM force field.
+    """
+
+    def __init__(self, forcefield_files: Sequence[str] = DEFAULT_FORCEFIELD_FILES,
+                 add_residues: bool = True) -> None:
+        """
+        Initializes the fixer and loads the force field.
+
+        Args:
+            forcefield_files (Sequence[str]): OpenMM force field files, used to place
+            the hydrogens.
+            add_residues (bool): Add missing residues, like `--add-residues` of the CLI.
+
+        Raises:
+            ImportError: If pdbfixer or openmm is not installed.
+        """
+        if not openmm_available():
+            raise ImportError("The in-process fixer needs the pdbfixer and openmm packages.")
+        self.forcefield_files = tuple(forcefield_files)
+        self.add_residues = add_residues
+        self.forcefield = ForceField(*self.forcefield_files)
+
+    def fix(self, pdb_text: str, pH_value: float = 7.4) -> str:
+        """
+        Fix and protonate a structure in memory.
+
+        Args:
+            pdb_text (str): Contents of the PDB file.
+            pH_value (float): The pH value for protonation.
+
+        Returns:
+            str: Contents of the fixed PDB file.
+        """
+        fixer = PDBFixer(pdbfile=io.StringIO(pdb_text))
+        if self.add_residues:
+            fixer.findMissingResidues()
+        else:
+            fixer.missingResidues = {}
+        fixer.findMissingAtoms()
+        fixer.addMissingAtoms()
+        fixer.addMissingHydrogens(pH_value, forcefield=self.forcefield)
+        output = io.StringIO()
+        PDBFile.writeFile(fixer.topology, fixer.positions, output, keepIds=True)
+        return output.getvalue()
+
+    def fix_file(self, input_pdb_file: str, output_file: str, pH_value: float = 7.4) -> str:
+        """
+        Fix and protonate a PDB file, like `protonation.pdbfixer` without the subprocess.
+
+        Args:
+            input_pdb_file (str): Path to the input PDB file.
+            output_file (str): Path to the output PDB file.
+            pH_value (float): The pH value for protonation.
+
+        Returns:
+            str: Path to the output PDB file.
+        """
+        with open(input_pdb_file, "r") as f:
+            fixed = self.fix(f.read(), pH_value)
+        with open(output_file, "w") as f:
+            f.write(fixed)
+        print(f'Your PDB file is protonated at {pH_value} and fixed: {output_file}')
+        return output_file
+
+
+def _init_fixer_worker(forcefield_files: Sequence[str], n_threads: int) -> None:
+    global _worker_fixer
+    # OpenMM reads the thread count when it creates a context, after this point
+    os.environ.update({k: str(n_threads) for k in SUBPROCESS_THREAD_ENV_VARS})
+    _worker_fixer = StructureFixer(forcefield_files)
+
+
+def _fix_job(job: Tuple[str, float]) -> str:
+    pdb_text, pH_value = job
+    return _worker_fixer.fix(pdb_text, pH_value)  # type: ignore
@@ -0,0 +1,518 @@
+"""
+Native writer of rigid-receptor PDBQT files.
+
+It replaces the `obabel <pdb> -xr -O <pdbqt>` subprocess of `save_pdb2pdbqt` with
+an in-memory step on a `Structure`, so a receptor is neither written out and parsed
+again nor needs a process per file. Like Open Babel, the writer
+
+1. perceives the covalent bonds from the interatomic distances,
+2. assigns the hybridization from the bonds and the bond geometry,
+3. computes Gasteiger-Marsili (PEOE) partial charges from zero initial charges,
+4. assigns the AutoDock 4 atom types (C/A, N/NA, OA, S, HD, H, metals, halogens),
+5. merges the non-polar hydrogens into their heavy atoms,
+
+all with vectorized NumPy over atom and bond arrays. Aromatic carbons ("A") are
+recognized in the standard aromatic residues (PHE, TYR, TRP, HIS); other carbons
+are written as "C". Open Babel perceives aromaticity from the ring geometry instead
+and leaves some HIS and TRP rings non-aromatic; apart from those, the types are the
+ones of `obabel -xr`, and the charges the ones of `obabel -xr --partialcharge
+gasteiger`. Plain `obabel -xr` writes zero charges for PDB input, so the two
+converters give the same types but different charges. The hybridization is derived
+from the bonds, so the input should be protonated, e.g. by the fixer stage of the
+pipeline.
+
+The output holds only ATOM/HETATM records, which is what AutoDock Vina accepts in a
+rigid receptor.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.structure_io.parser import format_pdb_line
+from src.structure_io.structure import Structure
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy is optional, bonds are then searched block by block
+    cKDTree = None
+
+# Covalent radii in Å of the elements bonds are perceived for; metal ions and other
+# elements are written without bonds
+COVALENT_RADII = {
+    "H": 0.31, "D": 0.31, "B": 0.84, "C": 0.76, "N": 0.71, "O": 0.66, "F": 0.57,
+    "P": 1.07, "S": 1.05, "CL": 1.02, "SE": 1.20, "BR": 1.20, "I": 1.39,
+}
+BOND_TOLERANCE = 0.45
+# Covalent radii in Å of metal ions. Their bonds are not perceived, but a nitrogen
+# that coordinates a metal counts the contact as a bond when it is typed, as in the
+# bonds Open Babel adds from the distances
+METAL_COVALENT_RADII = {
+    "LI": 1.28, "NA": 1.66, "K": 2.03, "MG": 1.41, "CA": 1.76, "MN": 1.39, "FE": 1.32,
+    "CO": 1.26, "NI": 1.24, "CU": 1.32, "ZN": 1.22, "CD": 1.44, "HG": 1.32,
+}
+MIN_BOND_LENGTH = 0.4
+
+SP, SP2, SP3 = 1, 2, 3
+# Gasteiger-Marsili parameters (a, b, c) of the electronegativity a + b*q + c*q^2
+# per element (or nitrogen class, see `gasteiger_atom_types`) and hybridization (0:
+# any), as in Open Babel
+GASTEIGER_PARAMETERS = {
+    ("H", 0): (7.17, 6.24, -0.56),
+    ("C", SP3): (7.98, 9.18, 1.88), ("C", SP2): (8.79, 9.32, 1.51), ("C", SP): (10.39, 9.45, 0.73),
+    ("N", SP3): (11.54, 10.82, 1.36), ("N", SP2): (12.87, 11.15, 0.85), ("N", SP): (15.68, 11.70, -0.27),
+    ("N+", SP3): (0.0, 11.86, 11.86), ("NPL", SP2): (12.32, 11.20, 1.34),
+    ("O", SP3): (14.18, 12.92, 1.39), ("O", SP2): (17.07, 13.79, 0.47),
+    ("S", SP3): (10.14, 9.13, 1.38), ("S", SP2): (10.88, 9.49, 1.33), ("P", SP3): (8.90, 8.24, 0.96),
+    ("F", 0): (14.66, 13.85, 2.31), ("CL", 0): (11.00, 9.69, 1.35),
+    ("BR", 0): (10.08, 8.47, 1.16), ("I", 0): (9.90, 7.96, 0.96),
+}
+# Electronegativity of the hydrogen cation, used instead of a + b + c
+HYDROGEN_CATION_ELECTRONEGATIVITY = 20.02
+GASTEIGER_ITERATIONS = 6
+GASTEIGER_DAMPING = 0.5
+
+AROMATIC_ATOMS = {
+    "PHE": {"CG", "CD1", "CD2", "CE1", "CE2", "CZ"},
+    "TYR": {"CG", "CD1", "CD2", "CE1", "CE2", "CZ"},
+    "TRP": {"CG", "CD1", "CD2", "NE1", "CE2", "CE3", "CZ2", "CZ3", "CH2"},
+    "HIS": {"CG", "ND1", "CD2", "CE1", "NE2"},
+    "HID": {"CG", "ND1", "CD2", "CE1", "NE2"},
+    "HIE": {"CG", "ND1", "CD2", "CE1", "NE2"},
+    "HIP": {"CG", "ND1", "CD2", "CE1", "NE2"},
+}
+# AutoDock 4 types of the elements without special rules
+AUTODOCK_ELEMENT_TYPES = {
+    "F": "F", "CL": "Cl", "BR": "Br", "I": "I", "P": "P", "MG": "Mg", "CA": "Ca",
+    "MN": "Mn", "FE": "Fe", "ZN": "Zn",
+}
+# Elements without an AutoDock 4 type. Open Babel writes their element symbol, which
+# AutoDock and Vina reject; they are written as the closest supported type instead:
+# selenium (selenomethionine) as sulfur, and metal ions as zinc, since Vina scores
+# all metal types alike as metal donors.
+AUTODOCK_FALLBACK_TYPES = {"SE": "S"}
+METAL_FALLBACK_TYPE = "Zn"
+METAL_ELEMENTS = frozenset([
+    "LI", "NA", "K", "RB", "CS", "BE", "SR", "BA", "AL", "GA", "IN", "TL", "SN", "PB",
+    "TI", "V", "CR", "CO", "NI", "CU", "MO", "W", "RU", "RH", "PD", "AG", "CD", "OS",
+    "IR", "PT", "AU", "HG", "LA", "CE", "EU", "GD", "TB", "YB", "LU", "U",
+])
+
+
+def perceive_bonds(coords: np.ndarray, elements: np.ndarray) -> np.ndarray:
+    """
+    Find the covalent bonds from the interatomic distances: two atoms are bonded when
+    their distance is below the sum of their covalent radii plus `BOND_TOLERANCE`. A
+    hydrogen keeps only its closest bond.
+
+    Args:
+        coords (np.ndarray): Coordinates of shape (N, 3).
+        elements (np.ndarray): Upper case element symbols of shape (N,).
+
+    Returns:
+        np.ndarray: Atom index pairs (i < j) of shape (M, 2).
+    """
+    radii = np.array([COVALENT_RADII.get(e, 0.0) for e in elements.tolist()])
+    candidates = np.flatnonzero(radii > 0)
+    if len(candidates) < 2:
+        return np.zeros((0, 2), dtype=np.int64)
+    cutoff = 2 * radii.max() + BOND_TOLERANCE
+    if cKDTree is not None:
+        pairs = cKDTree(coords[candidates]).query_pairs(cutoff, output_type="ndarray")
+        pairs = candidates[pairs.reshape(-1, 2)]
+    else:
+        pairs = _pairs_blockwise(coords, candidates, cutoff)
+
+    i, j = pairs[:, 0], pairs[:, 1]
+    distances = np.linalg.norm(coords[i] - coords[j], axis=1)
+    is_hydrogen = np.isin(elements, ["H", "D"])
+    keep = (distances > MIN_BOND_LENGTH) & (distances < radii[i] + radii[j] + BOND_TOLERANCE) \
+        & ~(is_hydrogen[i] & is_hydrogen[j])
+    i, j, distances = i[keep], j[keep], distances[keep]
+
+    # Hydrogens are monovalent: keep the shortest bond of every hydrogen
+    order = np.argsort(distances, kind="stable")
+    i, j = i[order], j[order]
+    hydrogen = np.where(is_hydrogen[i], i, np.where(is_hydrogen[j], j, -1))
+    first = np.ones(len(i), dtype=bool)
+    with_hydrogen = np.flatnonzero(hydrogen >= 0)
+    _, unique = np.unique(hydrogen[with_hydrogen], return_index=True)
+    first[with_hydrogen] = False
+    first[with_hydrogen[unique]] = True
+    bonds = np.stack([i[first], j[first]], axis=1)
+    return bonds[np.lexsort((bonds[:, 1], bonds[:, 0]))]
+
+
+def _pairs_blockwise(coords: np.ndarray, candidates: np.ndarray, cutoff: float,
+                     block: int = 1024) -> np.ndarray:
+    # All pairs within `cutoff`, one (block, block) tile of the upper triangle of the
+    # distance matrix at a time, so memory does not grow with the number of atoms
+    points = coords[candidates]
+    pairs = []
+    for row in range(0, len(points), block):
+        for col in range(row, len(points), block):
+            d = np.linalg.norm(points[row:row + block, None] - points[None, col:col + block], axis=-1)
+            rows, cols = np.nonzero(d < cutoff)
+            rows, cols = rows + row, cols + col
+            upper = cols > rows
+            pairs.append(np.stack([rows[upper], cols[upper]], axis=1))
+    return candidates[np.concatenate(pairs)] if pairs else np.zeros((0, 2), dtype=np.int64)
+
+
+def _directed(bonds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Every bond in both directions, so per-atom sums are one `np.add.at`/`bincount`
+    return np.concatenate([bonds[:, 0], bonds[:, 1]]), np.concatenate([bonds[:, 1], bonds[:, 0]])
+
+
+def assign_hybridization(coords: np.ndarray, elements: np.ndarray, bonds: np.ndarray,
+                         aromatic: np.ndarray) -> np.ndarray:
+    """
+    Assign the hybridization (`SP`, `SP2`, `SP3`) of every atom with the rules of Open
+    Babel. Carbons are sp2 when aromatic or planar and sp when linear: the length of
+    the sum of their unit bond vectors is 0 for linear and planar centers and about 1
+    for tetrahedral ones. Like Open Babel, a center loses one degree of unsaturation
+    when none of its neighbors is planar, linear or terminal. Nitrogens and oxygens are sp2 when they are aromatic or
+    bonded to an unsaturated carbon (amides, guanidinium, carbonyl and carboxylate
+    oxygens, phenols), nitrile nitrogens are sp, and all others are sp3.
+
+    Args:
+        coords (np.ndarray): Coordinates of shape (N, 3).
+        elements (np.ndarray): Upper case element symbols of shape (N,).
+        bonds (np.ndarray): Bonds of shape (M, 2).
+        aromatic (np.ndarray): Boolean mask of the aromatic atoms.
+
+    Returns:
+        np.ndarray: Hybridization of every atom, 0 for hydrogens, halogens and ions.
+    """
+    n = len(elements)
+    a, b = _directed(bonds)
+    degree = np.bincount(a, minlength=n)
+    vectors = coords[b] - coords[a]
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    pyramidality = np.zeros((n, 3))
+    np.add.at(pyramidality, a, vectors)
+    pyramidality = np.linalg.norm(pyramidality, axis=1)
+
+    geometric = np.select([degree >= 4,
+                           (degree == 3) & (pyramidality < 0.5),
+                           degree == 3,
+                           (degree == 2) & (pyramidality < 0.4),
+                           (degree == 2) & (pyramidality < 1.074)],
+                          [SP3, SP2, SP3, SP, SP2], default=SP3)
+    # A planar or linear center needs a neighbor that can share a multiple bond: one
+    # that is planar or linear as well, or terminal; otherwise it is saturated
+    is_heavy = ~np.isin(elements, ["H", "D"])
+    open_neighbor = (is_heavy & (geometric != SP3)) | (degree == 1)
+    saturated = np.bincount(a[open_neighbor[b]], minlength=n) == 0
+    geometric = np.where(saturated, np.minimum(geometric + 1, SP3), geometric)
+    hybridization = np.zeros(n, dtype=np.int64)
+    is_c = elements == "C"
+    hybridization[is_c] = np.where(aromatic[is_c], SP2, geometric[is_c])
+
+    # Nitrogen and oxygen take their hybridization from their carbon neighbors
+    unsaturated = is_c & (hybridization != SP3)
+    n_unsaturated = np.bincount(a[unsaturated[b]], minlength=n)
+    nitrile = np.zeros(n, dtype=bool)
+    nitrile[a[(degree[a] == 1) & is_c[b] & (hybridization[b] == SP)]] = True
+    for element in ("N", "O"):
+        mask = elements == element
+        hybridization[mask] = np.where(aromatic[mask] | (n_unsaturated[mask] > 0), SP2, SP3)
+    hybridization[(elements == "N") & nitrile] = SP
+    hybridization[elements == "S"] = SP3
+    hybridization[elements == "P"] = SP3
+    return hybridization
+
+
+def gasteiger_atom_types(elements: np.ndarray, bonds: np.ndarray, hybridization: np.ndarray,
+                         aromatic: np.ndarray) -> np.ndarray:
+    """
+    Split the nitrogens into the classes Open Babel has separate Gasteiger parameters
+    for: "N+" for sp3 nitrogens with four bonds (ammonium) and "NPL" for sp2
+    nitrogens that are neither aromatic nor part of a guanidinium group (amides,
+    planar amines). Other atoms keep their element.
+
+    Args:
+        elements (np.ndarray): Upper case element symbols of shape (N,).
+        bonds (np.ndarray): Bonds of shape (M, 2).
+        hybridization (np.ndarray): Hybridization of every atom.
+        aromatic (np.ndarray): Boolean mask of the aromatic atoms.
+
+    Returns:
+        np.ndarray: Element or nitrogen class of every atom, for `gasteiger_charges`.
+    """
+    n = len(elements)
+    a, b = _directed(bonds)
+    degree = np.bincount(a, minlength=n)
+    is_n = elements == "N"
+    # A guanidinium carbon has three nitrogens
+    n_nitrogens = np.bincount(a[is_n[b]], minlength=n)
+    guanidinium = np.zeros(n, dtype=bool)
+    guanidinium[b[(elements[a] == "C") & (n_nitrogens[a] == 3) & is_n[b]]] = True
+
+    types = elements.astype("U3")
+    types[is_n & (hybridization == SP3) & (degree == 4)] = "N+"
+    types[is_n & (hybridization == SP2) & ~aromatic & ~guanidinium] = "NPL"
+    return types
+
+
+def gasteiger_charges(elements: np.ndarray, hybridization: np.ndarray, bonds: np.ndarray,
+                      initial_charges: Optional[np.ndarray] = None,
+                      iterations: int = GASTEIGER_ITERATIONS) -> np.ndarray:
+    """
+    Compute Gasteiger-Marsili partial charges by partial equalization of orbital
+    electronegativity, all bonds of an iteration at once.
+
+    Args:
+        elements (np.ndarray): Upper case element symbols of shape (N,), with the
+        nitrogen classes of `gasteiger_atom_types`.
+        hybridization (np.ndarray): Hybridization of every atom.
+        bonds (np.ndarray): Bonds of shape (M, 2).
+        initial_charges (Optional[np.ndarray]): Charges to start from. Defaults to zero,
+        like Open Babel.
+        iterations (int): Number of iterations, each damped by half.
+
+    Returns:
+        np.ndarray: Partial charge of every atom. Atoms without parameters (e.g. metal
+        ions) keep their initial charge.
+    """
+    n = len(elements)
+    params = np.zeros((n, 3))
+    has_params = np.zeros(n, dtype=bool)
+    keys = np.char.add(np.char.add(elements.astype(str), "|"), hybridization.astype(str))
+    for key in np.unique(keys):
+        element, hybrid = key.split("|")
+        values = GASTEIGER_PARAMETERS.get((element, int(hybrid)), GASTEIGER_PARAMETERS.get((element, 0)))
+        if values is None and element == "D":
+            values = GASTEIGER_PARAMETERS[("H", 0)]
+        if values is not None:
+            params[keys == key] = values
+            has_params[keys == key] = True
+    a_, b_, c_ = params.T
+    cation = np.where(np.isin(elements, ["H", "D"]), HYDROGEN_CATION_ELECTRONEGATIVITY, a_ + b_ + c_)
+
+    charges = np.zeros(n) if initial_charges is None else np.asarray(initial_charges, dtype=np.float64).copy()
+    bonds = bonds[has_params[bonds[:, 0]] & has_params[bonds[:, 1]]]
+    i, j = bonds[:, 0], bonds[:, 1]
+    damping = 1.0
+    for _ in range(iterations):
+        damping *= GASTEIGER_DAMPING
+        chi = a_ + b_ * charges + c_ * charges ** 2
+        difference = chi[j] - chi[i]
+        # Normalized by the cation electronegativity of the less electronegative atom
+        transfer = damping * difference / np.where(difference > 0, cation[i], cation[j])
+        np.add.at(charges, i, transfer)
+        np.add.at(charges, j, -transfer)
+    return charges
+
+
+def _element_type(element: str) -> str:
+    if element in AUTODOCK_ELEMENT_TYPES:
+        return AUTODOCK_ELEMENT_TYPES[element]
+    if element in AUTODOCK_FALLBACK_TYPES:
+        return AUTODOCK_FALLBACK_TYPES[element]
+    if element in METAL_ELEMENTS:
+        return METAL_FALLBACK_TYPE
+    raise ValueError(f"No AutoDock 4 atom type for element '{element}'")
+
+
+def metal_contacts(coords: np.ndarray, elements: np.ndarray) -> np.ndarray:
+    """
+    Count the metal ions within bonding distance of every nitrogen, i.e. closer than
+    the sum of their covalent radii plus `BOND_TOLERANCE`.
+
+    Args:
+        coords (np.ndarray): Coordinates of shape (N, 3).
+        elements (np.ndarray): Upper case element symbols of shape (N,).
+
+    Returns:
+        np.ndarray: Number of coordinated metal ions of every atom, 0 for all but
+        nitrogens.
+    """
+    contacts = np.zeros(len(elements), dtype=np.int64)
+    metals = np.flatnonzero(np.isin(elements, list(METAL_COVALENT_RADII)))
+    nitrogens = np.flatnonzero(elements == "N")
+    if len(metals) == 0 or len(nitrogens) == 0:
+        return contacts
+    metal_radii = np.array([METAL_COVALENT_RADII[e] for e in elements[metals].tolist()])
+    cutoff = COVALENT_RADII["N"] + metal_radii + BOND_TOLERANCE
+    # Few metals per structure: one column of distances per metal
+    distances = np.linalg.norm(coords[nitrogens, None] - coords[None, metals], axis=-1)
+    contacts[nitrogens] = ((distances > MIN_BOND_LENGTH) & (distances < cutoff)).sum(axis=1)
+    return contacts
+
+
+def autodock_types(structure: Structure, bonds: np.ndarray, aromatic: np.ndarray,
+                   hybridization: np.ndarray) -> np.ndarray:
+    """
+    Assign the AutoDock 4 atom types with the rules of Open Babel: "A" for aromatic
+    and "C" for other carbons, "N" for ammonium nitrogens (four bonds) and for
+    nitrogens with three bonds that are conjugated (aromatic, or bonded to an sp2 or
+    sp atom, as in amides and guanidinium), "NA" (acceptor) for all other nitrogens,
+    "OA" for oxygen, "S" for sulfur, "HD" for hydrogens on N, O or S and "H" for other
+    hydrogens. A metal ion coordinated by a nitrogen counts as one of its bonds.
+    Selenium is written as "S" (`AUTODOCK_FALLBACK_TYPES`) and metal ions without an
+    AutoDock type as `METAL_FALLBACK_TYPE`.
+
+    Args:
+        structure (Structure): The receptor.
+        bonds (np.ndarray): Bonds of shape (M, 2).
+        aromatic (np.ndarray): Boolean mask of the aromatic atoms.
+        hybridization (np.ndarray): Hybridization of every atom.
+
+    Returns:
+        np.ndarray: AutoDock type of every atom.
+
+    Raises:
+        ValueError: If an element is neither supported nor a metal with a fallback.
+    """
+    elements = structure.atoms["element"]
+    n = len(elements)
+    a, b = _directed(bonds)
+    degree = np.bincount(a, minlength=n)
+    is_hydrogen = np.isin(elements, ["H", "D"])
+    polar_partner = np.zeros(n, dtype=bool)
+    polar_partner[a[np.isin(elements[b], ["N", "O", "S"])]] = True
+
+    special = np.isin(elements, ["C", "N", "O", "S", "H", "D"])
+    types = np.full(n, "", dtype="U2")
+    for element in np.unique(elements[~special]).tolist():
+        types[elements == element] = _element_type(element)
+    types[elements == "C"] = np.where(aromatic[elements == "C"], "A", "C")
+    is_n = elements == "N"
+    unsaturated = aromatic | np.isin(hybridization, [SP, SP2])
+    conjugated = aromatic.copy()
+    conjugated[a[unsaturated[b]]] = True
+    degree = degree + metal_contacts(structure.coords, elements)
+    donor_n = ((degree >= 4) & ~conjugated) | ((degree == 3) & conjugated)
+    types[is_n] = np.where(donor_n[is_n], "N", "NA")
+    types[elements == "O"] = "OA"
+    types[elements == "S"] = "S"
+    types[is_hydrogen] = np.where(polar_partner[is_hydrogen], "HD", "H")
+    return types
+
+
+def _first_altloc(structure: Structure) -> Structure:
+    # Keep one conformer of atoms with alternate locations, the first label of every
+    # residue (residues may be labeled "B" and "C" only); Open Babel writes all of
+    # them, which gives a receptor with overlapping atoms
+    atoms = structure.atoms
+    altloc = atoms["altloc"]
+    alternate = np.flatnonzero(altloc != "")
+    if len(alternate) == 0:
+        return structure
+    residues = np.char.add(np.char.add(atoms["chain"], "|"), np.char.add(atoms["resi"].astype(str), atoms["icode"]))
+    labeled, first = np.unique(residues[alternate], return_index=True)
+    chosen = altloc[alternate[first]]
+    keep = np.ones(len(altloc), dtype=bool)
+    keep[alternate] = altloc[alternate] == chosen[np.searchsorted(labeled, residues[alternate])]
+    return structure[keep]
+
+
+def receptor_pdbqt_lines(structure: Structure, merge_nonpolar_hydrogens: bool = True) -> List[str]:
+    """
+    Convert a receptor to rigid PDBQT records.
+
+    Args:
+        structure (Structure): The protonated receptor.
+        merge_nonpolar_hydrogens (bool): Add the charges of hydrogens on carbon to their
+        carbon and leave those hydrogens out, like `obabel -xr`.
+
+    Returns:
+        List[str]: One ATOM/HETATM record per written atom, with partial charge and
+        AutoDock type in columns 71-79.
+    """
+    structure = _first_altloc(structure)
+    atoms = structure.atoms
+    elements = atoms["element"]
+    n = len(elements)
+    if n == 0:
+        return []
+    aromatic = np.zeros(n, dtype=bool)
+    for resn, names in AROMATIC_ATOMS.items():
+        aromatic |= (atoms["resn"] == resn) & np.isin(atoms["name"], list(names))
+
+    bonds = perceive_bonds(structure.coords, elements)
+    hybridization = assign_hybridization(structure.coords, elements, bonds, aromatic)
+    charges = gasteiger_charges(gasteiger_atom_types(elements, bonds, hybridization, aromatic),
+                                hybridization, bonds)
+    types = autodock_types(structure, bonds, aromatic, hybridization)
+
+    keep = np.ones(n, dtype=bool)
+    if merge_nonpolar_hydrogens:
+        nonpolar = types == "H"
+        a, b = _directed(bonds)
+        edges = nonpolar[a]
+        np.add.at(charges, b[edges], charges[a[edges]])
+        keep = ~nonpolar | ~np.isin(np.arange(n), a[edges])
+
+    lines = []
+    for i in np.flatnonzero(keep).tolist():
+        record = structure.lines[i] if structure.lines is not None else format_pdb_line(atoms, i)
+        lines.append(f"{record[:66]:<66}    {charges[i]:6.3f} {types[i]:<2}")
+    return lines
+
+
+def write_pdbqt(structure: Structure, output_file: str, merge_nonpolar_hydrogens: bool = True) -> str:
+    """
+    Write a receptor as a rigid PDBQT file.
+
+    Args:
+        structure (Structure): The protonated receptor.
+        output_file (str): Path to the output PDBQT file.
+        merge_nonpolar_hydrogens (bool): Merge the hydrogens on carbon into their carbon.
+
+    Returns:
+        str: Path to the output PDBQT file.
+    """
+    lines = receptor_pdbqt_lines(structure, merge_nonpolar_hydrogens)
+    with open(output_file, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+    return output_file
+
+
+def save_native_pdbqt(input_pdb_file: str, output_dir: Optional[str] = None,
+                      output_file: Optional[str] = None) -> str:
+    """
+    Convert a PDB file to a rigid-receptor PDBQT file without Open Babel, as a drop-in
+    for `protonation.save_pdb2pdbqt`. The atom types are the same, but the receptor
+    gets Gasteiger charges where `obabel -xr` writes zero charges.
+
+    Args:
+        input_pdb_file (str): Path to the input PDB file.
+        output_dir (Optional[str]): Directory to save the output file. Defaults to the
+        input file directory.
+        output_file (Optional[str]): Path to the output PDBQT file. Defaults to the
+        input file name with the ".pdbqt" extension in `output_dir`.
+
+    Returns:
+        str: Path to the output PDBQT file.
+    """
+    if output_file is None:
+        if output_dir is None:
+            output_dir = os.path.dirname(input_pdb_file)
+        base_name = os.path.splitext(os.path.basename(input_pdb_file))[0]
+        output_file = os.path.join(output_dir, f"{base_name}.pdbqt")
+    write_pdbqt(Structure.from_file(input_pdb_file), output_file)
+    print(f'Output PDBQT file saved at: {output_file}')
+    return output_file
+
+
+def read_pdbqt_charges(pdbqt_file: str) -> Dict[str, np.ndarray]:
+    """
+    Read the atom names, residue labels, partial charges and AutoDock types of a PDBQT
+    file, e.g. to compare two conversions.
+
+    Returns:
+        Dict[str, np.ndarray]: Arrays "key" (chain, residue number, residue and atom
+        name), "charge" and "type".
+    """
+    keys, charges, types = [], [], []
+    with open(pdbqt_file, "r") as f:
+        for line in f:
+            if line.startswith(("ATOM", "HETATM")):
+                keys.append(f"{line[21]}|{line[22:27].strip()}|{line[17:20].strip()}|{line[12:16].strip()}")
+                charges.append(float(line[70:76]))
+                types.append(line[77:79].strip())
+    return {"key": np.array(keys), "charge": np.array(charges), "type": np.array(types)}
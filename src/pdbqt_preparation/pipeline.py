@@ -0,0 +1,280 @@
+"""
+Streaming strip → fix → convert pipeline for PDBQT preparation.
+
+The stages run concurrently and are connected by bounded queues: a file moves on to
+`pdbfixer` as soon as it is stripped, and on to `save_pdb2pdbqt` as soon as it is
+fixed. When a later stage falls behind, its queue fills up and the earlier stage
+waits (back-pressure), so the number of intermediate files waiting on disk stays
+bounded by the queue sizes. Results are yielded as files complete, in completion
+order. If the caller stops iterating early, the stages finish the files they are
+working on and drop the rest.
+
+Completed stages are recorded in a build manifest (see `manifest`), so a re-run
+skips the stages whose inputs, tool versions and settings are unchanged and resumes
+every file at its first incomplete stage.
+"""
+
+import multiprocessing as mp
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from src.pdbqt_preparation.extract_protein import (_init_strip_worker, _strip_job,
+                                                   list_pdb_files, stripped_filename)
+from src.pdbqt_preparation.manifest import MANIFEST_NAME, BuildManifest, stage_key, tool_version
+from src.pdbqt_preparation.openmm_fixer import (DEFAULT_FORCEFIELD_FILES, _fix_job,
+                                                _init_fixer_worker, openmm_available)
+from src.pdbqt_preparation.pdbqt_writer import save_native_pdbqt
+from src.pdbqt_preparation.protonation import (OBABEL_FLAGS, PDBFIXER_FLAGS, get_subprocess_env,
+                                               pdbfixer, save_pdb2pdbqt)
+
+FIXER_BACKENDS = ("cli", "openmm")
+CONVERTER_BACKENDS = ("obabel", "native")
+_DONE = object()
+_POLL_INTERVAL = 0.1  # seconds between checks of the stop event while a queue blocks
+
+
+class PreparationResult(NamedTuple):
+    """
+    Outcome of one PDB file in the pipeline.
+    """
+    filename: str
+    pdbqt_file: Optional[str]
+    stage: Optional[str] = None  # stage that failed: "strip", "fix" or "convert"
+    error: Optional[str] = None
+    skipped: Tuple[str, ...] = ()  # stages that were up to date
+
+
+class _Item(NamedTuple):
+    filename: str
+    path: str
+    skipped: Tuple[str, ...] = ()
+
+
+def _get(in_queue: "queue.Queue", stop: threading.Event) -> object:
+    # Blocks like `get`, but returns the end marker once the pipeline is stopped
+    while not stop.is_set():
+        try:
+            return in_queue.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def _put(out_queue: "queue.Queue", item: object, stop: threading.Event) -> None:
+    # Blocks like `put` on a full queue, but gives up once the pipeline is stopped
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=_POLL_INTERVAL)
+            return
+        except queue.Full:
+            pass
+
+
+def _run_stage(name: str, work: Callable[[_Item], _Item], n_threads: int,
+               in_queue: "queue.Queue", out_queue: "queue.Queue",
+               results: "queue.Queue", n_next: int,
+               stop: threading.Event) -> List[threading.Thread]:
+    """
+    Starts `n_threads` threads that take items from `in_queue`, apply `work` and put
+    the outputs on `out_queue`. Failures are reported on `results`. Once all threads
+    have seen the end marker, `n_next` end markers are passed on. When `stop` is set,
+    the threads return after their current item.
+    """
+    remaining = [n_threads]
+    lock = threading.Lock()
+
+    def loop() -> None:
+        while True:
+            item = _get(in_queue, stop)
+            if item is _DONE:
+                break
+            try:
+                _put(out_queue, work(item), stop)
+            except Exception as e:  # reported per file, the stage goes on with the next one
+                results.put(PreparationResult(item.filename, None, name, str(e)))
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(n_next):
+                _put(out_queue, _DONE, stop)
+
+    threads = [threading.Thread(target=loop, name=f"{name}-{i}", daemon=True)
+               for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run_pipeline(input_path: str,
+                 output_directory: str,
+                 pH_value: float = 7.4,
+                 workers: int = 1,
+                 filenames: Optional[Sequence[str]] = None,
+                 queue_size: Optional[int] = None,
+                 use_pymol: bool = False,
+                 manifest_path: Optional[str] = None,
+                 force: bool = False,
+                 fixer: str = "cli",
+                 converter: str = "obabel") -> Iterator[PreparationResult]:
+    """
+    Strips, fixes and converts PDB files to PDBQT with the stages running
+    concurrently.
+
+    Args:
+        input_path (str): Directory containing the PDB files.
+        output_directory (str): Directory for the output files.
+        pH_value (float): The pH value for protonation.
+        workers (int): Number of files processed concurrently in every stage. Stripping
+        runs in a pool of `workers` processes, fixing and conversion run up to
+        `workers` subprocesses each.
+        filenames (Optional[Sequence[str]]): PDB files in `input_path` to process.
+        Defaults to all PDB files there except earlier `*_stripped.pdb` outputs.
+        queue_size (Optional[int]): Maximum number of files waiting between two stages.
+        Defaults to `workers`.
+        use_pymol (bool): Strip with PyMOL, one instance per worker process.
+        manifest_path (Optional[str]): Path of the build manifest. Defaults to
+        `.prep_manifest.jsonl` in the output directory.
+        force (bool): Run every stage, even if it is up to date.
+        fixer (str): "cli" runs the `pdbfixer` command per file; "openmm" fixes in
+        `workers` long-lived processes with the PDBFixer/OpenMM Python API (see
+        `openmm_fixer`).
+        converter (str): "obabel" runs `obabel -xr` per file; "native" writes the PDBQT
+        file in process (see `pdbqt_writer`). Both give the same atom types, but obabel
+        writes zero partial charges and native writes Gasteiger charges.
+
+    Yields:
+        PreparationResult: The outcome of every file as soon as it is complete.
+
+    Raises:
+        ValueError: If the fixer or converter backend is unknown.
+        ImportError: If the "openmm" backend is chosen without pdbfixer and openmm.
+    """
+    if fixer not in FIXER_BACKENDS:
+        raise ValueError(f"Unknown fixer backend '{fixer}', expected one of {FIXER_BACKENDS}.")
+    if converter not in CONVERTER_BACKENDS:
+        raise ValueError(f"Unknown converter backend '{converter}', expected one of {CONVERTER_BACKENDS}.")
+    if fixer == "openmm" and not openmm_available():
+        raise ImportError("The openmm fixer backend needs the pdbfixer and openmm packages.")
+    filenames = list(filenames) if filenames is not None else list_pdb_files(input_path)
+    if not filenames:
+        return
+    workers = max(1, workers)
+    queue_size = queue_size if queue_size is not None else workers
+    threads_per_job = max(1, (os.cpu_count() or 1) // workers)
+    env = get_subprocess_env(threads_per_job)
+    os.makedirs(output_directory, exist_ok=True)
+
+    files: "queue.Queue" = queue.Queue()
+    stripped: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    fixed: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    converted: "queue.Queue" = queue.Queue()
+    results: "queue.Queue" = queue.Queue()
+    for filename in filenames:
+        files.put(_Item(filename, os.path.join(input_path, filename)))
+    for _ in range(workers):
+        files.put(_DONE)
+
+    stop = threading.Event()
+    manifest = BuildManifest(manifest_path or os.path.join(output_directory, MANIFEST_NAME))
+
+    def incremental(stage: str, tool: str, run: Callable[[_Item], List[str]],
+                    **params) -> Callable[[_Item], _Item]:
+        # Skip the stage if the manifest has its outputs for the same inputs
+        def work(item: _Item) -> _Item:
+            key = stage_key(item.path, tool, **params)
+            output = None if force else manifest.lookup(item.filename, stage, key)
+            if output is not None:
+                return _Item(item.filename, output, item.skipped + (stage,))
+            outputs = run(item)
+            manifest.record(item.filename, stage, key, outputs)
+            return _Item(item.filename, outputs[0], item.skipped)
+        return work
+
+    strip_pool = ProcessPoolExecutor(max_workers=min(workers, len(filenames)),
+                                     mp_context=mp.get_context("spawn"),
+                                     initializer=_init_strip_worker, initargs=(use_pymol,))
+    fix_pool = None
+    if fixer == "openmm":
+        fix_pool = ProcessPoolExecutor(max_workers=min(workers, len(filenames)),
+                                       mp_context=mp.get_context("spawn"),
+                                       initializer=_init_fixer_worker,
+                                       initargs=(DEFAULT_FORCEFIELD_FILES, threads_per_job))
+
+    def strip(item: _Item) -> List[str]:
+        # One strip thread waits per worker process, so at most `workers` files are
+        # stripped ahead of the `stripped` queue
+        output_path, error = strip_pool.submit(_strip_job, (input_path, item.filename,
+                                                            output_directory, use_pymol)).result()
+        if error is not None:
+            raise RuntimeError(error)
+        base_name = os.path.splitext(item.filename)[0]
+        return [output_path, os.path.join(output_directory, f"config_{base_name}.txt")]  # type: ignore
+
+    def fix(item: _Item) -> List[str]:
+        base_name = os.path.splitext(item.filename)[0]
+        output_file = os.path.join(output_directory, f"{base_name}_fixed.pdb")
+        if fix_pool is None:
+            return [pdbfixer(item.path, output_directory, pH_value, env, output_file=output_file)]
+        # The worker keeps its fixer and force field loaded and fixes the text in memory
+        with open(item.path, "r") as f:
+            fixed_text = fix_pool.submit(_fix_job, (f.read(), pH_value)).result()
+        with open(output_file, "w") as f:
+            f.write(fixed_text)
+        print(f'Your PDB file is protonated at {pH_value} and fixed: {output_file}')
+        return [output_file]
+
+    def convert(item: _Item) -> List[str]:
+        pdbqt_file = os.path.join(output_directory,
+                                  os.path.splitext(stripped_filename(item.filename))[0] + ".pdbqt")
+        if converter == "native":
+            return [save_native_pdbqt(item.path, output_file=pdbqt_file)]
+        return [save_pdb2pdbqt(item.path, output_directory, env, output_file=pdbqt_file)]
+
+    if fixer == "openmm":
+        # The in-process fixer has no command line flags; it is versioned by its source,
+        # the OpenMM and PDBFixer packages and the force field it protonates with
+        fix_tool = "openmm_fixer"
+        fix_params = {"openmm": tool_version("openmm"), "pdbfixer": tool_version("pdbfixer"),
+                      "forcefield": DEFAULT_FORCEFIELD_FILES}
+    else:
+        fix_tool = "pdbfixer"
+        fix_params = {"flags": PDBFIXER_FLAGS, "backend": fixer}
+
+    threads = (_run_stage("strip", incremental("strip", "pymol" if use_pymol else "structure_io",
+                                               strip), workers, files, stripped, results, workers, stop)
+               + _run_stage("fix", incremental("fix", fix_tool, fix, pH=pH_value, **fix_params),
+                            workers, stripped, fixed, results, workers, stop)
+               + _run_stage("convert", incremental("convert", converter, convert,
+                                                   flags=OBABEL_FLAGS if converter == "obabel" else ()),
+                            workers, fixed, converted, results, 1, stop))
+
+    def collect() -> None:
+        while True:
+            item = _get(converted, stop)
+            if item is _DONE:
+                break
+            results.put(PreparationResult(item.filename, item.path, skipped=item.skipped))
+        results.put(_DONE)
+
+    threads.append(threading.Thread(target=collect, name="collect", daemon=True))
+    threads[-1].start()
+    try:
+        while True:
+            result = results.get()
+            if result is _DONE:
+                break
+            yield result
+    finally:
+        # Also reached when the caller stops iterating early: the threads finish their
+        # current file instead of working through the rest
+        stop.set()
+        for thread in threads:
+            thread.join()
+        strip_pool.shutdown(cancel_futures=True)
+        if fix_pool is not None:
+            fix_pool.shutdown(cancel_futures=True)
+        manifest.close()
@@ -5,7 +5,32 @@ https://github.com/joramkuntze/ISOKANNtool/tree/main
 
 import os
 import subprocess
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+# Thread pools of OpenMM (used by pdbfixer) and the BLAS libraries
+SUBPROCESS_THREAD_ENV_VARS = ("OPENMM_CPU_THREADS", "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                              "MKL_NUM_THREADS")
+# Command line flags of the fixer and the PDBQT conversion (rigid receptor)
+PDBFIXER_FLAGS = ("--add-atoms=all", "--add-residues")
+OBABEL_FLAGS = ("-xr",)
+
+
+def get_subprocess_env(n_threads: int) -> Dict[str, str]:
+    """
+    Get a copy of the environment that caps the thread pools of the fixer and
+    conversion tools to `n_threads`, so that concurrent subprocesses do not
+    oversubscribe the machine.
+
+    Args:
+        n_threads (int): Number of threads per subprocess.
+
+    Returns:
+        Dict[str, str]: The environment for `subprocess.run`.
+    """
+    env = os.environ.copy()
+    env.update({k: str(n_threads) for k in SUBPROCESS_THREAD_ENV_VARS})
+    return env
 
 
 def protonation(input_file: str, output_dir: str, pH_value: float = 7.4) -> str:
@@ -32,24 +57,25 @@ def protonation(input_file: str, output_dir: str, pH_value: float = 7.4) -> str:
     return output_pdb_file
 
 
-def pdbfixer(input_pdb_file: str, output_dir: str, pH_value: float = 7.4) -> str:
+def pdbfixer(input_pdb_file: str, output_dir: str, pH_value: float = 7.4,
+             env: Optional[Dict[str, str]] = None, output_file: Optional[str] = None) -> str:
     # pdbfixer --pdbid=6o0k --add-residues --ph=7.4 --output=pdbfixer_74.pdb
     print(f"Starting fixing your file: {input_pdb_file}")
     base_name = os.path.splitext(os.path.basename(input_pdb_file))[0]
     print(base_name)
-    output_pdb_file = os.path.join(output_dir, f"{base_name}.pdb")
+    output_pdb_file = output_file or os.path.join(output_dir, f"{base_name}.pdb")
     subprocess.run(["pdbfixer",
                     input_pdb_file,
-                    "--add-atoms=all",
-                    "--add-residues",
+                    *PDBFIXER_FLAGS,
                     f"--ph={pH_value}",
                     "--verbose",
-                    f"--output={output_pdb_file}"])
+                    f"--output={output_pdb_file}"], check=True, env=env)
     print(f'Your PDB file is protonated at {pH_value} and fixed: {output_pdb_file}')
     return output_pdb_file
 
 
-def save_pdb2pdbqt(input_pdb_file: str, output_dir: Optional[str] = None) -> str:
+def save_pdb2pdbqt(input_pdb_file: str, output_dir: Optional[str] = None,
+                   env: Optional[Dict[str, str]] = None, output_file: Optional[str] = None) -> str:
     """
     Convert the PDB file to PDBQT format using Open Babel.
 
@@ -57,6 +83,9 @@ def save_pdb2pdbqt(input_pdb_file: str, output_dir: Optional[str] = None) -> str
         input_pDB_file (str): Path to the input PQR file.
         output_dir (Optional[str]): Directory to save the output files. Defaults to the
         input file directory.
+        env (Optional[Dict[str, str]]): Environment of the obabel subprocess.
+        output_file (Optional[str]): Path to the output PDBQT file. Defaults to the
+        input file name with the ".pdbqt" extension in `output_dir`.
 
     Returns:
         str: Path to the output PDBQT file.
@@ -65,12 +94,12 @@ def save_pdb2pdbqt(input_pdb_file: str, output_dir: Optional[str] = None) -> str
         output_dir = os.path.dirname(input_pdb_file)
 
     base_name = os.path.splitext(os.path.basename(input_pdb_file))[0]
-    output_pdbqt_file = os.path.join(output_dir, f"{base_name}.pdbqt")
+    output_pdbqt_file = output_file or os.path.join(output_dir, f"{base_name}.pdbqt")
 
     # Convert PDB to PDBQT using Open Babel
     subprocess.run([
-        'obabel', input_pdb_file, '-xr', '-O', output_pdbqt_file
-    ], check=True)
+        'obabel', input_pdb_file, *OBABEL_FLAGS, '-O', output_pdbqt_file
+    ], check=True, env=env)
     print(f'Output PDBQT file saved at: {output_pdbqt_file}')
     return output_pdbqt_file
 
@@ -79,7 +108,8 @@ def save_pdb2pdbqt(input_pdb_file: str, output_dir: Optional[str] = None) -> str
 
 def protonate_and_convert(input_file: str,
                           output_dir: str,
-                          pH_value: float = 7.4) -> str:
+                          pH_value: float = 7.4,
+                          env: Optional[Dict[str, str]] = None) -> str:
     """
     Perform protonation on the input PDB file and convert the output to PDBQT format.
 
@@ -87,17 +117,58 @@ def protonate_and_convert(input_file: str,
         input_file (str): Path to the input PDB file.
         pH_value (float): The pH value for protonation.
         output_dir (str): Directory to save the output files.
+        env (Optional[Dict[str, str]]): Environment of the subprocesses.
 
     Returns:
         str: Path to the output PDBQT file.
     """
     # Perform protonation
-    output_pdb_file = pdbfixer(input_file, output_dir, pH_value)
+    output_pdb_file = pdbfixer(input_file, output_dir, pH_value, env)
     # Convert PQR to PDBQT
-    output_pdbqt_file = save_pdb2pdbqt(output_pdb_file, output_dir)
+    output_pdbqt_file = save_pdb2pdbqt(output_pdb_file, output_dir, env)
     return output_pdbqt_file
 
 
+def protonate_and_convert_all(input_files: Iterable[str],
+                              output_dir: str,
+                              pH_value: float = 7.4,
+                              workers: int = 1,
+                              threads_per_job: Optional[int] = None) -> Dict[str, Optional[str]]:
+    """
+    Protonate and convert many PDB files, running up to `workers` fixer and
+    conversion subprocess chains at the same time.
+
+    Args:
+        input_files (Iterable[str]): Paths to the input PDB files.
+        output_dir (str): Directory to save the output files.
+        pH_value (float): The pH value for protonation.
+        workers (int): Maximum number of files processed concurrently.
+        threads_per_job (Optional[int]): Threads per subprocess. Defaults to the number
+        of CPU cores divided by `workers`.
+
+    Returns:
+        Dict[str, Optional[str]]: Path to the output PDBQT file per input file, or None
+        if it failed, in the order of `input_files`.
+    """
+    input_files = list(input_files)
+    workers = max(1, workers)
+    if threads_per_job is None:
+        threads_per_job = max(1, (os.cpu_count() or 1) // workers)
+    env = get_subprocess_env(threads_per_job)
+
+    def run(input_file: str) -> Optional[str]:
+        try:
+            return protonate_and_convert(input_file, output_dir, pH_value, env)
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"Error protonating {input_file}: {e}")
+            return None
+
+    # The work happens in the subprocesses, so threads are enough to run them concurrently
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, input_files))
+    return dict(zip(input_files, results))
+
+
 if __name__ == '__main__':
     print('Protonation and conversion is starting!')
     input_file = '/Users/nicha/dev/Protein-preparation-pipeline/data/raw/test_pdbqt_prep/6o0k_stripped.pdb'
@@ -0,0 +1,311 @@
+"""
+Columnar PDB and mmCIF parser.
+
+A structure file is read once into struct-of-arrays NumPy columns (record,
+serial, name, altloc, resn, chain, resi, icode, coords, occupancy, bfactor,
+element). For PDB files the ATOM/HETATM records are collected with one regular
+expression over the whole file and every column is cut out of a fixed-width byte
+matrix and converted in bulk, so no per-line Python runs. mmCIF `_atom_site`
+loops are tokenized in one `split()` where possible.
+
+Only the first model of a multi-model file is read. Files ending with `.gz` are
+decompressed on the fly. Atom serials and residue numbers beyond the fixed-width
+columns are read in the hybrid-36 encoding of large PDB files; serials that cannot
+be read (e.g. `*****`) are set to 0, since no caller relies on them.
+"""
+
+import gzip
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ATOM_DTYPES = {
+    "record": "U6", "serial": np.int64, "name": "U4", "altloc": "U1",
+    "resn": "U4", "chain": "U4", "resi": np.int64, "icode": "U1",
+    "occupancy": np.float64, "bfactor": np.float64, "element": "U2",
+}
+
+# (start, stop) of the PDB fixed columns
+PDB_COLUMNS = {
+    "record": (0, 6), "serial": (6, 11), "name": (12, 16), "altloc": (16, 17),
+    "resn": (17, 20), "chain": (21, 22), "resi": (22, 26), "icode": (26, 27),
+    "x": (30, 38), "y": (38, 46), "z": (46, 54), "occupancy": (54, 60),
+    "bfactor": (60, 66), "element": (76, 78),
+}
+PDB_LINE_WIDTH = 80
+NUMERIC_DEFAULTS = {"serial": b"0", "occupancy": b"1.0", "bfactor": b"0.0"}
+
+MMCIF_COLUMNS = {
+    "record": "group_PDB", "serial": "id", "name": "auth_atom_id", "altloc": "label_alt_id",
+    "resn": "auth_comp_id", "chain": "auth_asym_id", "resi": "auth_seq_id",
+    "icode": "pdbx_PDB_ins_code", "x": "Cartn_x", "y": "Cartn_y", "z": "Cartn_z",
+    "occupancy": "occupancy", "bfactor": "B_iso_or_equiv", "element": "type_symbol",
+}
+MMCIF_FALLBACK_COLUMNS = {"name": "label_atom_id", "resn": "label_comp_id",
+                          "chain": "label_asym_id", "resi": "label_seq_id"}
+
+_ATOM_RECORD_RE = re.compile(rb"^(?:ATOM  |HETATM).*$", re.MULTILINE)
+_ENDMDL_RE = re.compile(rb"^ENDMDL", re.MULTILINE)
+_CIF_TOKEN_RE = re.compile(r"'(?:[^']|'(?=\S))*'|\"[^\"]*\"|\S+")
+_TWO_LETTER_ELEMENTS = frozenset([
+    "HE", "LI", "BE", "NA", "MG", "AL", "SI", "CL", "CA", "MN", "FE", "CO", "NI",
+    "CU", "ZN", "GA", "AS", "SE", "BR", "RB", "SR", "MO", "RU", "RH", "PD", "AG",
+    "CD", "SN", "CS", "BA", "GD", "YB", "OS", "IR", "PT", "AU", "HG", "PB",
+])
+
+
+def read_bytes(filename: str) -> bytes:
+    """
+    Read a (possibly gzip compressed) file.
+    """
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rb") as file:
+        return file.read()
+
+
+def guess_element(atom_name: str) -> str:
+    """
+    Guess the element of an atom without an element column from its name.
+
+    Args:
+        atom_name (str): Atom name, e.g. "CA" or "1HB".
+
+    Returns:
+        str: Upper case element symbol.
+    """
+    letters = "".join(c for c in atom_name if c.isalpha()).upper()
+    if not letters:
+        return ""
+    # Two letter elements are only used for atom names that fill the first column
+    if len(letters) > 1 and letters[:2] in _TWO_LETTER_ELEMENTS and len(atom_name) == 4 \
+            and not atom_name[0].isdigit():
+        return letters[:2]
+    return letters[0]
+
+
+def _fill_elements(atoms: Dict[str, np.ndarray]) -> None:
+    missing = np.flatnonzero(atoms["element"] == "")
+    for i in missing:
+        atoms["element"][i] = guess_element(atoms["name"][i])
+
+
+def _to_numbers(column: np.ndarray, dtype, default: bytes = b"0") -> np.ndarray:
+    column = np.char.strip(column)
+    column[column == b""] = default
+    return column.astype(dtype)
+
+
+def hybrid36_decode(value: str, width: int) -> int:
+    """
+    Decode a hybrid-36 number, as used for atom serials above 99999 and residue
+    numbers above 9999 in PDB files.
+
+    Args:
+        value (str): The right-aligned field, e.g. "A0000" (= 100000 for width 5).
+        width (int): Width of the field.
+
+    Returns:
+        int: The decoded number.
+
+    Raises:
+        ValueError: If `value` is neither a decimal nor a hybrid-36 number.
+    """
+    value = value.strip()
+    if not value or value[0] in "-0123456789":
+        return int(value or "0")
+    if len(value) != width or not value.isalnum() or not (value.isupper() or value.islower()):
+        raise ValueError(f"Invalid hybrid-36 number '{value}'")
+    offset = 10 * 36 ** (width - 1) - 10 ** width
+    if value[0].islower():
+        offset -= 26 * 36 ** (width - 1)
+    return int(value, 36) - offset
+
+
+def _to_integers(column: np.ndarray, width: int, default: bytes = b"0",
+                 lenient: bool = False) -> np.ndarray:
+    try:
+        return _to_numbers(column, np.int64, default)
+    except ValueError:
+        pass
+    # Rare: hybrid-36 or overflow markers, decoded once per distinct value
+    values, inverse = np.unique(np.char.strip(column), return_inverse=True)
+    decoded = np.zeros(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        try:
+            decoded[i] = hybrid36_decode(value.decode("latin-1"), width)
+        except ValueError:
+            if not lenient:
+                raise
+    return decoded[inverse.ravel()]
+
+
+def parse_pdb_bytes(data: bytes) -> Tuple[Dict[str, np.ndarray], List[str]]:
+    """
+    Parse the ATOM and HETATM records of the first model of PDB file contents.
+
+    Args:
+        data (bytes): Contents of a PDB file.
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], List[str]]: The atom columns (see `ATOM_DTYPES`,
+        plus "coords" of shape (N, 3)) and the original record line of every atom.
+    """
+    endmdl = _ENDMDL_RE.search(data)
+    if endmdl is not None:
+        data = data[:endmdl.start()]
+    records = [line.rstrip(b"\r") for line in _ATOM_RECORD_RE.findall(data)]
+
+    # One fixed-width byte matrix of all records; the columns are slices of it
+    table = np.array(records, dtype=f"S{PDB_LINE_WIDTH}")
+    table = table.view("S1").reshape(len(records), PDB_LINE_WIDTH)
+
+    def column(key: str) -> np.ndarray:
+        start, stop = PDB_COLUMNS[key]
+        return np.ascontiguousarray(table[:, start:stop]).view(f"S{stop - start}").ravel()
+
+    atoms: Dict[str, np.ndarray] = {}
+    for key, dtype in ATOM_DTYPES.items():
+        if dtype == np.int64:
+            start, stop = PDB_COLUMNS[key]
+            atoms[key] = _to_integers(column(key), stop - start, NUMERIC_DEFAULTS.get(key, b"0"),
+                                      lenient=key == "serial")
+        elif dtype == np.float64:
+            atoms[key] = _to_numbers(column(key), dtype, NUMERIC_DEFAULTS.get(key, b"0"))
+        else:
+            atoms[key] = np.char.strip(column(key)).astype(dtype)
+    atoms["element"] = np.char.upper(atoms["element"])
+    atoms["coords"] = np.stack([_to_numbers(column(k), np.float64) for k in "xyz"], axis=-1)
+    atoms["coords"] = atoms["coords"].reshape(-1, 3)
+    _fill_elements(atoms)
+    return atoms, [line.decode("latin-1") for line in records]
+
+
+def _read_atom_site_loop(text: str) -> Tuple[List[str], List[str]]:
+    """
+    Get the column names and the flat list of value tokens of the `_atom_site` loop.
+    """
+    lines = text.splitlines()
+    for start, line in enumerate(lines):
+        if line.startswith("_atom_site."):
+            break
+    else:
+        raise ValueError("No _atom_site loop found in the mmCIF file")
+
+    names = []
+    i = start
+    while i < len(lines) and lines[i].startswith("_atom_site."):
+        names.append(lines[i].split()[0][len("_atom_site."):])
+        i += 1
+    stop = i
+    while stop < len(lines) and not lines[stop].startswith(("#", "loop_", "_", "data_")):
+        stop += 1
+
+    body = "\n".join(lines[i:stop])
+    if "'" in body or '"' in body:
+        tokens = [t[1:-1] if t[0] in "'\"" else t for t in _CIF_TOKEN_RE.findall(body)]
+    else:
+        tokens = body.split()
+    return names, tokens
+
+
+def parse_mmcif_text(text: str) -> Tuple[Dict[str, np.ndarray], None]:
+    """
+    Parse the `_atom_site` loop of the first model of mmCIF file contents.
+
+    Args:
+        text (str): Contents of an mmCIF file.
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], None]: The atom columns (see `parse_pdb_bytes`).
+        mmCIF files have no PDB record lines, so None is returned for them.
+    """
+    names, tokens = _read_atom_site_loop(text)
+    if len(tokens) % len(names):
+        raise ValueError("Malformed _atom_site loop in the mmCIF file")
+    table = np.array(tokens, dtype=str).reshape(-1, len(names))
+    index = {name: i for i, name in enumerate(names)}
+
+    if "pdbx_PDB_model_num" in index:
+        models = table[:, index["pdbx_PDB_model_num"]]
+        table = table[models == models[0]] if len(models) else table
+
+    def column(key: str) -> Optional[np.ndarray]:
+        for name in (MMCIF_COLUMNS[key], MMCIF_FALLBACK_COLUMNS.get(key)):
+            if name in index:
+                values = table[:, index[name]]
+                return np.where(np.isin(values, [".", "?"]), "", values)
+        return None
+
+    atoms: Dict[str, np.ndarray] = {}
+    for key, dtype in ATOM_DTYPES.items():
+        values = column(key)
+        if values is None:
+            values = np.full(len(table), "", dtype=str)
+        if dtype in (np.int64, np.float64):
+            default = NUMERIC_DEFAULTS.get(key, b"0").decode()
+            atoms[key] = np.where(values == "", default, values).astype(dtype)
+        else:
+            atoms[key] = values.astype(dtype)
+    atoms["element"] = np.char.upper(atoms["element"])
+    atoms["coords"] = np.stack([column(k).astype(np.float64) for k in "xyz"], axis=-1).reshape(-1, 3)
+    _fill_elements(atoms)
+    return atoms, None
+
+
+def is_mmcif(filename: str) -> bool:
+    """
+    Whether a structure file is in mmCIF format, judged by its extension.
+    """
+    name = filename[:-3] if filename.endswith(".gz") else filename
+    return name.lower().endswith((".cif", ".mmcif"))
+
+
+def read_structure(filename: str) -> Tuple[Dict[str, np.ndarray], Optional[List[str]]]:
+    """
+    Read the first model of a PDB or mmCIF file into atom columns.
+
+    Args:
+        filename (str): Path to a `.pdb`, `.ent`, `.cif` or `.mmcif` file, optionally gzipped.
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Optional[List[str]]]: The atom columns and, for PDB
+        files, the original record line of every atom.
+    """
+    return parse_structure_bytes(read_bytes(filename), "cif" if is_mmcif(filename) else "pdb")
+
+
+def parse_structure_bytes(data: bytes,
+                          fmt: str = "pdb") -> Tuple[Dict[str, np.ndarray], Optional[List[str]]]:
+    """
+    Read the first model of uncompressed PDB or mmCIF contents, e.g. a download kept
+    in memory.
+
+    Args:
+        data (bytes): The file contents.
+        fmt (str): "pdb" or "cif".
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Optional[List[str]]]: The atom columns and, for PDB
+        contents, the original record line of every atom.
+    """
+    if fmt in ("cif", "mmcif"):
+        return parse_mmcif_text(data.decode("utf-8", errors="replace"))
+    if fmt != "pdb":
+        raise ValueError(f"Unknown structure format '{fmt}', expected 'pdb' or 'cif'.")
+    return parse_pdb_bytes(data)
+
+
+def format_pdb_line(atoms: Dict[str, np.ndarray], i: int) -> str:
+    """
+    Format atom `i` of the atom columns as a PDB ATOM/HETATM record.
+    """
+    name = atoms["name"][i]
+    element = atoms["element"][i]
+    # Atom names start in column 14 unless they have four characters or a two letter element
+    name = name if len(name) == 4 or len(element) == 2 else f" {name}"
+    x, y, z = atoms["coords"][i]
+    return (f"{atoms['record'][i] or 'ATOM':<6}{atoms['serial'][i] % 100000:>5d} {name:<4}"
+            f"{atoms['altloc'][i]:1}{atoms['resn'][i]:>3} {atoms['chain'][i][:1]:1}"
+            f"{atoms['resi'][i]:>4d}{atoms['icode'][i]:1}   {x:8.3f}{y:8.3f}{z:8.3f}"
+            f"{atoms['occupancy'][i]:6.2f}{atoms['bfactor'][i]:6.2f}          {element:>2}")
@@ -0,0 +1,338 @@
+"""
+A headless, NumPy-backed model of a macromolecular structure.
+
+It covers what the pipeline used PyMOL for: loading a PDB file, selecting atoms
+with a small subset of the PyMOL selection language, and computing centers of
+mass and coordinate arrays. No PyMOL process or global `cmd` state is involved,
+so structures can be processed in parallel within one Python process.
+
+Supported selection syntax:
+
+- properties: `chain A`, `resi 112`, `resi 10-20`, `resi 112+137`, `resn ALA+GLY`,
+  `name CA`, `elem C`
+- flags: `all`, `none`, `polymer.protein`, `polymer`, `hetatm`, `organic`,
+  `solvent`, `hydrogens`
+- operators: `not`/`!`, `and`/`&`, `or`/`|`/`+` and parentheses
+
+Like PyMOL, only the first model of a multi-model file is loaded and the center of
+mass weights every atom by its mass and occupancy. Files are read with the columnar
+parser of `structure_io.parser`.
+"""
+
+import re
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from src.structure_io.parser import format_pdb_line, parse_structure_bytes, read_structure
+
+# Standard atomic weights of the elements found in PDB entries
+ATOMIC_MASSES = {
+    "H": 1.008, "D": 2.014, "HE": 4.003, "LI": 6.94, "BE": 9.012, "B": 10.81,
+    "C": 12.011, "N": 14.007, "O": 15.999, "F": 18.998, "NA": 22.990,
+    "MG": 24.305, "AL": 26.982, "SI": 28.085, "P": 30.974, "S": 32.06,
+    "CL": 35.45, "K": 39.098, "CA": 40.078, "V": 50.942, "CR": 51.996,
+    "MN": 54.938, "FE": 55.845, "CO": 58.933, "NI": 58.693, "CU": 63.546,
+    "ZN": 65.38, "GA": 69.723, "AS": 74.922, "SE": 78.971, "BR": 79.904,
+    "RB": 85.468, "SR": 87.62, "MO": 95.95, "RU": 101.07, "RH": 102.91,
+    "PD": 106.42, "AG": 107.87, "CD": 112.41, "SN": 118.71, "I": 126.90,
+    "CS": 132.91, "BA": 137.33, "GD": 157.25, "YB": 173.05, "W": 183.84,
+    "OS": 190.23, "IR": 192.22, "PT": 195.08, "AU": 196.97, "HG": 200.59,
+    "PB": 207.2, "U": 238.03,
+}
+DEFAULT_MASS = ATOMIC_MASSES["C"]
+
+AMINO_ACIDS = frozenset([
+    "ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE",
+    "LEU", "LYS", "MET", "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL",
+    "SEC", "PYL", "MSE", "ASX", "GLX", "UNK", "HID", "HIE", "HIP", "HSD",
+    "HSE", "HSP", "CYX", "CYM", "ASH", "GLH", "LYN", "ACE", "NME", "NH2",
+])
+NUCLEOTIDES = frozenset(["A", "C", "G", "U", "I", "T", "DA", "DC", "DG", "DT", "DI", "DU"])
+SOLVENT = frozenset(["HOH", "WAT", "H2O", "DOD", "TIP", "TIP3", "SOL"])
+
+
+class Structure:
+    """
+    Atoms of a structure as NumPy arrays, one array per column.
+    """
+
+    def __init__(self, atoms: dict, lines: Optional[Sequence[str]] = None) -> None:
+        """
+        Initializes the structure.
+
+        Args:
+            atoms (dict): Atom columns, see `parser.ATOM_DTYPES`, plus "coords" of shape (N, 3).
+            lines (Optional[Sequence[str]]): Original PDB record of every atom, used to
+            write the structure back out unchanged.
+        """
+        self.atoms = atoms
+        self.lines = list(lines) if lines is not None else None
+
+    @classmethod
+    def from_file(cls, filename: str) -> "Structure":
+        """
+        Load the first model of a PDB or mmCIF file.
+        """
+        atoms, lines = read_structure(filename)
+        return cls(atoms, lines)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, fmt: str = "pdb") -> "Structure":
+        """
+        Load the first model of uncompressed PDB ("pdb") or mmCIF ("cif") contents.
+        """
+        atoms, lines = parse_structure_bytes(data, fmt)
+        return cls(atoms, lines)
+
+    @classmethod
+    def from_pdb(cls, pdb_filename: str) -> "Structure":
+        """
+        Load the first model of a PDB file.
+        """
+        return cls.from_file(pdb_filename)
+
+    def __len__(self) -> int:
+        return len(self.atoms["coords"])
+
+    def __getitem__(self, index) -> "Structure":
+        """
+        Subset of the atoms by a boolean mask or index array.
+        """
+        index = np.asarray(index)
+        lines = None
+        if self.lines is not None:
+            lines = [self.lines[i] for i in np.arange(len(self))[index]]
+        return Structure({k: v[index] for k, v in self.atoms.items()}, lines)
+
+    @property
+    def coords(self) -> np.ndarray:
+        """
+        Atom coordinates of shape (N, 3).
+        """
+        return self.atoms["coords"]
+
+    def get_coords(self, selection: str = "all") -> np.ndarray:
+        """
+        Coordinates of the selected atoms, like `pymol.cmd.get_coords`.
+        """
+        return self.coords[self.mask(selection)]
+
+    @property
+    def masses(self) -> np.ndarray:
+        """
+        Atomic mass of every atom.
+        """
+        return np.array([ATOMIC_MASSES.get(e, DEFAULT_MASS) for e in self.atoms["element"]],
+                        dtype=np.float64)
+
+    def centerofmass(self, selection: str = "all") -> List[float]:
+        """
+        Center of mass of the selected atoms, like `pymol.cmd.centerofmass`.
+
+        Args:
+            selection (str): Selection expression.
+
+        Returns:
+            List[float]: Center of mass coordinates (x, y, z).
+        """
+        mask = self.mask(selection)
+        if not mask.any():
+            raise ValueError(f"Selection '{selection}' does not contain any atoms")
+        weights = self.masses[mask] * self.atoms["occupancy"][mask]
+        if weights.sum() <= 0:
+            weights = self.masses[mask]
+        return [float(x) for x in np.average(self.coords[mask], axis=0, weights=weights)]
+
+    def select(self, selection: str) -> "Structure":
+        """
+        Structure with the selected atoms only.
+        """
+        return self[self.mask(selection)]
+
+    def remove(self, selection: str) -> "Structure":
+        """
+        Structure without the selected atoms, like `pymol.cmd.remove`.
+        """
+        return self[~self.mask(selection)]
+
+    def mask(self, selection: str) -> np.ndarray:
+        """
+        Boolean mask of the atoms matching a selection expression.
+        """
+        return _SelectionParser(self, selection).parse()
+
+    def get_chains(self) -> List[str]:
+        """
+        Sorted list of the unique chain IDs.
+        """
+        return sorted(set(self.atoms["chain"].tolist()))
+
+    def get_residues(self, selection: str = "all") -> List[tuple]:
+        """
+        Unique (resn, chain, resi + icode) of the selected atoms, in file order.
+        """
+        selected = self.select(selection).atoms
+        labels = np.char.add(selected["resi"].astype(str), selected["icode"])
+        residues = dict.fromkeys(zip(selected["resn"].tolist(), selected["chain"].tolist(),
+                                     labels.tolist()))
+        return list(residues)
+
+    def save(self, pdb_filename: str) -> None:
+        """
+        Write the atoms to a PDB file, using their original records where available.
+        """
+        lines = self.lines
+        if lines is None:
+            lines = [format_pdb_line(self.atoms, i) for i in range(len(self))]
+        with open(pdb_filename, "w") as pdb_file:
+            for line in lines:
+                pdb_file.write(line + "\n")
+            pdb_file.write("END\n")
+
+
+_TOKEN_RE = re.compile(r"\s*(\(|\)|!|&|\||\+|[^\s()!&|+]+)")
+_PROPERTIES = {"chain", "resi", "resn", "name", "elem"}
+_OPERATORS = {"and", "&", "or", "|", "+", "not", "!", "(", ")"}
+
+
+class _SelectionParser:
+    """
+    Recursive descent parser of the supported PyMOL selection language.
+
+    Operator precedence (high to low): not, and, or.
+    """
+
+    def __init__(self, structure: Structure, selection: str) -> None:
+        self.structure = structure
+        self.selection = selection
+        self.tokens = _TOKEN_RE.findall(selection.strip())
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Optional[str]:
+        pos = self.pos + offset
+        return self.tokens[pos] if pos < len(self.tokens) else None
+
+    def next(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise ValueError(f"Unexpected end of selection '{self.selection}'")
+        self.pos += 1
+        return token
+
+    def parse(self) -> np.ndarray:
+        if not self.tokens:
+            return np.ones(len(self.structure), dtype=bool)
+        mask = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected '{self.peek()}' in selection '{self.selection}'")
+        return mask
+
+    def parse_or(self) -> np.ndarray:
+        mask = self.parse_and()
+        while self.peek() is not None and self.peek().lower() in ("or", "|", "+"):
+            self.next()
+            mask = mask | self.parse_and()
+        return mask
+
+    def parse_and(self) -> np.ndarray:
+        mask = self.parse_not()
+        while self.peek() is not None and self.peek().lower() in ("and", "&"):
+            self.next()
+            mask = mask & self.parse_not()
+        return mask
+
+    def parse_not(self) -> np.ndarray:
+        if self.peek() is not None and self.peek().lower() in ("not", "!"):
+            self.next()
+            return ~self.parse_not()
+        return self.parse_atom()
+
+    def parse_atom(self) -> np.ndarray:
+        token = self.next()
+        keyword = token.lower()
+        if token == "(":
+            mask = self.parse_or()
+            if self.next() != ")":
+                raise ValueError(f"Missing ')' in selection '{self.selection}'")
+            return mask
+        if keyword in _PROPERTIES:
+            return self.parse_property(keyword)
+        return self.parse_flag(keyword)
+
+    def parse_values(self) -> List[str]:
+        values = [self.next()]
+        # "resi 112+137" lists values, while "resi 112 + resi 137" combines selections
+        while self.peek() == "+" and self.peek(1) is not None \
+                and self.peek(1).lower() not in _PROPERTIES | _OPERATORS \
+                and self.peek(1).lower() not in _FLAGS:
+            self.next()
+            values.append(self.next())
+        return values
+
+    def parse_property(self, keyword: str) -> np.ndarray:
+        atoms = self.structure.atoms
+        values = self.parse_values()
+        if keyword == "resi":
+            return self.match_resi(values)
+        column = {"chain": "chain", "resn": "resn", "name": "name", "elem": "element"}[keyword]
+        if keyword in ("resn", "elem"):
+            return np.isin(np.char.upper(atoms[column]), [v.upper() for v in values])
+        return np.isin(atoms[column], values)
+
+    def match_resi(self, values: List[str]) -> np.ndarray:
+        atoms = self.structure.atoms
+        resi = atoms["resi"]
+        labels = None
+        mask = np.zeros(len(self.structure), dtype=bool)
+        for value in values:
+            range_match = re.fullmatch(r"(-?\d+)-(-?\d+)", value)
+            if range_match:
+                start, stop = int(range_match.group(1)), int(range_match.group(2))
+                mask |= (resi >= start) & (resi <= stop)
+            elif re.fullmatch(r"-?\d+", value):
+                mask |= (resi == int(value)) & (atoms["icode"] == "")
+            else:
+                # Residue numbers with an insertion code, e.g. "100A"
+                if labels is None:
+                    labels = np.char.add(resi.astype(str), atoms["icode"])
+                mask |= labels == value
+        return mask
+
+    def parse_flag(self, keyword: str) -> np.ndarray:
+        if keyword not in _FLAGS:
+            raise ValueError(f"Unsupported selection keyword '{keyword}' in '{self.selection}'")
+        return _FLAGS[keyword](self.structure.atoms)
+
+
+def _is_protein(atoms: dict) -> np.ndarray:
+    return np.isin(atoms["resn"], list(AMINO_ACIDS))
+
+
+def _is_polymer(atoms: dict) -> np.ndarray:
+    return _is_protein(atoms) | np.isin(atoms["resn"], list(NUCLEOTIDES))
+
+
+def _is_solvent(atoms: dict) -> np.ndarray:
+    return np.isin(atoms["resn"], list(SOLVENT))
+
+
+def _is_organic(atoms: dict) -> np.ndarray:
+    # Non-polymer, non-solvent residues containing carbon
+    residues = np.char.add(np.char.add(atoms["chain"], "|"), atoms["resn"])
+    residues = np.char.add(np.char.add(residues, "|"), np.char.add(atoms["resi"].astype(str), atoms["icode"]))
+    carbon_residues = np.unique(residues[atoms["element"] == "C"])
+    return ~_is_polymer(atoms) & ~_is_solvent(atoms) & np.isin(residues, carbon_residues)
+
+
+_FLAGS = {
+    "all": lambda atoms: np.ones(len(atoms["coords"]), dtype=bool),
+    "none": lambda atoms: np.zeros(len(atoms["coords"]), dtype=bool),
+    "polymer.protein": _is_protein,
+    "polymer.nucleic": lambda atoms: np.isin(atoms["resn"], list(NUCLEOTIDES)),
+    "polymer": _is_polymer,
+    "hetatm": lambda atoms: atoms["record"] == "HETATM",
+    "organic": _is_organic,
+    "solvent": _is_solvent,
+    "hydrogens": lambda atoms: np.isin(atoms["element"], ["H", "D"]),
+}
@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.binding_sites_clustering.af2bind_batch import (AF2BindJob,
+                                                        get_bucket_length,
+                                                        get_target_length,
+                                                        group_jobs_by_length,
+                                                        pad_target, parse_target,
+                                                        read_jobs)
+
+
+def pdb_line(serial: int, name: str, resn: str, chain: str, resi: int,
+             record: str = "ATOM") -> str:
+    return (f"{record:<6}{serial:>5} {name:<4} {resn:>3} {chain}{resi:>4}    "
+            f"{0.0:8.3f}{0.0:8.3f}{0.0:8.3f}{1.0:6.2f}{0.0:6.2f}\n")
+
+
+def write_pdb(path: str, chains: dict) -> None:
+    serial = 1
+    with open(path, "w") as f:
+        for chain, n_res in chains.items():
+            for resi in range(1, n_res + 1):
+                for name in ("N", "CA", "C"):
+                    f.write(pdb_line(serial, name, "ALA", chain, resi))
+                    serial += 1
+        f.write(pdb_line(serial, "O", "HOH", "A", 500, record="HETATM"))
+        f.write("END\n")
+
+
+class TestAF2BindBatch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pdb_small = os.path.join(self.tmp_dir.name, "small.pdb")
+        self.pdb_large = os.path.join(self.tmp_dir.name, "large.pdb")
+        write_pdb(self.pdb_small, {"A": 5, "B": 8})
+        write_pdb(self.pdb_large, {"A": 8})
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_get_target_length(self) -> None:
+        self.assertEqual(get_target_length(self.pdb_small, "A"), 5)
+        self.assertEqual(get_target_length(self.pdb_small, "B"), 8)
+        self.assertEqual(get_target_length(self.pdb_small, "C"), 0)
+
+    def test_group_jobs_by_length(self) -> None:
+        jobs = [AF2BindJob(self.pdb_small, "B"),
+                AF2BindJob(self.pdb_small, "A"),
+                AF2BindJob(self.pdb_large, "A")]
+        groups = group_jobs_by_length(jobs)
+        self.assertEqual(list(groups), [5, 8])
+        self.assertEqual(groups[5], [1])
+        self.assertEqual(groups[8], [0, 2])
+
+    def test_group_jobs_by_bucket(self) -> None:
+        jobs = [AF2BindJob(self.pdb_small, "B"),
+                AF2BindJob(self.pdb_small, "A"),
+                AF2BindJob(self.pdb_large, "A")]
+        self.assertEqual(group_jobs_by_length(jobs, bucket=10), {10: [0, 1, 2]})
+
+    def test_get_bucket_length(self) -> None:
+        self.assertEqual(get_bucket_length(100), 100)
+        self.assertEqual(get_bucket_length(100, "pow2"), 128)
+        self.assertEqual(get_bucket_length(128, "pow2"), 128)
+        self.assertEqual(get_bucket_length(5, "pow2"), 32)
+        self.assertEqual(get_bucket_length(100, 64), 128)
+        self.assertEqual(get_bucket_length(100, "50"), 100)
+        with self.assertRaises(ValueError):
+            get_bucket_length(100, "pow3")
+        with self.assertRaises(ValueError):
+            get_bucket_length(100, 0)
+
+    def test_pad_target(self) -> None:
+        target_len, binder_len = 5, 20
+        L = target_len + binder_len
+        af_model = SimpleNamespace(
+            _target_len=target_len,
+            _binder_len=binder_len,
+            _lengths=[target_len, binder_len],
+            _inputs={
+                "residue_index": np.append(np.arange(target_len), 100 + np.arange(binder_len)),
+                "seq_mask": np.ones(L),
+                "msa_feat": np.ones((1, L, 49)),
+                "rm_template_sc": np.zeros(L, dtype=bool),
+                "template_mask": np.zeros(1),
+                "batch": {"aatype": np.arange(L), "all_atom_mask": np.ones((L, 37))},
+            })
+
+        target_mask = pad_target(af_model, 8)
+
+        inputs = af_model._inputs
+        np.testing.assert_array_equal(target_mask, [True] * 5 + [False] * 3)
+        self.assertEqual(af_model._target_len, 8)
+        self.assertEqual(af_model._lengths, [8, 20])
+        self.assertEqual(inputs["msa_feat"].shape, (1, 28, 49))
+        self.assertEqual(inputs["template_mask"].shape, (1,))
+        np.testing.assert_array_equal(inputs["residue_index"][:8], np.arange(8))
+        np.testing.assert_array_equal(inputs["residue_index"][8:], 100 + np.arange(20))
+        np.testing.assert_array_equal(inputs["seq_mask"][5:8], 0)
+        np.testing.assert_array_equal(inputs["msa_feat"][0, 5:8], 0)
+        self.assertTrue(inputs["rm_template_sc"][5:8].all())
+        self.assertFalse(inputs["rm_template_sc"][8:].any())
+        np.testing.assert_array_equal(inputs["batch"]["aatype"][8:], np.arange(5, 25))
+        np.testing.assert_array_equal(inputs["batch"]["all_atom_mask"][5:8], 0)
+
+    def test_parse_target(self) -> None:
+        self.assertEqual(parse_target("7cei.pdb:B"), AF2BindJob("7cei.pdb", "B"))
+        self.assertEqual(parse_target("7cei.pdb"), AF2BindJob("7cei.pdb", "A"))
+
+    def test_read_jobs(self) -> None:
+        jobs_file = os.path.join(self.tmp_dir.name, "jobs.txt")
+        with open(jobs_file, "w") as f:
+            f.write("# pdb chain\nsmall.pdb B\n\nlarge.pdb\n")
+        self.assertEqual(read_jobs(jobs_file),
+                         [AF2BindJob("small.pdb", "B"), AF2BindJob("large.pdb", "A")])
+
+
+if __name__ == "__main__":
+    unittest.main()
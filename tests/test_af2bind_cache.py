@@ -0,0 +1,77 @@
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from src.binding_sites_clustering.af2bind_cache import PairRepresentationCache
+
+
+def make_entry(length: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return {"pair_A": rng.normal(size=(length, 20, 4)).astype(np.float32),
+            "pair_B": rng.normal(size=(20, length, 4)).astype(np.float32),
+            "chain": np.array(["A"] * length),
+            "residue": np.arange(1, length + 1),
+            "aatype": np.zeros(length, dtype=int)}
+
+
+class TestPairRepresentationCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        self.pdb_file = os.path.join(self.tmp_dir.name, "1abc.pdb")
+        with open(self.pdb_file, "w") as f:
+            f.write("ATOM      1  CA  ALA A   1       0.000   0.000   0.000  1.00  0.00\n")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_key(self) -> None:
+        key = PairRepresentationCache.key(self.pdb_file, "A")
+        self.assertEqual(key, PairRepresentationCache.key(self.pdb_file, "A"))
+        self.assertNotEqual(key, PairRepresentationCache.key(self.pdb_file, "B"))
+        self.assertNotEqual(key, PairRepresentationCache.key(self.pdb_file, "A", mask_sidechains=False))
+        self.assertNotEqual(key, PairRepresentationCache.key(self.pdb_file, "A", mask_sequence=True))
+        padded = PairRepresentationCache.key(self.pdb_file, "A", padded_length=64)
+        self.assertNotEqual(key, padded)
+        self.assertNotEqual(padded, PairRepresentationCache.key(self.pdb_file, "A", padded_length=128))
+
+        with open(self.pdb_file, "a") as f:
+            f.write("END\n")
+        self.assertNotEqual(key, PairRepresentationCache.key(self.pdb_file, "A"))
+
+    def test_get_put(self) -> None:
+        cache = PairRepresentationCache(self.cache_dir)
+        self.assertIsNone(cache.get("missing"))
+
+        entry = make_entry(5)
+        cache.put("key", entry)
+        cached = cache.get("key")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        for k, x in entry.items():
+            np.testing.assert_array_equal(cached[k], x)
+
+    def test_lru_eviction(self) -> None:
+        cache = PairRepresentationCache(self.cache_dir)
+        cache.put("first", make_entry(50, seed=0))
+        entry_size = cache.size()
+
+        cache.max_bytes = int(entry_size * 2.5)
+        time.sleep(0.01)
+        cache.put("second", make_entry(50, seed=1))
+        time.sleep(0.01)
+        self.assertIsNotNone(cache.get("first"))  # first is now the most recently used
+        time.sleep(0.01)
+        cache.put("third", make_entry(50, seed=2))
+
+        self.assertIsNotNone(cache.get("first"))
+        self.assertIsNone(cache.get("second"))
+        self.assertIsNotNone(cache.get("third"))
+        self.assertLessEqual(cache.size(), cache.max_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
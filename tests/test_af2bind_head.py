@@ -0,0 +1,82 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.binding_sites_clustering.af2bind_head import (RunningStats, af2bind,
+                                                       af2bind_batch,
+                                                       af2bind_ensemble)
+from src.binding_sites_clustering.af2bind_params import (AF2BIND_PARAMS_DIR,
+                                                         configure_registry,
+                                                         get_model_type)
+
+CHANNELS = 8
+
+
+class TestAF2BindHead(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        n_features = 2 * 20 * CHANNELS
+        for seed in (0, 1):
+            params = {
+                "~": {"mean": rng.normal(size=n_features),
+                      "std": rng.uniform(0.5, 2.0, size=n_features)},
+                "linear": {"w": rng.normal(size=(n_features, 1)) * 0.1,
+                           "b": rng.normal(size=1)},
+            }
+            path = os.path.join(self.tmp_dir.name, f"{get_model_type(True, seed)}.pickle")
+            with open(path, "wb") as handle:
+                pickle.dump(params, handle)
+        configure_registry(params_dir=self.tmp_dir.name)
+        self.pairs = rng.normal(size=(3, 30, 30, CHANNELS)).astype(np.float32)
+
+    def tearDown(self) -> None:
+        configure_registry(params_dir=AF2BIND_PARAMS_DIR)
+        self.tmp_dir.cleanup()
+
+    def test_matches_af2bind(self) -> None:
+        o = af2bind_batch(self.pairs, seeds=(0, 1))
+        self.assertEqual(o["p_bind"].shape, (3, 2, 10))
+        self.assertEqual(o["p_bind_aa"].shape, (3, 2, 10, 20))
+
+        for n, pair in enumerate(self.pairs):
+            for s, seed in enumerate((0, 1)):
+                ref = af2bind({"representations": {"pair": pair}}, seed=seed)
+                np.testing.assert_allclose(o["p_bind"][n, s], ref["p_bind"], rtol=1e-4, atol=1e-5)
+                np.testing.assert_allclose(o["p_bind_aa"][n, s], ref["p_bind_aa"], rtol=1e-4, atol=1e-4)
+
+    def test_single_pair_and_list(self) -> None:
+        single = af2bind_batch(self.pairs[0])
+        stacked = af2bind_batch(list(self.pairs[:2]))
+        self.assertEqual(single["p_bind"].shape, (1, 1, 10))
+        np.testing.assert_allclose(single["p_bind"][0], stacked["p_bind"][0], rtol=1e-6)
+
+    def test_ensemble(self) -> None:
+        outputs = {"representations": {"pair": self.pairs[0]}}
+        o = af2bind_ensemble(outputs, seeds=(0, 1))
+        per_seed = af2bind_batch(self.pairs[0], seeds=(0, 1))["p_bind"][0]
+        np.testing.assert_allclose(o["p_bind"], per_seed.mean(0), rtol=1e-5)
+        np.testing.assert_allclose(o["p_bind_std"], per_seed.std(0), rtol=1e-4, atol=1e-7)
+        self.assertEqual(o["p_bind_aa"].shape, (10, 20))
+
+    def test_running_stats(self) -> None:
+        x = np.random.default_rng(1).normal(size=(5, 7))
+        stats = RunningStats()
+        self.assertIsNone(stats.std)
+        for row in x:
+            stats.update(row)
+        self.assertEqual(stats.n, 5)
+        np.testing.assert_allclose(stats.mean, x.mean(0))
+        np.testing.assert_allclose(stats.std, x.std(0))
+
+    def test_invalid_shape(self) -> None:
+        with self.assertRaises(ValueError):
+            af2bind_batch(np.zeros((30, 30)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import multiprocessing as mp
+import os
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.binding_sites_clustering.af2bind_batch import AF2BindJob
+
+from src.binding_sites_clustering.af2bind_parallel import (THREAD_ENV_VARS, _pin_worker,
+                                                           available_cpus, get_thread_env,
+                                                           partition_cpus, run_parallel,
+                                                           thread_limited_env)
+
+
+class TestAF2BindParallel(unittest.TestCase):
+
+    def test_get_thread_env(self) -> None:
+        env = get_thread_env(1)
+        for k in THREAD_ENV_VARS:
+            self.assertEqual(env[k], "1")
+        self.assertIn("--xla_cpu_multi_thread_eigen=false", env["XLA_FLAGS"])
+        # Larger caps are set through the CPU affinity, Eigen keeps its threads
+        self.assertNotIn("xla_cpu_multi_thread_eigen", get_thread_env(2)["XLA_FLAGS"])
+
+    def test_thread_limited_env_restores(self) -> None:
+        saved = {k: os.environ.get(k) for k in (*THREAD_ENV_VARS, "XLA_FLAGS")}
+        with thread_limited_env(3):
+            self.assertEqual(os.environ["OMP_NUM_THREADS"], "3")
+        self.assertEqual({k: os.environ.get(k) for k in saved}, saved)
+
+    def test_partition_cpus(self) -> None:
+        cpus = available_cpus()
+        sets = partition_cpus(2, max(1, len(cpus) // 2))
+        self.assertEqual(len(sets), 2)
+        self.assertTrue(all(set(s) <= set(cpus) for s in sets))
+        if len(cpus) >= 2:
+            self.assertFalse(set(sets[0]) & set(sets[1]))
+        # More threads than CPUs are capped to the available CPUs
+        self.assertEqual(len(partition_cpus(1, len(cpus) + 4)[0]), len(cpus))
+
+    @unittest.skipUnless(hasattr(os, "sched_getaffinity"), "CPU affinity is not supported")
+    def test_workers_are_pinned(self) -> None:
+        ctx = mp.get_context("spawn")
+        cpu_sets = ctx.Queue()
+        expected = partition_cpus(2, 1)
+        for cpus in expected:
+            cpu_sets.put(cpus)
+        with ProcessPoolExecutor(2, mp_context=ctx, initializer=_pin_worker, initargs=(cpu_sets,)) as pool:
+            affinities = list(pool.map(os.sched_getaffinity, [0] * 8))
+        # Every worker may only run on the single CPU it was given
+        self.assertTrue(all(a in [set(c) for c in expected] for a in affinities))
+
+    def test_pin_worker_without_cpu_set(self) -> None:
+        # A worker finding no CPU set left keeps its affinity instead of blocking
+        before = available_cpus()
+        _pin_worker(mp.get_context("spawn").Queue())
+        self.assertEqual(available_cpus(), before)
+
+    def test_broken_worker(self) -> None:
+        # A worker failing to build its runner breaks the pool instead of hanging it
+        jobs = [AF2BindJob("missing.pdb", "A")] * 2
+        with self.assertRaises(BrokenProcessPool):
+            list(run_parallel(jobs, workers=2, threads_per_worker=1, bucket="invalid"))
+
+    def test_no_jobs(self) -> None:
+        self.assertEqual(list(run_parallel([], workers=4)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.binding_sites_clustering.af2bind_params import (AF2BindParamRegistry,
+                                                         get_model_type)
+
+
+def write_params(params_dir: str, model_type: str, scale: float = 1.0) -> None:
+    params = {
+        "~": {"mean": np.full(8, 0.5 * scale, dtype=np.float64),
+              "std": np.full(8, 2.0 * scale, dtype=np.float64)},
+        "linear": {"w": np.full((8, 1), scale, dtype=np.float64),
+                   "b": np.array([scale], dtype=np.float64)},
+    }
+    with open(os.path.join(params_dir, f"{model_type}.pickle"), "wb") as handle:
+        pickle.dump(params, handle)
+
+
+class TestAF2BindParamRegistry(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.params_dir = self.tmp_dir.name
+        write_params(self.params_dir, get_model_type(True, 0))
+        write_params(self.params_dir, get_model_type(False, 1), scale=3.0)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_get_model_type(self) -> None:
+        self.assertEqual(get_model_type(True, 0), "split_nosc_pair_A_split_nosc_pair_B_0")
+        self.assertEqual(get_model_type(False, 2), "split_pair_A_split_pair_B_2")
+
+    def test_get_loads_once_as_float32(self) -> None:
+        registry = AF2BindParamRegistry(params_dir=self.params_dir)
+        params = registry.get(mask_sidechains=True, seed=0)
+
+        self.assertEqual(set(params), {"mean", "std", "w", "b"})
+        for x in params.values():
+            self.assertEqual(x.dtype, np.float32)
+            self.assertTrue(x.flags["C_CONTIGUOUS"])
+            self.assertFalse(x.flags["WRITEABLE"])
+
+        # The second call must not touch the pickle again
+        os.remove(os.path.join(self.params_dir, f"{get_model_type(True, 0)}.pickle"))
+        self.assertIs(registry.get(mask_sidechains=True, seed=0), params)
+
+    def test_variants_are_cached_separately(self) -> None:
+        registry = AF2BindParamRegistry(params_dir=self.params_dir)
+        params_nosc = registry.get(mask_sidechains=True, seed=0)
+        params_sc = registry.get(mask_sidechains=False, seed=1)
+        self.assertEqual(float(params_nosc["w"][0, 0]), 1.0)
+        self.assertEqual(float(params_sc["w"][0, 0]), 3.0)
+
+    def test_available_seeds(self) -> None:
+        write_params(self.params_dir, get_model_type(True, 2))
+        registry = AF2BindParamRegistry(params_dir=self.params_dir)
+        self.assertEqual(registry.available_seeds(mask_sidechains=True), [0, 2])
+        self.assertEqual(registry.available_seeds(mask_sidechains=False), [1])
+
+    def test_mmap_dir(self) -> None:
+        with tempfile.TemporaryDirectory() as mmap_dir:
+            registry = AF2BindParamRegistry(params_dir=self.params_dir, mmap_dir=mmap_dir)
+            params = registry.get(mask_sidechains=True, seed=0)
+            self.assertIsInstance(params["mean"], np.memmap)
+            np.testing.assert_allclose(params["std"], 2.0)
+
+            # A fresh registry reuses the exported arrays without the pickle
+            os.remove(os.path.join(self.params_dir, f"{get_model_type(True, 0)}.pickle"))
+            params = AF2BindParamRegistry(params_dir=self.params_dir,
+                                          mmap_dir=mmap_dir).get(True, 0)
+            np.testing.assert_allclose(params["mean"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
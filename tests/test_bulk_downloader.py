@@ -0,0 +1,115 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from src.pdb_retrival.bulk_downloader import download_pdbs, read_pdb_ids
+
+
+class FakePDBHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the PDB download server. Files listed in `flaky` fail with a
+    503 the given number of times before they are served.
+    """
+    files: Dict[str, bytes] = {}
+    flaky: Dict[str, int] = {}
+    requests = 0
+    lock = threading.Lock()
+
+    def do_GET(self) -> None:
+        name = self.path.rsplit("/", 1)[-1]
+        with self.lock:
+            type(self).requests += 1
+            failures = self.flaky.get(name, 0)
+            if failures:
+                self.flaky[name] = failures - 1
+        if failures:
+            self.send_response(503)
+            self.end_headers()
+        elif name in self.files:
+            body = self.files[name]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestBulkDownloader(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakePDBHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url_template = f"http://127.0.0.1:{cls.server.server_port}/download/{{pdb_id}}.pdb"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        FakePDBHandler.files = {f"{i}ABC.pdb": f"ATOM {i}\n".encode() * 10000 for i in range(1, 6)}
+        FakePDBHandler.flaky = {}
+        FakePDBHandler.requests = 0
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def download(self, pdb_ids, **kwargs):
+        return download_pdbs(pdb_ids, output_dir=self.tmp_dir.name, max_workers=3,
+                             backoff_factor=0, url_template=self.url_template, **kwargs)
+
+    def test_download_many(self) -> None:
+        pdb_ids = ["1ABC", "2ABC", "3ABC", "4ABC", "5ABC", "1ABC"]
+        results = self.download(pdb_ids)
+        self.assertEqual(list(results), ["1ABC", "2ABC", "3ABC", "4ABC", "5ABC"])
+        for pdb_id, path in results.items():
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), FakePDBHandler.files[f"{pdb_id}.pdb"])
+        self.assertEqual(FakePDBHandler.requests, 5)
+        self.assertFalse([name for name in os.listdir(self.tmp_dir.name) if name.endswith(".part")])
+
+    def test_skip_existing(self) -> None:
+        self.download(["1ABC"])
+        self.download(["1ABC"])
+        self.assertEqual(FakePDBHandler.requests, 1)
+        self.download(["1ABC"], skip_existing=False)
+        self.assertEqual(FakePDBHandler.requests, 2)
+
+    def test_retries(self) -> None:
+        FakePDBHandler.flaky = {"1ABC.pdb": 2}
+        results = self.download(["1ABC"], retries=3)
+        self.assertIsNotNone(results["1ABC"])
+        self.assertEqual(FakePDBHandler.requests, 3)
+
+    def test_failures(self) -> None:
+        FakePDBHandler.flaky = {"1ABC.pdb": 5}
+        results = self.download(["1ABC", "9XYZ", "2ABC"], retries=1)
+        self.assertIsNone(results["1ABC"])
+        self.assertIsNone(results["9XYZ"])  # 404 is not retried
+        self.assertIsNotNone(results["2ABC"])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "9XYZ.pdb")))
+
+    def test_invalid_id(self) -> None:
+        with self.assertRaises(ValueError):
+            self.download(["1ABC", "12345"])
+
+    def test_read_pdb_ids(self) -> None:
+        path = os.path.join(self.tmp_dir.name, "ids.txt")
+        with open(path, "w") as f:
+            f.write("# screening set\n1abc, 2abc\n\n3abc 4abc\n")
+        self.assertEqual(read_pdb_ids(path), ["1abc", "2abc", "3abc", "4abc"])
+
+
+if __name__ == "__main__":
+    unittest.main()
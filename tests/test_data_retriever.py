@@ -112,5 +112,53 @@ class TestPDBDataRetriever(unittest.TestCase):
         self.assertEqual(result, "Sample Macromolecule Name")
 
 
+SAMPLE_HTML = """
+<html><body>
+<div id="header"><ul>
+<li id="header_classification"><strong>Classification:</strong> <a>APOPTOSIS</a></li>
+<li id="header_organism"><strong>Organism(s):</strong> <a>Homo sapiens</a></li>
+<li id="header_expression-system"><strong>Expression System:</strong> <a>Escherichia coli</a></li>
+<li id="header_mutation"><strong>Mutation(s):</strong> No</li>
+<li id="header_deposited-released-dates"><strong>Deposited:</strong> 2019-02-15
+<strong>Released:</strong> 2019-03-13</li>
+</ul></div>
+<ul>
+<li id="exp_header_0_method"><strong>Method:</strong> X-RAY DIFFRACTION</li>
+<li id="exp_header_0_diffraction_resolution"><strong>Resolution:</strong> 1.62 &#197;</li>
+<li id="contentStructureWeight">Total Structure Weight: 19.37 kDa</li>
+<li id="contentProteinChainCount">Unique protein chains: 1</li>
+</ul>
+<table><tr id="macromolecule-entityId-1-rowDescription"><td>Apoptosis regulator Bcl-2</td></tr></table>
+<div id="smallMoleculespanel"><table>
+<tr id="ligand_row_LBM"><td><a>LBM</a></td><td><strong>Venetoclax</strong></td></tr>
+</table></div>
+<table class="table table-bordered table-condensed" id="binding-affinity-table">
+<tbody><tr id="row_0"><td>LBM</td><td>BindingDB</td><td>Ki:&nbsp;0.01 nM</td></tr></tbody>
+</table>
+<div id="unrelated"><p>Lots of other content</p></div>
+</body></html>
+"""
+
+
+class TestPDBDataRetrieverFastParse(unittest.TestCase):
+
+    def test_fast_parse_matches_full_parse(self) -> None:
+        retriever = PDBDataRetriever("6O0K")
+        fast = retriever.parse_data(SAMPLE_HTML)
+        self.assertEqual(fast, retriever.parse_data(SAMPLE_HTML, fast=False))
+        self.assertEqual(fast["experiment_data"]["method"], "X-RAY DIFFRACTION")
+        self.assertEqual(fast["experiment_data"]["release_date"], "2019-03-13")
+        self.assertEqual(fast["macromolecules"]["unique_protein_chains"], 1)
+        self.assertEqual(fast["macromolecules"]["mutation"], False)
+        self.assertEqual(fast["small_molecules"], {"LBM": "Venetoclax"})
+        self.assertEqual(fast["binding_affinity"], "LBM: Ki: 0.01 nM")
+
+    def test_element_index(self) -> None:
+        index = PDBDataRetriever("6O0K").build_element_index(SAMPLE_HTML)
+        self.assertIsNotNone(index.find("li", id="header_organism"))
+        self.assertIsNone(index.find("div", id="header_organism"))
+        self.assertIsNone(index.find("div", id="unrelated"))
+
+
 if __name__ == "__main__":
     unittest.main()
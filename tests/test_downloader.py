@@ -1,10 +1,42 @@
+import gzip
+import os
+import tempfile
+import threading
 import unittest
+from http.server import ThreadingHTTPServer
 from typing import Optional
-from unittest.mock import MagicMock, mock_open, patch
+from unittest.mock import MagicMock, patch
 
 import requests
 
-from src.pdb_retrival.downloader import get_pdb, validate_pdb_id
+from src.pdb_retrival import downloader, resolver
+from src.pdb_retrival.bulk_downloader import download_pdbs
+from src.pdb_retrival.downloader import (download_structure, fetch_structure, get_pdb, iter_gunzip,
+                                         validate_pdb_id)
+from src.structure_io.structure import Structure
+from tests.test_bulk_downloader import FakePDBHandler
+
+PDB_TEXT = (b"ATOM      1  CA  ALA A   1      11.104   6.134  -6.504  1.00  0.00           C\n"
+            b"ATOM      2  CA  GLY A   2      12.560   6.500  -6.200  1.00  0.00           C\n"
+            b"END\n")
+CIF_TEXT = b"""data_2BIG
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.type_symbol
+_atom_site.label_atom_id
+_atom_site.label_comp_id
+_atom_site.label_asym_id
+_atom_site.label_seq_id
+_atom_site.Cartn_x
+_atom_site.Cartn_y
+_atom_site.Cartn_z
+_atom_site.occupancy
+_atom_site.B_iso_or_equiv
+_atom_site.pdbx_PDB_model_num
+ATOM 1 C CA ALA A 1 1.0 2.0 3.0 1.00 0.00 1
+ATOM 2 C CA GLY B 1 4.0 5.0 6.0 1.00 0.00 1
+"""
 
 
 class TestPDBFunctions(unittest.TestCase):
@@ -19,26 +51,13 @@ class TestPDBFunctions(unittest.TestCase):
         self.assertFalse(validate_pdb_id("1AB"))    # Too short
         self.assertFalse(validate_pdb_id("12#4"))   # Invalid character
 
-    @patch("requests.get")
-    def test_get_pdb_valid_id(self, mock_get: MagicMock) -> None:
-        # Mock a successful response
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.content = b"Mock PDB content"
-
-        with patch("builtins.open", mock_open()) as mocked_file:
-            result: Optional[str] = get_pdb("1ABC")
-            self.assertIsNone(result)  # get_pdb does not return anything explicitly
-
-            # Check if file was written
-            mocked_file.assert_called_once_with("1ABC.pdb", "wb")
-            mocked_file().write.assert_called_once_with(b"Mock PDB content")
-
     @patch("requests.get")
     def test_get_pdb_invalid_id(self, mock_get: MagicMock) -> None:
         with self.assertRaises(ValueError):
             get_pdb("12345")  # Invalid ID, should raise ValueError
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
+    @patch.object(resolver, "_resolver", None)
     def test_get_pdb_download_error(self, mock_get: MagicMock) -> None:
         # Mock a response failure
         mock_get.side_effect = requests.exceptions.RequestException("Mock error")
@@ -49,5 +68,98 @@ class TestPDBFunctions(unittest.TestCase):
             mock_print.assert_any_call("Failed to download PDB file: Mock error")
 
 
+class TestCompressedDownload(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakePDBHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{cls.server.server_port}/download"
+        cls.urls = {"pdb": base_url + "/{pdb_id}.pdb.gz", "cif": base_url + "/{pdb_id}.cif.gz"}
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        FakePDBHandler.files = {"1abc.pdb.gz": gzip.compress(PDB_TEXT),
+                                "1abc.cif.gz": gzip.compress(CIF_TEXT),
+                                "2big.cif.gz": gzip.compress(CIF_TEXT)}
+        FakePDBHandler.flaky = {}
+        patcher = patch.dict(downloader.COMPRESSED_DOWNLOAD_URLS, self.urls)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_download_structure(self) -> None:
+        path = download_structure("1abc", self.tmp_dir.name)
+        self.assertEqual(path, os.path.join(self.tmp_dir.name, "1abc.pdb"))
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), PDB_TEXT)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["1abc.pdb"])
+
+    def test_mmcif_fallback(self) -> None:
+        path = download_structure("2big", self.tmp_dir.name)
+        self.assertEqual(path, os.path.join(self.tmp_dir.name, "2big.cif"))
+        self.assertEqual(Structure.from_file(path).get_chains(), ["A", "B"])
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            download_structure("3new", self.tmp_dir.name)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            download_structure("2big", self.tmp_dir.name, formats=("pdb",))
+
+    def test_fetch_structure(self) -> None:
+        data, fmt = fetch_structure("1abc")
+        self.assertEqual((data, fmt), (PDB_TEXT, "pdb"))
+        self.assertEqual(len(Structure.from_bytes(data, fmt)), 2)
+        data, fmt = fetch_structure("2big")
+        self.assertEqual(fmt, "cif")
+        self.assertEqual(len(Structure.from_bytes(data, fmt)), 2)
+
+    def test_download_pdbs_compressed(self) -> None:
+        results = download_pdbs(["1abc", "2big", "3new"], output_dir=self.tmp_dir.name, compressed=True)
+        self.assertEqual(results, {"1abc": os.path.join(self.tmp_dir.name, "1abc.pdb"),
+                                   "2big": os.path.join(self.tmp_dir.name, "2big.cif"),
+                                   "3new": None})
+
+    def test_get_pdb_compressed(self) -> None:
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        try:
+            self.assertEqual(get_pdb("2big", compressed=True), "./2big.cif")
+        finally:
+            os.chdir(cwd)
+
+    def test_get_pdb(self) -> None:
+        FakePDBHandler.files["1abc.pdb"] = PDB_TEXT
+        pdb_url = self.urls["pdb"].replace(".pdb.gz", ".pdb")
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        try:
+            with patch.object(resolver, "PDB_DOWNLOAD_URL", pdb_url), patch.object(resolver, "_resolver", None):
+                # The plain file is streamed to disk by the shared resolver, without a
+                # partial file left behind
+                self.assertEqual(get_pdb("1abc"), "./1abc.pdb")
+                # No PDB format file: the mmCIF file is downloaded instead
+                self.assertEqual(get_pdb("2big"), "./2big.cif")
+                self.assertIsNone(get_pdb("3new"))
+            with open("1abc.pdb", "rb") as f:
+                self.assertEqual(f.read(), PDB_TEXT)
+            self.assertEqual(sorted(os.listdir(".")), ["1abc.pdb", "2big.cif"])
+        finally:
+            os.chdir(cwd)
+
+    def test_iter_gunzip(self) -> None:
+        data = gzip.compress(b"first ") + gzip.compress(b"second")
+        chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+        self.assertEqual(b"".join(iter_gunzip(chunks)), b"first second")
+        with self.assertRaises(EOFError):
+            b"".join(iter_gunzip([data[:-5]]))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,111 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from src.pdb_retrival.data_retriever import PDBDataRetriever
+from src.pdb_retrival.graphql_retriever import GraphQLDataRetriever
+
+ENTRY_6O0K = {
+    "rcsb_id": "6O0K",
+    "exptl": [{"method": "X-RAY DIFFRACTION"}],
+    "rcsb_accession_info": {"initial_release_date": "2019-03-13T00:00:00+0000"},
+    "rcsb_entry_info": {"resolution_combined": [1.62], "molecular_weight": 19.37,
+                        "polymer_entity_count_protein": 1},
+    "struct_keywords": {"pdbx_keywords": "APOPTOSIS"},
+    "polymer_entities": [{
+        "rcsb_id": "6O0K_1",
+        "rcsb_polymer_entity": {"pdbx_description": "Apoptosis regulator Bcl-2"},
+        "rcsb_entity_source_organism": [{"scientific_name": "Homo sapiens"}],
+        "rcsb_entity_host_organism": [{"scientific_name": "Escherichia coli"}],
+        "entity_poly": {"rcsb_mutation_count": 0},
+    }],
+    "nonpolymer_entities": [{"nonpolymer_comp": {"chem_comp": {"id": "LBM", "name": "Venetoclax"}}}],
+    "rcsb_binding_affinity": [{"comp_id": "LBM", "type": "Ki", "value": 0.01, "unit": "nM"}],
+}
+
+
+class FakeGraphQLHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the RCSB GraphQL endpoint.
+    """
+    entries: Dict[str, Dict[str, Any]] = {}
+    batches: List[List[str]] = []
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        ids = body["variables"]["ids"]
+        self.batches.append(ids)
+        entries = [self.entries.get(pdb_id) for pdb_id in ids]
+        payload = json.dumps({"data": {"entries": [e for e in entries if e is not None]}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestGraphQLDataRetriever(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGraphQLHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/graphql"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        FakeGraphQLHandler.entries = {"6O0K": ENTRY_6O0K,
+                                      "1ABC": {"rcsb_id": "1ABC", "exptl": [{"method": "SOLUTION NMR"}]}}
+        FakeGraphQLHandler.batches = []
+
+    def test_same_shape_as_parse_data(self) -> None:
+        data = GraphQLDataRetriever(url=self.url).retrieve(["6o0k"])["6o0k"]
+        html_data = PDBDataRetriever("6o0k").parse_data("")
+        self.assertEqual(set(data), set(html_data))
+        for key in ("experiment_data", "macromolecules"):
+            self.assertEqual(set(data[key]), set(html_data[key]))
+
+    def test_parse_entry(self) -> None:
+        data = GraphQLDataRetriever(url=self.url).retrieve(["6o0k"])["6o0k"]
+        self.assertEqual(data["experiment_data"], {"method": "X-RAY DIFFRACTION",
+                                                   "resolution": "1.62 Å",
+                                                   "release_date": "2019-03-13"})
+        self.assertEqual(data["macromolecules"]["name"], "Apoptosis regulator Bcl-2")
+        self.assertEqual(data["macromolecules"]["total_weight"], "19.37 kDa")
+        self.assertEqual(data["macromolecules"]["unique_protein_chains"], 1)
+        self.assertEqual(data["macromolecules"]["organism"], "Homo sapiens")
+        self.assertEqual(data["macromolecules"]["expression_system"], "Escherichia coli")
+        self.assertFalse(data["macromolecules"]["mutation"])
+        self.assertEqual(data["small_molecules"], {"LBM": "Venetoclax"})
+        self.assertEqual(data["binding_affinity"], "LBM: Ki: 0.01 nM")
+
+    def test_sparse_entry(self) -> None:
+        data = GraphQLDataRetriever(url=self.url).retrieve(["1abc"])["1abc"]
+        self.assertEqual(data["experiment_data"]["method"], "SOLUTION NMR")
+        self.assertIsNone(data["experiment_data"]["resolution"])
+        self.assertIsNone(data["macromolecules"]["mutation"])
+        self.assertIsNone(data["small_molecules"])
+        self.assertEqual(data["binding_affinity"], "N/A")
+
+    def test_batches(self) -> None:
+        results = GraphQLDataRetriever(url=self.url, batch_size=2).retrieve(["6o0k", "1abc", "9xyz"])
+        self.assertEqual(FakeGraphQLHandler.batches, [["6O0K", "1ABC"], ["9XYZ"]])
+        self.assertEqual(list(results), ["6o0k", "1abc", "9xyz"])
+        self.assertIsNone(results["9xyz"])
+
+    def test_invalid_id(self) -> None:
+        with self.assertRaises(ValueError):
+            GraphQLDataRetriever(url=self.url).retrieve(["12345"])
+
+
+if __name__ == "__main__":
+    unittest.main()
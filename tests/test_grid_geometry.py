@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from src.binding_sites_clustering.grid_geometry import (diameter,
+                                                        hull_vertices,
+                                                        max_pairwise_distance,
+                                                        snap_to_grid)
+
+
+def brute_force_diameter(coords: np.ndarray) -> float:
+    return float(np.linalg.norm(coords[:, None] - coords, axis=-1).max())
+
+
+class TestGridGeometry(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.coords = np.random.default_rng(0).normal(scale=20.0, size=(500, 3))
+
+    def test_max_pairwise_distance_blockwise(self) -> None:
+        expected = brute_force_diameter(self.coords)
+        for max_block_elements in (1, 777, 10 ** 6):
+            self.assertAlmostEqual(max_pairwise_distance(self.coords, max_block_elements), expected, places=6)
+
+    def test_diameter_exact(self) -> None:
+        self.assertLess(len(hull_vertices(self.coords)), len(self.coords))
+        self.assertAlmostEqual(diameter(self.coords), brute_force_diameter(self.coords), places=6)
+
+    def test_diameter_tolerance(self) -> None:
+        expected = brute_force_diameter(self.coords)
+        for tolerance in (0.1, 1.0, 5.0):
+            self.assertLessEqual(abs(diameter(self.coords, tolerance=tolerance) - expected), tolerance)
+
+    def test_degenerate_inputs(self) -> None:
+        self.assertEqual(diameter(np.zeros((0, 3))), 0.0)
+        self.assertEqual(diameter(np.ones((1, 3))), 0.0)
+        line = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [2.0, 0.0, 0.0], [5.0, 0.0, 0.0], [3.0, 0.0, 0.0]])
+        self.assertAlmostEqual(diameter(line), 5.0)
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            diameter(np.zeros((4, 2)))
+        with self.assertRaises(ValueError):
+            diameter(self.coords, tolerance=0)
+        with self.assertRaises(ValueError):
+            snap_to_grid(self.coords, -1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
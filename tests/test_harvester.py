@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from src.pdb_retrival.harvester import JSONLResultStore, RateLimiter, harvest_metadata
+from tests.test_data_retriever import SAMPLE_HTML
+
+
+class FakeRCSBHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the RCSB structure pages; IDs starting with "9" are missing.
+    """
+    requested: List[str] = []
+
+    def do_GET(self) -> None:
+        pdb_id = self.path.rsplit("/", 1)[-1]
+        self.requested.append(pdb_id)
+        if pdb_id.startswith("9"):
+            self.send_error(404)
+            return
+        payload = SAMPLE_HTML.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestHarvester(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRCSBHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url_template = f"http://127.0.0.1:{cls.server.server_port}/structure/{{pdb_id}}"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        FakeRCSBHandler.requested = []
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self.tmp_dir.name, "metadata.jsonl")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def harvest(self, pdb_ids: List[str]) -> dict:
+        return harvest_metadata(pdb_ids, self.store_path, rate=0, concurrency=4, parse_workers=1,
+                                url_template=self.url_template)
+
+    def test_harvest(self) -> None:
+        counts = self.harvest(["6o0k", "1ABC", "6O0K", "9zzz"])
+        self.assertEqual(counts, {"harvested": 2, "failed": 1, "skipped": 0})
+        records = JSONLResultStore(self.store_path).load()
+        self.assertEqual(set(records), {"6o0k", "1abc", "9zzz"})
+        self.assertEqual(records["6o0k"]["data"]["experiment_data"]["method"], "X-RAY DIFFRACTION")
+        self.assertEqual(records["6o0k"]["data"]["binding_affinity"], "LBM: Ki: 0.01 nM")
+        self.assertIsNone(records["9zzz"]["data"])
+        self.assertIsNotNone(records["9zzz"]["error"])
+
+    def test_resume(self) -> None:
+        self.harvest(["6o0k", "9zzz"])
+        # Simulate a harvest that was interrupted while writing a record
+        with open(self.store_path, "a") as f:
+            f.write('{"pdb_id": "1ab')
+        FakeRCSBHandler.requested = []
+        counts = self.harvest(["6o0k", "1abc", "9zzz"])
+        self.assertEqual(counts, {"harvested": 1, "failed": 1, "skipped": 1})
+        self.assertEqual(sorted(FakeRCSBHandler.requested), ["1abc", "9zzz"])
+        with open(self.store_path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertIn(json.loads(lines[-1])["pdb_id"], ("1abc", "9zzz"))
+        self.assertEqual(JSONLResultStore(self.store_path).completed_ids(), {"6o0k", "1abc"})
+
+    def test_invalid_pdb_id(self) -> None:
+        with self.assertRaises(ValueError):
+            self.harvest(["6o0k", "toolong"])
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_rate(self) -> None:
+        async def acquire_all(limiter: RateLimiter, n: int) -> float:
+            start = time.monotonic()
+            await asyncio.gather(*(limiter.acquire() for _ in range(n)))
+            return time.monotonic() - start
+
+        # The first token is available at once, the other four at 20 per second
+        elapsed = asyncio.run(acquire_all(RateLimiter(20, burst=1), 5))
+        self.assertGreaterEqual(elapsed, 0.19)
+        self.assertLess(asyncio.run(acquire_all(RateLimiter(0), 100)), 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import gzip
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from src.pdb_retrival.data_retriever import PDBDataRetriever
+from src.pdb_retrival.metadata_cache import MetadataCache
+from tests.test_data_retriever import SAMPLE_HTML
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_memory_tier(self) -> None:
+        cache = MetadataCache(max_entries=2)
+        self.assertIsNone(cache.get("6o0k"))
+        cache.put("6O0K", {"binding_affinity": "N/A"})
+        cache.put("1abc", "<html></html>", "html")
+        self.assertEqual(cache.get("6o0k"), {"binding_affinity": "N/A"})
+        self.assertIsNone(cache.get("1abc"))
+        self.assertEqual(cache.get("1abc", "html"), "<html></html>")
+
+        # 6o0k is used more recently than 1abc, so 1abc is evicted
+        cache.get("6o0k")
+        cache.put("2xyz", {})
+        self.assertIsNone(cache.get("1abc", "html"))
+        self.assertEqual(cache.get("6o0k"), {"binding_affinity": "N/A"})
+        self.assertEqual(cache.stats()["memory_hits"], 4)
+        self.assertEqual(cache.stats()["misses"], 3)
+
+    def test_disk_tier(self) -> None:
+        MetadataCache(self.cache_dir).put("6o0k", SAMPLE_HTML, "html")
+        cache = MetadataCache(self.cache_dir)
+        self.assertEqual(cache.get("6o0k", "html"), SAMPLE_HTML)
+        self.assertEqual(cache.get("6o0k", "html"), SAMPLE_HTML)
+        self.assertEqual((cache.disk_hits, cache.memory_hits, cache.misses), (1, 1, 0))
+
+        cache.invalidate("6o0k")
+        self.assertIsNone(MetadataCache(self.cache_dir).get("6o0k", "html"))
+
+    def test_ttl(self) -> None:
+        cache = MetadataCache(self.cache_dir, ttl=60)
+        cache.put("6o0k", {"a": 1})
+        path = os.path.join(self.cache_dir, "6o0k.data.json.gz")
+        with gzip.open(path, "wt") as f:
+            json.dump({"stored_at": time.time() - 120, "value": {"a": 1}}, f)
+        self.assertIsNone(MetadataCache(self.cache_dir, ttl=60).get("6o0k"))
+        self.assertEqual(MetadataCache(self.cache_dir, ttl=None).get("6o0k"), {"a": 1})
+
+        cache.ttl = 0.01
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("6o0k"))
+
+    def test_size_eviction(self) -> None:
+        cache = MetadataCache(self.cache_dir)
+        cache.put("1abc", SAMPLE_HTML, "html")
+        entry_size = cache.size()
+
+        cache.max_bytes = int(entry_size * 2.5)
+        time.sleep(0.01)
+        cache.put("2abc", SAMPLE_HTML, "html")
+        time.sleep(0.01)
+        MetadataCache(self.cache_dir).get("1abc", "html")  # 1abc is now the most recently used
+        time.sleep(0.01)
+        cache.put("3abc", SAMPLE_HTML, "html")
+        names = sorted(os.listdir(self.cache_dir))
+        self.assertEqual(names, ["1abc.html.json.gz", "3abc.html.json.gz"])
+
+    def test_invalid_kind(self) -> None:
+        with self.assertRaises(ValueError):
+            MetadataCache().put("6o0k", {}, "pdb")
+
+
+class TestPDBDataRetrieverCache(unittest.TestCase):
+
+    @patch("src.pdb_retrival.data_retriever.requests.get")
+    def test_retrieve_data_cached(self, mock_get: Mock) -> None:
+        mock_response = Mock()
+        mock_response.text = SAMPLE_HTML
+        mock_get.return_value = mock_response
+
+        cache = MetadataCache()
+        data = PDBDataRetriever("6o0k", cache=cache).retrieve_data()
+        self.assertEqual(data["experiment_data"]["method"], "X-RAY DIFFRACTION")
+        self.assertEqual(PDBDataRetriever("6O0K", cache=cache).retrieve_data(), data)
+        self.assertEqual(PDBDataRetriever("6o0k", cache=cache).fetch_data(), SAMPLE_HTML)
+        mock_get.assert_called_once()
+        self.assertEqual(cache.stats()["hits"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
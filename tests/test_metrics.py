@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+from unittest.mock import Mock, patch
+
+from src.pdb_retrival import metrics
+from src.pdb_retrival.bulk_downloader import create_session, download_pdbs
+from src.pdb_retrival.data_retriever import PDBDataRetriever
+from src.pdb_retrival.metadata_cache import MetadataCache
+from src.pdb_retrival.metrics import MetricsRecorder, configure_metrics, count_retries
+from tests.test_bulk_downloader import FakePDBHandler
+from tests.test_data_retriever import SAMPLE_HTML
+
+
+class TestMetricsRecorder(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.tmp_dir.name, "events.jsonl")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_record_and_summary(self) -> None:
+        recorder = MetricsRecorder(self.log)
+        recorder.record("download", "1abc", duration=0.2, bytes=1000, retries=1)
+        recorder.record("download", "2abc", duration=3.0, bytes=500)
+        recorder.record("download", "3abc", status=metrics.CACHE_HIT)
+        with self.assertRaises(RuntimeError):
+            with recorder.timer("parse_metadata", "1abc") as event:
+                event["bytes"] = 10
+                raise RuntimeError("bad page")
+        recorder.close()
+
+        summary = recorder.summary()
+        self.assertEqual(summary["download"]["events"], 3)
+        self.assertEqual(summary["download"]["bytes"], 1500)
+        self.assertEqual(summary["download"]["retries"], 1)
+        self.assertAlmostEqual(summary["download"]["cache_hit_rate"], 1 / 3)
+        self.assertEqual(summary["download"]["max_s"], 3.0)
+        self.assertEqual(summary["download"]["histogram"]["<=0.01s"], 1)
+        self.assertEqual(summary["download"]["histogram"]["<=0.25s"], 1)
+        self.assertEqual(summary["download"]["histogram"]["<=5s"], 1)
+        self.assertEqual(summary["parse_metadata"]["errors"], 1)
+
+        with open(self.log) as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual([e["stage"] for e in events], ["download"] * 3 + ["parse_metadata"])
+        self.assertEqual(events[-1]["error"], "bad page")
+        self.assertEqual(events[-1]["bytes"], 10)
+
+        table = recorder.format_summary()
+        self.assertIn("download", table)
+        self.assertIn("parse_metadata", table)
+
+    def test_count_retries(self) -> None:
+        self.assertEqual(count_retries(Mock(raw=Mock(retries=Mock(history=(1, 2))))), 2)
+        self.assertEqual(count_retries(Mock()), 0)
+        self.assertEqual(count_retries(None), 0)
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakePDBHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url_template = f"http://127.0.0.1:{cls.server.server_port}/download/{{pdb_id}}.pdb"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.recorder = configure_metrics()
+
+    def tearDown(self) -> None:
+        configure_metrics()
+        self.tmp_dir.cleanup()
+
+    def test_download_metrics(self) -> None:
+        FakePDBHandler.files = {"1abc.pdb": b"A" * 100}
+        FakePDBHandler.flaky = {"1abc.pdb": 1}
+        download_pdbs(["1abc", "2abc"], output_dir=self.tmp_dir.name, url_template=self.url_template,
+                      session=create_session(backoff_factor=0))
+        summary = self.recorder.summary()["download"]
+        self.assertEqual(summary["events"], 2)
+        self.assertEqual(summary["errors"], 1)
+        self.assertEqual(summary["bytes"], 100)
+        self.assertEqual(summary["retries"], 1)
+
+    @patch("src.pdb_retrival.data_retriever.requests.get")
+    def test_retriever_metrics(self, mock_get: Mock) -> None:
+        mock_get.return_value = Mock(text=SAMPLE_HTML, content=SAMPLE_HTML.encode())
+        cache = MetadataCache()
+        PDBDataRetriever("6o0k", cache=cache).retrieve_data()
+        PDBDataRetriever("6o0k", cache=cache).fetch_data()
+        summary = self.recorder.summary()
+        self.assertEqual(summary["fetch_metadata"]["events"], 2)
+        self.assertEqual(summary["fetch_metadata"]["cache_hits"], 1)
+        self.assertEqual(summary["fetch_metadata"]["bytes"], len(SAMPLE_HTML.encode()))
+        self.assertEqual(summary["parse_metadata"]["events"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
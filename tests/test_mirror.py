@@ -0,0 +1,119 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from src.pdb_retrival.mirror import StructureMirror
+
+
+class FakeRevalidatingHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the PDB download server with ETag support.
+    """
+    files: Dict[str, bytes] = {}
+    log: List[int] = []
+
+    def do_GET(self) -> None:
+        name = self.path.rsplit("/", 1)[-1]
+        if name not in self.files:
+            self.log.append(404)
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.files[name]
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.log.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.log.append(200)
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestStructureMirror(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRevalidatingHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url_template = f"http://127.0.0.1:{cls.server.server_port}/download/{{pdb_id}}.pdb"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        FakeRevalidatingHandler.files = {"6o0k.pdb": b"ATOM 1\n" * 1000, "1abc.pdb": b"ATOM 2\n"}
+        FakeRevalidatingHandler.log = []
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def mirror(self, **kwargs) -> StructureMirror:
+        return StructureMirror(os.path.join(self.tmp_dir.name, "mirror"),
+                               url_template=self.url_template, **kwargs)
+
+    def test_fetch_and_index(self) -> None:
+        with self.mirror() as mirror:
+            path = mirror.fetch_pdb("6O0K")
+            self.assertTrue(path.endswith(os.path.join("pdb", "o0", "6o0k.pdb.gz")))
+            with gzip.open(path, "rb") as f:
+                self.assertEqual(f.read(), FakeRevalidatingHandler.files["6o0k.pdb"])
+
+            entry = mirror.get_entry("pdb:6o0k")
+            self.assertEqual(entry.size, 7000)
+            self.assertEqual(entry.sha256, hashlib.sha256(FakeRevalidatingHandler.files["6o0k.pdb"]).hexdigest())
+            self.assertIsNotNone(entry.etag)
+            self.assertTrue(mirror.verify("pdb:6o0k"))
+
+    def test_fresh_entries_skip_network(self) -> None:
+        with self.mirror() as mirror:
+            first = mirror.fetch_pdb("6o0k")
+        # A new mirror instance on the same directory reuses the index
+        with self.mirror() as mirror:
+            self.assertEqual(mirror.fetch_pdb("6o0k"), first)
+        self.assertEqual(FakeRevalidatingHandler.log, [200])
+
+    def test_stale_entries_are_revalidated(self) -> None:
+        with self.mirror(max_age=0) as mirror:
+            path = mirror.fetch_pdb("6o0k")
+            self.assertEqual(mirror.fetch_pdb("6o0k"), path)
+            self.assertEqual(FakeRevalidatingHandler.log, [200, 304])
+
+            FakeRevalidatingHandler.files["6o0k.pdb"] = b"ATOM 3\n"
+            self.assertEqual(mirror.fetch_pdb("6o0k"), path)
+            self.assertEqual(FakeRevalidatingHandler.log, [200, 304, 200])
+            self.assertEqual(mirror.get_entry("pdb:6o0k").size, 7)
+            self.assertEqual(len(os.listdir(os.path.dirname(path))), 1)
+
+    def test_fetch_pdbs_and_export(self) -> None:
+        with self.mirror() as mirror:
+            results = mirror.fetch_pdbs(["6o0k", "1abc", "9xyz"], max_workers=2)
+            self.assertIsNone(results["9xyz"])
+            output = os.path.join(self.tmp_dir.name, "1abc.pdb")
+            mirror.export(results["1abc"], output)
+            with open(output, "rb") as f:
+                self.assertEqual(f.read(), b"ATOM 2\n")
+
+    def test_invalid_id(self) -> None:
+        with self.mirror() as mirror, self.assertRaises(ValueError):
+            mirror.fetch_pdb("12345")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.pdbqt_preparation import openmm_fixer
+from src.pdbqt_preparation.openmm_fixer import StructureFixer, openmm_available
+from src.pdbqt_preparation.pipeline import run_pipeline
+from tests.test_structure import PDB_TEXT
+
+# A single alanine without hydrogens
+ALA_TEXT = """\
+ATOM      1  N   ALA A   1      -0.677  -1.230  -0.491  1.00  0.00           N
+ATOM      2  CA  ALA A   1      -0.001   0.064  -0.491  1.00  0.00           C
+ATOM      3  C   ALA A   1       1.499  -0.110  -0.491  1.00  0.00           C
+ATOM      4  O   ALA A   1       2.030  -1.227  -0.502  1.00  0.00           O
+ATOM      5  CB  ALA A   1      -0.509   0.856   0.727  1.00  0.00           C
+TER
+END
+"""
+
+
+class TestStructureFixer(unittest.TestCase):
+
+    def test_fix_steps(self) -> None:
+        fixer_cls = MagicMock()
+        pdb_file = MagicMock()
+        pdb_file.writeFile.side_effect = lambda topology, positions, f, keepIds: f.write("FIXED\n")
+        with patch.multiple(openmm_fixer, PDBFixer=fixer_cls, ForceField=MagicMock(), PDBFile=pdb_file):
+            fixer = StructureFixer()
+            # The force field is loaded once and reused for every structure
+            openmm_fixer.ForceField.assert_called_once_with("amber14-all.xml")
+            self.assertEqual(fixer.fix(PDB_TEXT, 6.5), "FIXED\n")
+            self.assertEqual(fixer.fix(PDB_TEXT, 7.0), "FIXED\n")
+
+        self.assertEqual(fixer_cls.call_args.kwargs["pdbfile"].getvalue(), PDB_TEXT)
+        instance = fixer_cls.return_value
+        instance.findMissingResidues.assert_called()
+        instance.addMissingAtoms.assert_called()
+        instance.addMissingHydrogens.assert_called_with(7.0, forcefield=fixer.forcefield)
+
+    def test_missing_dependencies(self) -> None:
+        with patch.object(openmm_fixer, "PDBFixer", None):
+            with self.assertRaises(ImportError):
+                StructureFixer()
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                with self.assertRaises(ImportError):
+                    list(run_pipeline(tmp_dir, tmp_dir, fixer="openmm"))
+        with self.assertRaises(ValueError):
+            list(run_pipeline(".", ".", fixer="pdb2pqr"))
+
+    @unittest.skipUnless(openmm_available(), "pdbfixer and openmm are not installed")
+    def test_fix_alanine(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file = os.path.join(tmp_dir, "ala.pdb")
+            with open(input_file, "w") as f:
+                f.write(ALA_TEXT)
+            output_file = StructureFixer().fix_file(input_file, os.path.join(tmp_dir, "ala_fixed.pdb"))
+            with open(output_file) as f:
+                atoms = [line for line in f if line.startswith(("ATOM", "HETATM"))]
+        # Terminal alanine: 5 heavy atoms, OXT and 7 hydrogens at pH 7.4
+        self.assertEqual(sum(line[76:78].strip() == "H" for line in atoms), 7)
+        self.assertTrue(any(line[12:16].strip() == "OXT" for line in atoms))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.pdbqt_preparation.manifest import (MANIFEST_NAME, BuildManifest, file_hash, source_version,
+                                            stage_key, tool_version)
+from src.pdbqt_preparation.pipeline import run_pipeline
+from tests.test_structure import PDB_TEXT
+
+# Stand-ins for the pdbfixer and obabel command line tools, logging their calls
+FAKE_PDBFIXER = """#!/bin/sh
+[ "$1" = "-V" ] && { echo "pdbfixer 0.0"; exit 0; }
+echo "fix $(basename "$1")" >> "$CALL_LOG"
+for arg in "$@"; do
+  case "$arg" in
+    --ph=*) ph="${arg#--ph=}" ;;
+    --output=*) out="${arg#--output=}" ;;
+  esac
+done
+{ echo "REMARK PH=$ph"; cat "$1"; } > "$out"
+"""
+FAKE_OBABEL = """#!/bin/sh
+[ "$1" = "-V" ] && { echo "Open Babel 0.0"; exit 0; }
+echo "convert $(basename "$1")" >> "$CALL_LOG"
+cat "$1" > "$4"
+"""
+
+
+class TestBuildManifest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, MANIFEST_NAME)
+        self.output = os.path.join(self.tmp_dir.name, "1abc_fixed.pdb")
+        with open(self.output, "w") as f:
+            f.write(PDB_TEXT)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_lookup(self) -> None:
+        with BuildManifest(self.path) as manifest:
+            self.assertIsNone(manifest.lookup("1abc.pdb", "fix", "key"))
+            manifest.record("1abc.pdb", "fix", "key", [self.output])
+            self.assertEqual(manifest.lookup("1abc.pdb", "fix", "key"), self.output)
+            self.assertIsNone(manifest.lookup("1abc.pdb", "fix", "other key"))
+            self.assertIsNone(manifest.lookup("1abc.pdb", "convert", "key"))
+
+        # Records survive a restart, also after an interrupted write
+        with open(self.path, "a") as f:
+            f.write('{"file": "2abc.pdb", "sta')
+        with BuildManifest(self.path) as manifest:
+            self.assertEqual(manifest.lookup("1abc.pdb", "fix", "key"), self.output)
+            manifest.record("2abc.pdb", "fix", "key", [self.output])
+        with BuildManifest(self.path) as manifest:
+            self.assertEqual(manifest.lookup("2abc.pdb", "fix", "key"), self.output)
+
+            # A modified output is rebuilt
+            with open(self.output, "a") as f:
+                f.write("END\n")
+            self.assertIsNone(manifest.lookup("1abc.pdb", "fix", "key"))
+
+    def test_stage_key(self) -> None:
+        key = stage_key(self.output, "pdbfixer", pH=7.4)
+        self.assertEqual(key, stage_key(self.output, "pdbfixer", pH=7.4))
+        self.assertNotEqual(key, stage_key(self.output, "pdbfixer", pH=7.0))
+        self.assertNotEqual(key, stage_key(self.output, "obabel", pH=7.4))
+        with open(self.output, "a") as f:
+            f.write("END\n")
+        self.assertNotEqual(key, stage_key(self.output, "pdbfixer", pH=7.4))
+
+    def test_in_process_tool_versions(self) -> None:
+        for tool in ("structure_io", "native", "openmm_fixer"):
+            self.assertTrue(tool_version(tool).startswith("source-"), tool)
+        self.assertNotEqual(tool_version("structure_io"), tool_version("native"))
+        self.assertNotEqual(tool_version("native"), tool_version("openmm_fixer"))
+
+        # The version follows the source of the stage's modules
+        module = os.path.join(self.tmp_dir.name, "prep_stage_module.py")
+        with open(module, "w") as f:
+            f.write("VERSION = 1\n")
+        with patch.object(sys, "path", [self.tmp_dir.name] + sys.path):
+            version = source_version(["prep_stage_module"])
+            self.assertEqual(version, source_version(["prep_stage_module"]))
+            with open(module, "w") as f:
+                f.write("VERSION = 2\n")
+            self.assertNotEqual(version, source_version(["prep_stage_module"]))
+
+
+class TestIncrementalPipeline(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.tmp_dir.name, "input")
+        self.output_dir = os.path.join(self.tmp_dir.name, "output")
+        bin_dir = os.path.join(self.tmp_dir.name, "bin")
+        for directory in (self.input_dir, bin_dir):
+            os.makedirs(directory)
+        for name, script in (("pdbfixer", FAKE_PDBFIXER), ("obabel", FAKE_OBABEL)):
+            path = os.path.join(bin_dir, name)
+            with open(path, "w") as f:
+                f.write(script)
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        for pdb_id in ("1abc", "2abc"):
+            with open(os.path.join(self.input_dir, f"{pdb_id}.pdb"), "w") as f:
+                f.write(PDB_TEXT)
+
+        self.call_log = os.path.join(self.tmp_dir.name, "calls.log")
+        patcher = patch.dict(os.environ, {"PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""),
+                                          "CALL_LOG": self.call_log})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def run_pipeline(self, **kwargs):
+        if os.path.exists(self.call_log):
+            os.remove(self.call_log)
+        results = {result.filename: result
+                   for result in run_pipeline(self.input_dir, self.output_dir, **kwargs)}
+        calls = []
+        if os.path.exists(self.call_log):
+            with open(self.call_log) as f:
+                calls = sorted(f.read().split("\n")[:-1])
+        return results, calls
+
+    def test_rerun_skips_up_to_date_stages(self) -> None:
+        results, calls = self.run_pipeline()
+        self.assertEqual(calls, ["convert 1abc_fixed.pdb", "convert 2abc_fixed.pdb",
+                                 "fix 1abc_stripped.pdb", "fix 2abc_stripped.pdb"])
+        pdbqt_file = os.path.join(self.output_dir, "1abc_stripped.pdbqt")
+        self.assertEqual(results["1abc.pdb"].pdbqt_file, pdbqt_file)
+        self.assertEqual(results["1abc.pdb"].skipped, ())
+        digest = file_hash(pdbqt_file)
+
+        results, calls = self.run_pipeline()
+        self.assertEqual(calls, [])
+        self.assertEqual(results["1abc.pdb"].pdbqt_file, pdbqt_file)
+        self.assertEqual(results["1abc.pdb"].skipped, ("strip", "fix", "convert"))
+        self.assertEqual(file_hash(pdbqt_file), digest)
+
+        results, calls = self.run_pipeline(force=True)
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(results["1abc.pdb"].skipped, ())
+
+    def test_ph_change_reruns_fix_and_convert(self) -> None:
+        self.run_pipeline(pH_value=7.4)
+        stripped = os.path.join(self.output_dir, "1abc_stripped.pdb")
+        mtime = os.stat(stripped).st_mtime_ns
+
+        results, calls = self.run_pipeline(pH_value=6.0)
+        self.assertEqual(calls, ["convert 1abc_fixed.pdb", "convert 2abc_fixed.pdb",
+                                 "fix 1abc_stripped.pdb", "fix 2abc_stripped.pdb"])
+        self.assertEqual(results["1abc.pdb"].skipped, ("strip",))
+        self.assertEqual(os.stat(stripped).st_mtime_ns, mtime)
+        with open(results["1abc.pdb"].pdbqt_file) as f:
+            self.assertEqual(f.readline().strip(), "REMARK PH=6.0")
+
+    def test_resume_and_changed_input(self) -> None:
+        self.run_pipeline()
+        # An interrupted batch: the conversion of 1abc never finished
+        os.remove(os.path.join(self.output_dir, "1abc_stripped.pdbqt"))
+        with open(os.path.join(self.input_dir, "2abc.pdb"), "w") as f:
+            f.write(PDB_TEXT.replace("1.000   0.000   0.000", "1.500   0.000   0.000"))
+
+        results, calls = self.run_pipeline()
+        self.assertEqual(results["1abc.pdb"].skipped, ("strip", "fix"))
+        self.assertEqual(results["2abc.pdb"].skipped, ())
+        self.assertEqual(calls, ["convert 1abc_fixed.pdb", "convert 2abc_fixed.pdb",
+                                 "fix 2abc_stripped.pdb"])
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "1abc_stripped.pdbqt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import stat
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from src.pdbqt_preparation.extract_protein import process_pdb_files
+from src.pdbqt_preparation.pipeline import run_pipeline
+from src.pdbqt_preparation.protonation import (SUBPROCESS_THREAD_ENV_VARS, get_subprocess_env,
+                                               protonate_and_convert_all)
+from tests.test_structure import PDB_TEXT
+
+# Stand-ins for the pdbfixer and obabel command line tools
+FAKE_PDBFIXER = """#!/bin/sh
+sleep 0.3
+for arg in "$@"; do
+  case "$arg" in --output=*) cat "$1" > "$1.fixed" && mv "$1.fixed" "${arg#--output=}" ;; esac
+done
+"""
+FAKE_OBABEL = """#!/bin/sh
+echo "REMARK OPENMM_CPU_THREADS=$OPENMM_CPU_THREADS" > "$4"
+cat "$1" >> "$4"
+"""
+
+
+class TestParallelPreparation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.tmp_dir.name, "input")
+        self.output_dir = os.path.join(self.tmp_dir.name, "output")
+        self.bin_dir = os.path.join(self.tmp_dir.name, "bin")
+        for directory in (self.input_dir, self.output_dir, self.bin_dir):
+            os.makedirs(directory)
+        for name, script in (("pdbfixer", FAKE_PDBFIXER), ("obabel", FAKE_OBABEL)):
+            path = os.path.join(self.bin_dir, name)
+            with open(path, "w") as f:
+                f.write(script)
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_get_subprocess_env(self) -> None:
+        env = get_subprocess_env(2)
+        for k in SUBPROCESS_THREAD_ENV_VARS:
+            self.assertEqual(env[k], "2")
+        self.assertEqual(env.get("PATH"), os.environ.get("PATH"))
+
+    def test_process_pdb_files_parallel(self) -> None:
+        for pdb_id in ("1abc", "2abc", "3abc"):
+            with open(os.path.join(self.input_dir, f"{pdb_id}.pdb"), "w") as f:
+                f.write(PDB_TEXT)
+        with open(os.path.join(self.input_dir, "notes.txt"), "w") as f:
+            f.write("not a structure")
+
+        processed = process_pdb_files(self.input_dir, self.output_dir, workers=2)
+        self.assertEqual(sorted(processed), ["1abc_stripped.pdb", "2abc_stripped.pdb", "3abc_stripped.pdb"])
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         ["1abc_stripped.pdb", "2abc_stripped.pdb", "3abc_stripped.pdb",
+                          "config_1abc.txt", "config_2abc.txt", "config_3abc.txt"])
+
+    def test_protonate_and_convert_all(self) -> None:
+        input_files = []
+        for pdb_id in ("1abc", "2abc", "3abc", "4abc"):
+            input_files.append(os.path.join(self.input_dir, f"{pdb_id}_stripped.pdb"))
+            with open(input_files[-1], "w") as f:
+                f.write(PDB_TEXT)
+        input_files.append(os.path.join(self.input_dir, "missing.pdb"))
+
+        path = self.bin_dir + os.pathsep + os.environ.get("PATH", "")
+        with patch.dict(os.environ, {"PATH": path}):
+            start = time.monotonic()
+            results = protonate_and_convert_all(input_files, self.output_dir, workers=5,
+                                                threads_per_job=1)
+            elapsed = time.monotonic() - start
+
+        # The four fixer runs of 0.3 s overlap
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(list(results), input_files)
+        self.assertIsNone(results[input_files[-1]])
+        output = results[input_files[0]]
+        self.assertEqual(output, os.path.join(self.output_dir, "1abc_stripped.pdbqt"))
+        with open(output) as f:
+            self.assertEqual(f.readline().strip(), "REMARK OPENMM_CPU_THREADS=1")
+
+    def test_run_pipeline(self) -> None:
+        for pdb_id in ("1abc", "2abc", "3abc", "4abc"):
+            with open(os.path.join(self.input_dir, f"{pdb_id}.pdb"), "w") as f:
+                f.write(PDB_TEXT)
+        with open(os.path.join(self.input_dir, "bad.pdb"), "w") as f:
+            f.write("not a structure")
+
+        path = self.bin_dir + os.pathsep + os.environ.get("PATH", "")
+        with patch.dict(os.environ, {"PATH": path}):
+            start = time.monotonic()
+            arrivals = []
+            results = []
+            for result in run_pipeline(self.input_dir, self.output_dir, workers=1, queue_size=1):
+                arrivals.append(time.monotonic() - start)
+                results.append(result)
+
+        by_file = {result.filename: result for result in results}
+        self.assertEqual(sorted(by_file), ["1abc.pdb", "2abc.pdb", "3abc.pdb", "4abc.pdb", "bad.pdb"])
+        self.assertEqual(by_file["bad.pdb"].stage, "strip")
+        self.assertIsNone(by_file["bad.pdb"].pdbqt_file)
+        self.assertEqual(by_file["1abc.pdb"].pdbqt_file,
+                         os.path.join(self.output_dir, "1abc_stripped.pdbqt"))
+        self.assertIsNone(by_file["1abc.pdb"].error)
+        # The first file is converted while the others wait for the fixer, one 0.3 s run each
+        converted = [t for t, result in zip(arrivals, results) if result.error is None]
+        self.assertLess(converted[0], converted[-1] - 0.5)
+
+    def test_run_pipeline_early_close(self) -> None:
+        pdb_ids = [f"{i}abc" for i in range(1, 9)]
+        for pdb_id in pdb_ids:
+            with open(os.path.join(self.input_dir, f"{pdb_id}.pdb"), "w") as f:
+                f.write(PDB_TEXT)
+
+        path = self.bin_dir + os.pathsep + os.environ.get("PATH", "")
+        with patch.dict(os.environ, {"PATH": path}):
+            results = run_pipeline(self.input_dir, self.output_dir, workers=1, queue_size=1)
+            self.assertIsNone(next(results).error)
+            start = time.monotonic()
+            results.close()
+            elapsed = time.monotonic() - start
+
+        # Only the fixer run in progress is waited for, not one 0.3 s run per remaining file
+        self.assertLess(elapsed, 1.0)
+        pdbqt_files = [name for name in os.listdir(self.output_dir) if name.endswith(".pdbqt")]
+        self.assertLess(len(pdbqt_files), len(pdb_ids))
+
+    def test_run_pipeline_fix_error(self) -> None:
+        with open(os.path.join(self.input_dir, "1abc.pdb"), "w") as f:
+            f.write(PDB_TEXT)
+        with open(os.path.join(self.bin_dir, "pdbfixer"), "w") as f:
+            f.write("#!/bin/sh\nexit 1\n")
+
+        path = self.bin_dir + os.pathsep + os.environ.get("PATH", "")
+        with patch.dict(os.environ, {"PATH": path}):
+            results = list(run_pipeline(self.input_dir, self.output_dir, workers=2))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].stage, "fix")
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "1abc_stripped.pdbqt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+import collections
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from src.pdbqt_preparation import pdbqt_writer
+from src.pdbqt_preparation.pdbqt_writer import (perceive_bonds, read_pdbqt_charges,
+                                                receptor_pdbqt_lines, save_native_pdbqt)
+from src.pdbqt_preparation.pipeline import run_pipeline
+from src.structure_io.structure import Structure
+from tests.test_pdbqt_manifest import FAKE_PDBFIXER
+from tests.test_structure import PDB_TEXT
+
+# Protonated alanine zwitterion and histidine side chain (HID)
+ALA_TEXT = """\
+ATOM      1  N   ALA A   1       0.000   0.000   0.000  1.00  0.00           N
+ATOM      2  CA  ALA A   1       1.470   0.000   0.000  1.00  0.00           C
+ATOM      3  C   ALA A   1       1.981   1.442   0.000  1.00  0.00           C
+ATOM      4  O   ALA A   1       1.169   2.393   0.000  1.00  0.00           O
+ATOM      5  CB  ALA A   1       1.980  -0.721  -1.249  1.00  0.00           C
+ATOM      6  OXT ALA A   1       3.210   1.670   0.000  1.00  0.00           O
+ATOM      7  HA  ALA A   1       1.833  -0.514   0.890  1.00  0.00           H
+ATOM      8  H1  ALA A   1      -0.337   0.952   0.000  1.00  0.00           H
+ATOM      9  H2  ALA A   1      -0.337  -0.476  -0.825  1.00  0.00           H
+ATOM     10  H3  ALA A   1      -0.337  -0.476   0.825  1.00  0.00           H
+ATOM     11  HB1 ALA A   1       1.262  -1.486  -1.547  1.00  0.00           H
+ATOM     12  HB2 ALA A   1       2.101  -0.003  -2.060  1.00  0.00           H
+ATOM     13  HB3 ALA A   1       2.940  -1.190  -1.033  1.00  0.00           H
+"""
+HIS_TEXT = """\
+ATOM      1  CG  HIS A   2       0.000   1.174   0.000  1.00  0.00           C
+ATOM      2  ND1 HIS A   2      -1.116   0.363   0.000  1.00  0.00           N
+ATOM      3  CE1 HIS A   2      -0.690  -0.950   0.000  1.00  0.00           C
+ATOM      4  NE2 HIS A   2       0.690  -0.950   0.000  1.00  0.00           N
+ATOM      5  CD2 HIS A   2       1.116   0.363   0.000  1.00  0.00           C
+ATOM      6  CB  HIS A   2       0.000   2.674   0.000  1.00  0.00           C
+ATOM      7  HD1 HIS A   2      -2.077   0.675   0.000  1.00  0.00           H
+ATOM      8  HE1 HIS A   2      -1.325  -1.823   0.000  1.00  0.00           H
+ATOM      9  HD2 HIS A   2       2.144   0.696   0.000  1.00  0.00           H
+"""
+
+
+def pdbqt_atoms(lines):
+    return {line[12:16].strip(): (float(line[70:76]), line[77:79].strip()) for line in lines}
+
+
+class TestPDBQTWriter(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.ala = Structure.from_bytes(ALA_TEXT.encode())
+        self.his = Structure.from_bytes(HIS_TEXT.encode())
+
+    def test_perceive_bonds(self) -> None:
+        bonds = perceive_bonds(self.ala.coords, self.ala.atoms["element"])
+        names = self.ala.atoms["name"]
+        bonded = {frozenset((names[i], names[j])) for i, j in bonds}
+        self.assertEqual(len(bonded), 12)
+        self.assertIn(frozenset(("C", "OXT")), bonded)
+        self.assertIn(frozenset(("N", "H1")), bonded)
+        self.assertNotIn(frozenset(("N", "C")), bonded)
+
+        # Same bonds without scipy
+        with patch.object(pdbqt_writer, "cKDTree", None):
+            np.testing.assert_array_equal(perceive_bonds(self.ala.coords, self.ala.atoms["element"]),
+                                          bonds)
+        # Tiles smaller than the structure find the same pairs
+        candidates = np.arange(len(self.ala.coords))
+        pairs = {tuple(p) for p in pdbqt_writer._pairs_blockwise(self.ala.coords, candidates, 2.0).tolist()}
+        self.assertEqual({tuple(p) for p in pdbqt_writer._pairs_blockwise(self.ala.coords, candidates, 2.0,
+                                                                          block=4).tolist()}, pairs)
+        self.assertTrue(pairs >= {tuple(sorted(p)) for p in bonds.tolist()})
+
+    def test_autodock_types(self) -> None:
+        atoms = pdbqt_atoms(receptor_pdbqt_lines(self.ala))
+        self.assertEqual({name: t for name, (_, t) in atoms.items()},
+                         {"N": "N", "CA": "C", "C": "C", "O": "OA", "CB": "C", "OXT": "OA",
+                          "H1": "HD", "H2": "HD", "H3": "HD"})
+        atoms = pdbqt_atoms(receptor_pdbqt_lines(self.his))
+        self.assertEqual({name: t for name, (_, t) in atoms.items()},
+                         {"CG": "A", "ND1": "N", "CE1": "A", "NE2": "NA", "CD2": "A", "CB": "C",
+                          "HD1": "HD"})
+
+    def test_fallback_types(self) -> None:
+        # Selenium of selenomethionine and metal ions without an AutoDock 4 type
+        text = ("HETATM    1 SE   MSE A   1       0.000   0.000   0.000  1.00  0.00          SE\n"
+                "HETATM    2 NI    NI A 101       5.000   0.000   0.000  1.00  0.00          NI\n"
+                "HETATM    3 ZN    ZN A 102      10.000   0.000   0.000  1.00  0.00          ZN\n")
+        types = [line[77:79].strip() for line in receptor_pdbqt_lines(Structure.from_bytes(text.encode()))]
+        self.assertEqual(types, ["S", "Zn", "Zn"])
+
+        text += "HETATM    4 SI   SIL A 103      15.000   0.000   0.000  1.00  0.00          SI\n"
+        with self.assertRaisesRegex(ValueError, "element 'SI'"):
+            receptor_pdbqt_lines(Structure.from_bytes(text.encode()))
+
+    def test_first_altloc(self) -> None:
+        # Residue 1 has conformers A and B, residue 2 only B and C
+        text = ("ATOM      1  OG ASER A   1       0.000   0.000   0.000  0.60  0.00           O\n"
+                "ATOM      2  OG BSER A   1       0.500   0.000   0.000  0.40  0.00           O\n"
+                "ATOM      3  CA  SER A   2       5.000   0.000   0.000  1.00  0.00           C\n"
+                "ATOM      4  OG BSER A   2      10.000   0.000   0.000  0.50  0.00           O\n"
+                "ATOM      5  OG CSER A   2      10.500   0.000   0.000  0.50  0.00           O\n")
+        lines = receptor_pdbqt_lines(Structure.from_bytes(text.encode()))
+        self.assertEqual([line[6:11].strip() for line in lines], ["1", "3", "4"])
+
+    def test_gasteiger_charges(self) -> None:
+        merged = pdbqt_atoms(receptor_pdbqt_lines(self.ala))
+        full = pdbqt_atoms(receptor_pdbqt_lines(self.ala, merge_nonpolar_hydrogens=False))
+        self.assertEqual(len(full), 13)
+        # The zwitterion is neutral, with and without the non-polar hydrogens merged
+        self.assertAlmostEqual(sum(q for q, _ in full.values()), 0.0, delta=0.01)
+        self.assertAlmostEqual(sum(q for q, _ in merged.values()), 0.0, delta=0.01)
+        self.assertAlmostEqual(merged["CB"][0], sum(full[name][0] for name in ("CB", "HB1", "HB2", "HB3")),
+                               delta=0.002)
+        # Same charges as `obabel -xr --partialcharge gasteiger`, which starts from zero
+        # charges and leaves the ammonium hydrogens slightly negative
+        self.assertEqual({name: q for name, (q, _) in merged.items()},
+                         {"N": 0.387, "CA": 0.037, "C": 0.342, "O": -0.248, "CB": -0.003,
+                          "OXT": -0.248, "H1": -0.089, "H2": -0.089, "H3": -0.089})
+
+    def test_pdbqt_columns(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file = os.path.join(tmp_dir, "ala.pdb")
+            with open(input_file, "w") as f:
+                f.write(ALA_TEXT)
+            output_file = save_native_pdbqt(input_file)
+            self.assertEqual(output_file, os.path.join(tmp_dir, "ala.pdbqt"))
+            with open(output_file) as f:
+                lines = f.read().splitlines()
+            pdbqt = read_pdbqt_charges(output_file)
+        self.assertEqual(len(lines), 9)
+        self.assertTrue(all(len(line) == 79 and line.startswith("ATOM") for line in lines))
+        self.assertEqual(lines[0][:66], ALA_TEXT.splitlines()[0][:66])
+        self.assertEqual(pdbqt["type"].tolist()[:4], ["N", "C", "C", "OA"])
+
+    def test_pipeline_native_converter(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_dir, output_dir, bin_dir = (os.path.join(tmp_dir, d) for d in ("input", "output", "bin"))
+            for directory in (input_dir, bin_dir):
+                os.makedirs(directory)
+            with open(os.path.join(input_dir, "1abc.pdb"), "w") as f:
+                f.write(PDB_TEXT)
+            path = os.path.join(bin_dir, "pdbfixer")
+            with open(path, "w") as f:
+                f.write(FAKE_PDBFIXER)
+            os.chmod(path, 0o755)
+            env = {"PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""),
+                   "CALL_LOG": os.path.join(tmp_dir, "calls.log")}
+            with patch.dict(os.environ, env):
+                results = list(run_pipeline(input_dir, output_dir, converter="native"))
+            self.assertEqual(len(results), 1)
+            self.assertIsNone(results[0].error)
+            pdbqt = read_pdbqt_charges(results[0].pdbqt_file)
+        self.assertGreater(len(pdbqt["key"]), 0)
+        self.assertTrue(set(pdbqt["type"]) <= {"N", "NA", "C"})
+
+
+# Real receptors converted with `obabel -xr` (Open Babel 3.1.0): 1A8O (MSE, PRO, a
+# disulfide) and a crop of 7DDO around its zinc site (HIS bound to the zinc, altlocs,
+# disulfides), stripped and fixed by pdbfixer at pH 7.4 (HID/HIE) and 5.5 (HIP). Open
+# Babel writes zero charges for PDB input, so the atom types are compared with those
+# files and the charges with `obabel -xr --partialcharge gasteiger` conversions
+# (*.gasteiger.pdbqt) of the same inputs without their zinc and selenium atoms, which
+# Open Babel has no Gasteiger parameters for.
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "data", "pdbqt")
+CORPUS = ("1a8o_stripped", "1a8o_fixed_ph7.4", "7ddo_zn_site_stripped",
+          "7ddo_zn_site_fixed_ph7.4", "7ddo_zn_site_fixed_ph5.5")
+RING_ATOMS = {"HIS": {"CG", "ND1", "CD2", "CE1", "NE2"},
+              "TRP": {"CG", "CD1", "CD2", "NE1", "CE2", "CE3", "CZ2", "CZ3", "CH2"}}
+
+
+def non_aromatic_rings(reference):
+    """The HIS and TRP residues whose ring Open Babel did not perceive as aromatic."""
+    return {key.rsplit("|", 1)[0] for key, t in zip(reference["key"].tolist(), reference["type"])
+            if key.split("|")[3] in RING_ATOMS.get(key.split("|")[2], ()) and t == "C"}
+
+
+def expected_types(reference):
+    """
+    The Open Babel types the native writer must reproduce, by atom key. Open Babel
+    writes selenium as "Se", which has no AutoDock type, and perceives the aromaticity
+    of HIS and TRP rings from their geometry, leaving some of them non-aromatic (ring
+    carbons typed "C"); it also writes every conformer of atoms with alternate
+    locations, where the native writer keeps the first. Those rings and atoms are left
+    out.
+    """
+    keys = reference["key"].tolist()
+    residues = [key.rsplit("|", 1)[0] for key in keys]
+    ring = [key.split("|")[3] in RING_ATOMS.get(key.split("|")[2], ()) for key in keys]
+    non_aromatic = non_aromatic_rings(reference)
+    alternates = {key for key, count in collections.Counter(keys).items() if count > 1}
+    return {key: "S" if t == "Se" else t
+            for key, res, in_ring, t in zip(keys, residues, ring, reference["type"].tolist())
+            if not (in_ring and res in non_aromatic) and key not in alternates}
+
+
+class TestOpenBabelCorpus(unittest.TestCase):
+
+    def test_corpus(self) -> None:
+        for name in CORPUS:
+            with self.subTest(structure=name), tempfile.TemporaryDirectory() as tmp_dir:
+                native = read_pdbqt_charges(save_native_pdbqt(os.path.join(CORPUS_DIR, f"{name}.ent.gz"),
+                                                              output_file=os.path.join(tmp_dir, "native.pdbqt")))
+                reference = read_pdbqt_charges(os.path.join(CORPUS_DIR, f"{name}.pdbqt"))
+                # Same atoms and merged hydrogens; Open Babel may reorder residues
+                self.assertEqual(sorted(set(native["key"])), sorted(set(reference["key"])))
+                self.assertEqual(len(set(native["key"])), len(native["key"]))
+                native_types = dict(zip(native["key"], native["type"]))
+                expected = expected_types(reference)
+                self.assertGreater(len(expected), 0.9 * len(native_types))
+                mismatches = [(key, t, native_types[key]) for key, t in expected.items()
+                              if native_types[key] != t]
+                self.assertEqual(mismatches, [])
+
+    def test_corpus_charges(self) -> None:
+        for name in CORPUS:
+            with self.subTest(structure=name), tempfile.TemporaryDirectory() as tmp_dir:
+                native = read_pdbqt_charges(save_native_pdbqt(os.path.join(CORPUS_DIR, f"{name}.ent.gz"),
+                                                              output_file=os.path.join(tmp_dir, "native.pdbqt")))
+                reference = read_pdbqt_charges(os.path.join(CORPUS_DIR, f"{name}.gasteiger.pdbqt"))
+                types = read_pdbqt_charges(os.path.join(CORPUS_DIR, f"{name}.pdbqt"))
+                native_charges = dict(zip(native["key"], native["charge"]))
+                charges = dict(zip(reference["key"], reference["charge"]))
+                # Whole residues with a non-aromatic ring are left out, and MSE, which lost
+                # its selenium in the reference
+                non_aromatic = non_aromatic_rings(types)
+                keys = [key for key in expected_types(types)
+                        if key in charges and key.split("|")[2] != "MSE"
+                        and key.rsplit("|", 1)[0] not in non_aromatic]
+                errors = np.abs([native_charges[key] - charges[key] for key in keys])
+                self.assertGreater(len(keys), 0.8 * len(native_charges))
+                # Protonated structures match to the printed precision. Without hydrogens,
+                # Open Babel places double bonds in an order that depends on the atom order
+                # and on the geometry of each residue, which moves a few charges by up to
+                # about 0.05.
+                if "stripped" in name:
+                    self.assertLess(errors.max(), 0.06)
+                    self.assertLess(errors.mean(), 0.002)
+                else:
+                    self.assertLess(errors.max(), 0.0015)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from unittest.mock import patch
+
+from src.pdb_retrival.resolver import StructureResolver, identify_structure
+
+
+class FakeStructureHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the RCSB and AlphaFold DB file servers.
+    """
+    files: Dict[str, bytes] = {}
+    log: List[str] = []
+
+    def do_GET(self) -> None:
+        self.log.append(self.path)
+        name = self.path.rsplit("/", 1)[-1]
+        if name not in self.files:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.files[name])))
+        self.end_headers()
+        self.wfile.write(self.files[name])
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestStructureResolver(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeStructureHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.patches = [
+            patch("src.pdb_retrival.resolver.PDB_DOWNLOAD_URL", base + "/download/{pdb_id}.pdb"),
+            patch("src.pdb_retrival.resolver.ALPHAFOLD_URL", base + "/files/AF-{uniprot_id}-F1-model_v4.pdb"),
+        ]
+        for p in cls.patches:
+            p.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        for p in cls.patches:
+            p.stop()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        FakeStructureHandler.files = {"6o0k.pdb": b"ATOM 1\n", "AF-Q16611-F1-model_v4.pdb": b"ATOM 2\n"}
+        FakeStructureHandler.log = []
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_identify_structure(self) -> None:
+        local = os.path.join(self.tmp_dir.name, "x.pdb")
+        open(local, "w").close()
+        self.assertEqual(identify_structure(local).kind, "local")
+        self.assertEqual(identify_structure("6o0k").key, "pdb:6o0k")
+        for target in ("Q16611", "AF-Q16611-F1-model_v4", "af-q16611-f1"):
+            source = identify_structure(target)
+            self.assertEqual(source.kind, "alphafold")
+            self.assertEqual(source.filename, "AF-Q16611-F1-model_v4.pdb")
+        with self.assertRaises(ValueError):
+            identify_structure("not a structure")
+
+    def test_resolve_downloads_once(self) -> None:
+        resolver = StructureResolver(output_dir=self.tmp_dir.name)
+        path = resolver.resolve("6o0k")
+        self.assertEqual(path, os.path.join(self.tmp_dir.name, "6o0k.pdb"))
+        self.assertEqual(resolver.resolve("6o0k"), path)
+        self.assertEqual(resolver.resolve(path), path)
+        with open(resolver.resolve("Q16611"), "rb") as f:
+            self.assertEqual(f.read(), b"ATOM 2\n")
+        self.assertEqual(len(FakeStructureHandler.log), 2)
+
+    def test_resolve_with_mirror(self) -> None:
+        output_dir = os.path.join(self.tmp_dir.name, "out")
+        mirror_dir = os.path.join(self.tmp_dir.name, "mirror")
+        path = StructureResolver(output_dir=output_dir, mirror_dir=mirror_dir).resolve("6o0k")
+        os.remove(path)
+        # A fresh resolver re-exports from the mirror without network access
+        path = StructureResolver(output_dir=output_dir, mirror_dir=mirror_dir).resolve("6o0k")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"ATOM 1\n")
+        self.assertEqual(len(FakeStructureHandler.log), 1)
+
+    def test_open_buffer(self) -> None:
+        resolver = StructureResolver(output_dir=self.tmp_dir.name)
+        self.assertEqual(resolver.open("6o0k").read(), b"ATOM 1\n")
+        self.assertEqual(resolver.open("6o0k").read(), b"ATOM 1\n")
+        self.assertEqual(len(FakeStructureHandler.log), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "6o0k.pdb")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.pdbqt_preparation.extract_protein import \
+    strip_protein_extract_coordinate_info
+from src.structure_io.parser import guess_element
+from src.structure_io.structure import Structure
+
+PDB_TEXT = """\
+HET    LIG  A 201       2
+ATOM      1  N   ALA A   1       0.000   0.000   0.000  1.00  0.00           N
+ATOM      2  CA  ALA A   1       1.000   0.000   0.000  1.00  0.00           C
+ATOM      3  CA  GLY A   2       2.000   0.000   0.000  1.00  0.00           C
+ATOM      4  CA  GLY A   2A      2.500   0.000   0.000  1.00  0.00           C
+ATOM      5  CA  SER B   3       0.000   4.000   0.000  0.50  0.00           C
+HETATM    6  C1  LIG A 201      10.000  10.000  10.000  1.00  0.00           C
+HETATM    7  O1  LIG A 201      12.000  10.000  10.000  1.00  0.00           O
+HETATM    8  O   HOH A 301      -5.000   0.000   0.000  1.00  0.00           O
+ENDMDL
+MODEL        2
+ATOM      1  N   ALA A   1      99.000  99.000  99.000  1.00  0.00           N
+ENDMDL
+"""
+
+
+class TestStructure(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pdb_file = os.path.join(self.tmp_dir.name, "1abc.pdb")
+        with open(self.pdb_file, "w") as f:
+            f.write(PDB_TEXT)
+        self.structure = Structure.from_pdb(self.pdb_file)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_first_model_only(self) -> None:
+        self.assertEqual(len(self.structure), 8)
+        self.assertEqual(self.structure.get_chains(), ["A", "B"])
+
+    def test_selections(self) -> None:
+        def n(selection: str) -> int:
+            return int(self.structure.mask(selection).sum())
+
+        self.assertEqual(n("all"), 8)
+        self.assertEqual(n("chain B"), 1)
+        self.assertEqual(n("resi 1 + resi 3"), 3)
+        self.assertEqual(n("resi 1+3"), 3)
+        self.assertEqual(n("resi 1-2"), 4)
+        self.assertEqual(n("resi 2A"), 1)
+        self.assertEqual(n("resn LIG and name O1"), 1)
+        self.assertEqual(n("polymer.protein"), 5)
+        self.assertEqual(n("not polymer.protein"), 3)
+        self.assertEqual(n("organic"), 2)
+        self.assertEqual(n("solvent"), 1)
+        self.assertEqual(n("chain A and not (resi 1 or hetatm)"), 2)
+        with self.assertRaises(ValueError):
+            self.structure.mask("foo 1")
+        with self.assertRaises(ValueError):
+            self.structure.mask("(chain A")
+
+    def test_centerofmass(self) -> None:
+        com = self.structure.centerofmass("resn LIG")
+        expected = (12.011 * 10.0 + 15.999 * 12.0) / (12.011 + 15.999)
+        np.testing.assert_allclose(com, [expected, 10.0, 10.0])
+        self.assertIsInstance(com[0], float)
+
+        # Occupancy weights the atoms like in PyMOL
+        com = self.structure.centerofmass("resi 3 or (resi 2 and not resi 2A)")
+        np.testing.assert_allclose(com[1], 4.0 * 0.5 / 1.5)
+
+        with self.assertRaises(ValueError):
+            self.structure.centerofmass("chain C")
+
+    def test_get_coords_and_save(self) -> None:
+        np.testing.assert_allclose(self.structure.get_coords("chain B"), [[0.0, 4.0, 0.0]])
+        output = os.path.join(self.tmp_dir.name, "out.pdb")
+        self.structure.remove("not polymer.protein").save(output)
+        saved = Structure.from_pdb(output)
+        self.assertEqual(len(saved), 5)
+        np.testing.assert_allclose(saved.coords, self.structure.get_coords("polymer.protein"))
+
+    def test_guess_element(self) -> None:
+        self.assertEqual(guess_element("CA"), "C")
+        self.assertEqual(guess_element("1HB"), "H")
+        self.assertEqual(guess_element("FE1"), "F")
+        self.assertEqual(guess_element("CL12"), "CL")
+
+    def test_strip_protein_headless(self) -> None:
+        strip_protein_extract_coordinate_info(self.tmp_dir.name, "1abc.pdb", self.tmp_dir.name)
+        with open(os.path.join(self.tmp_dir.name, "config_1abc.txt")) as f:
+            config = f.read()
+        self.assertIn("Grid coordinates for ligand 'LIG' in '1abc'", config)
+        self.assertIn("Grid coordinates for ligand 'protein' in '1abc'", config)
+        stripped = Structure.from_pdb(os.path.join(self.tmp_dir.name, "1abc_stripped.pdb"))
+        self.assertEqual(len(stripped), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
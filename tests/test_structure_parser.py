@@ -0,0 +1,133 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.pdbqt_preparation.extract_protein import get_organic_molecules
+from src.structure_io.parser import (format_pdb_line, hybrid36_decode, parse_mmcif_text,
+                                     parse_pdb_bytes, read_structure)
+
+PDB_TEXT = """\
+HEADER    TEST
+ATOM      1  N   ALA A   1      11.104   6.134  -6.504  1.00  0.00           N
+ATOM      2  CA  ALA A   1      11.639   6.071  -5.147  1.00 12.50           C
+ATOM      3  O5' DA  B  10A      1.000   2.000   3.000  0.50  0.00
+HETATM    4 ZN    ZN A 301       0.000   0.000   0.000                      ZN
+HETATM    5  O   HOH A 401       1.000   1.000   1.000  1.00  0.00           O
+END
+"""
+
+MMCIF_TEXT = """\
+data_TEST
+#
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.type_symbol
+_atom_site.label_atom_id
+_atom_site.label_alt_id
+_atom_site.label_comp_id
+_atom_site.label_asym_id
+_atom_site.label_seq_id
+_atom_site.pdbx_PDB_ins_code
+_atom_site.Cartn_x
+_atom_site.Cartn_y
+_atom_site.Cartn_z
+_atom_site.occupancy
+_atom_site.B_iso_or_equiv
+_atom_site.auth_seq_id
+_atom_site.auth_comp_id
+_atom_site.auth_asym_id
+_atom_site.auth_atom_id
+_atom_site.pdbx_PDB_model_num
+ATOM   1 N  N     . ALA A 1 ? 11.104 6.134 -6.504 1.00 0.00  1   ALA A N     1
+ATOM   2 C  CA    . ALA A 1 ? 11.639 6.071 -5.147 1.00 12.50 1   ALA A CA    1
+ATOM   3 O  "O5'" . DA  B 1 A 1.000  2.000 3.000  0.50 0.00  10  DA  B "O5'" 1
+HETATM 4 ZN ZN    . ZN  C . ? 0.000  0.000 0.000  1.00 0.00  301 ZN  A ZN    1
+HETATM 5 O  O     . HOH D . ? 1.000  1.000 1.000  1.00 0.00  401 HOH A O     1
+ATOM   6 N  N     . ALA A 1 ? 99.000 99.00 99.000 1.00 0.00  1   ALA A N     2
+#
+"""
+
+
+class TestStructureParser(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.tmp_dir.name, name)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "wt") as f:
+            f.write(text)
+        return path
+
+    def test_parse_pdb(self) -> None:
+        atoms, lines = parse_pdb_bytes(PDB_TEXT.encode())
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(atoms["record"].tolist(), ["ATOM", "ATOM", "ATOM", "HETATM", "HETATM"])
+        self.assertEqual(atoms["name"].tolist(), ["N", "CA", "O5'", "ZN", "O"])
+        self.assertEqual(atoms["chain"].tolist(), ["A", "A", "B", "A", "A"])
+        self.assertEqual(atoms["resi"].tolist(), [1, 1, 10, 301, 401])
+        self.assertEqual(atoms["icode"].tolist(), ["", "", "A", "", ""])
+        # Missing element and occupancy columns
+        self.assertEqual(atoms["element"].tolist(), ["N", "C", "O", "ZN", "O"])
+        np.testing.assert_allclose(atoms["occupancy"], [1.0, 1.0, 0.5, 1.0, 1.0])
+        np.testing.assert_allclose(atoms["coords"][1], [11.639, 6.071, -5.147])
+        np.testing.assert_allclose(atoms["bfactor"][1], 12.5)
+
+    def test_empty(self) -> None:
+        atoms, lines = parse_pdb_bytes(b"HEADER    EMPTY\nEND\n")
+        self.assertEqual(lines, [])
+        self.assertEqual(atoms["coords"].shape, (0, 3))
+
+    def test_large_structure_numbers(self) -> None:
+        # Records past atom 99999 / residue 9999, as written in hybrid-36 or with overflow markers
+        text = (PDB_TEXT.replace("ATOM      1", "ATOM  99999")
+                .replace("ATOM      2", "ATOM  A0000")
+                .replace("ATOM      3", "ATOM  *****")
+                .replace("ZN A 301", "ZN AA000"))
+        atoms, lines = parse_pdb_bytes(text.encode())
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(atoms["serial"].tolist(), [99999, 100000, 0, 4, 5])
+        self.assertEqual(atoms["resi"].tolist(), [1, 1, 10, 10000, 401])
+        self.assertEqual(hybrid36_decode("ZZZZZ", 5), 43770015)
+        self.assertEqual(hybrid36_decode("a0000", 5), 43770016)
+        with self.assertRaises(ValueError):
+            parse_pdb_bytes(text.replace("ZN AA000", "ZN A****").encode())
+
+    def test_mmcif_matches_pdb(self) -> None:
+        pdb_atoms, _ = read_structure(self.write("1abc.pdb.gz", PDB_TEXT))
+        cif_atoms, lines = read_structure(self.write("1abc.cif", MMCIF_TEXT))
+        self.assertIsNone(lines)
+        for key in ("record", "serial", "name", "altloc", "resn", "chain", "resi", "icode", "element"):
+            self.assertEqual(cif_atoms[key].tolist(), pdb_atoms[key].tolist(), key)
+        for key in ("coords", "occupancy"):
+            np.testing.assert_allclose(cif_atoms[key], pdb_atoms[key])
+
+    def test_mmcif_without_atom_site(self) -> None:
+        with self.assertRaises(ValueError):
+            parse_mmcif_text("data_TEST\n#\n")
+
+    def test_format_pdb_line(self) -> None:
+        atoms, lines = parse_pdb_bytes(PDB_TEXT.encode())
+        reparsed, _ = parse_pdb_bytes("\n".join(format_pdb_line(atoms, i) for i in range(5)).encode())
+        for key in ("record", "name", "resn", "chain", "resi", "icode", "element"):
+            self.assertEqual(reparsed[key].tolist(), atoms[key].tolist(), key)
+        np.testing.assert_allclose(reparsed["coords"], atoms["coords"])
+        self.assertEqual(format_pdb_line(atoms, 1)[:54], lines[1][:54])
+
+    def test_get_organic_molecules(self) -> None:
+        path = self.write("1abc.pdb", PDB_TEXT)
+        self.assertEqual(get_organic_molecules(path), {"ZN": [("A", "301")]})
+        with self.assertRaises(ValueError):
+            get_organic_molecules(self.write("2abc.pdb", PDB_TEXT.replace("HETATM    4", "ATOM      4")))
+
+
+if __name__ == "__main__":
+    unittest.main()
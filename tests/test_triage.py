@@ -0,0 +1,68 @@
+import unittest
+
+from src.pdb_retrival.data_retriever import PDBDataRetriever
+from src.pdb_retrival.triage import (chain_count, check, has_ligand, max_resolution, method_in,
+                                     parse_resolution, triage)
+from tests.test_data_retriever import SAMPLE_HTML
+
+
+def make_data(method="X-RAY DIFFRACTION", resolution="1.62 Å", chains=1, small_molecules=None):
+    return {"experiment_data": {"method": method, "resolution": resolution, "release_date": None},
+            "macromolecules": {"unique_protein_chains": chains},
+            "small_molecules": small_molecules,
+            "binding_affinity": "N/A"}
+
+
+class TestTriage(unittest.TestCase):
+
+    def test_parse_resolution(self) -> None:
+        self.assertEqual(parse_resolution("1.62 Å"), 1.62)
+        self.assertEqual(parse_resolution("3 Å"), 3.0)
+        self.assertIsNone(parse_resolution(None))
+        self.assertIsNone(parse_resolution("N/A"))
+
+    def test_max_resolution(self) -> None:
+        self.assertTrue(max_resolution(2.0)(make_data(resolution="1.62 Å")))
+        self.assertFalse(max_resolution(1.5)(make_data(resolution="1.62 Å")))
+        self.assertFalse(max_resolution(2.0)(make_data(method="SOLUTION NMR", resolution=None)))
+        self.assertTrue(max_resolution(2.0, keep_unknown=True)(make_data(resolution=None)))
+
+    def test_method_in(self) -> None:
+        predicate = method_in("x-ray diffraction", "ELECTRON MICROSCOPY")
+        self.assertTrue(predicate(make_data()))
+        self.assertFalse(predicate(make_data(method="SOLUTION NMR")))
+        self.assertFalse(predicate(make_data(method=None)))
+
+    def test_has_ligand(self) -> None:
+        self.assertTrue(has_ligand()(make_data(small_molecules={"LBM": "Venetoclax"})))
+        self.assertFalse(has_ligand()(make_data(small_molecules={"SO4": "SULFATE ION", "GOL": "GLYCEROL"})))
+        self.assertTrue(has_ligand(ignore=())(make_data(small_molecules={"SO4": "SULFATE ION"})))
+        self.assertFalse(has_ligand()(make_data(small_molecules=None)))
+        self.assertTrue(has_ligand("atp", "LBM")(make_data(small_molecules={"LBM": "Venetoclax"})))
+        self.assertFalse(has_ligand("ATP")(make_data(small_molecules={"LBM": "Venetoclax"})))
+
+    def test_chain_count(self) -> None:
+        self.assertTrue(chain_count(1, 2)(make_data(chains=2)))
+        self.assertFalse(chain_count(1, 2)(make_data(chains=3)))
+        self.assertFalse(chain_count(2)(make_data(chains=1)))
+        self.assertFalse(chain_count()(make_data(chains=None)))
+
+    def test_triage(self) -> None:
+        metadata = {
+            "6O0K": PDBDataRetriever("6o0k").parse_data(SAMPLE_HTML),
+            "1abc": make_data(resolution="3.1 Å", small_molecules={"ATP": "ATP"}),
+            "2abc": make_data(method="SOLUTION NMR", resolution=None, small_molecules={"ATP": "ATP"}),
+            "3abc": None,
+        }
+        predicates = [method_in("X-RAY DIFFRACTION"), max_resolution(2.5), has_ligand()]
+        kept, rejected = triage(["6o0k", "1abc", "2abc", "3abc", "4abc", "6o0k"], metadata, predicates)
+        self.assertEqual(kept, ["6o0k"])
+        self.assertEqual(rejected, {"1abc": "resolution <= 2.5 Å",
+                                    "2abc": "method in ['X-RAY DIFFRACTION']",
+                                    "3abc": "no metadata",
+                                    "4abc": "no metadata"})
+        self.assertIsNone(check(metadata["1abc"], []))
+
+
+if __name__ == "__main__":
+    unittest.main()